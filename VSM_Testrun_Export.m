@@ -33,6 +33,7 @@ idx_ftti = Config.readConfigNumber(config, 'Scenario_Template', 'idx_ftti');
 scenario_list_path = Config.readConfig(config, 'Scenario_List', 'path');
 %scenario_list_path = "D:\Huawei_FUSA\03_FuSa\01_Simulation\Simulation_Scenario_List.xlsx";
 % scenario_list_path = "Simulation_Scenario_List_Acceptance.xlsx";
+% scenario_list_path = "Simulation_Scenario_List.csv"; %Written by the preprocessing with --columnar csv
 sheet_name = Config.readConfig(config, 'Scenario_Template', 'sheet_name');
 headers = split(Config.readConfig(config, 'Testrun_List', 'headers'), ',');
 
@@ -50,7 +51,13 @@ end
 
 opts = detectImportOptions(scenario_list_path);
 opts.VariableTypes{4} = 'char';
-opts.DataRange = 'A3';
+if endsWith(lower(scenario_list_path), '.csv')
+    %The CSV written by the preprocessing (--columnar csv) has the same columns, with a single header line
+    opts.VariableTypes{idx_test_run_id} = 'char';
+    opts.DataLines = 2;
+else
+    opts.DataRange = 'A3';
+end
 
 scenarioListSheet = readtable(scenario_list_path, opts);
 %scenarioListSheet = readtable(scenario_list_path, opts, 'Sheet', sheet_name, 'Range', header_size);
@@ -0,0 +1,167 @@
+"""
+Batch preprocessing of several projects, e.g. the HARA sheets of the vehicle variants, in a single invocation.
+The projects are listed in a JSON file, each with its config file and optionally its HARA sheet and output folder:
+[{"config": "config.ini", "hara": "Variant_A_HARA.xlsx", "output_dir": "Variant_A"}, ...]
+The projects are processed concurrently by a pool of worker processes. A worker keeps the scenario template (see
+TemplateDescriptor) and the rule tables (see ScenarioRules) of the projects it processed, so the projects sharing them
+do not load them again. A summary of the outputs and timings of each project is written at the end.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+
+from preprocessing import OUTPUT_KEYS, load_config, preprocessing
+
+
+class Project:
+    """
+    Config file of a project, with the HARA sheet and the output folder replacing the ones of the config
+    """
+
+    def __init__(self, config_path, hara_path=None, output_dir=None):
+        """
+        :param config_path: Path of the config file
+        :param hara_path: Path of the HARA sheet, the one of the config by default
+        :param output_dir: Folder of the scenario lists and of the run report, the paths of the config by default
+        """
+        self.config_path = config_path
+        self.hara_path = hara_path
+        self.output_dir = output_dir
+        self.name = hara_path if hara_path is not None else config_path
+
+    def config(self):
+        """
+        Loads the config of the project
+        :return: Returns the Config, with the HARA sheet and the output paths of the project
+        """
+        return load_config(self.config_path, self.hara_path, self.output_dir)
+
+
+def load_projects(path):
+    """
+    Loads the list of projects of a batch
+    :param path: Path of the JSON file listing the projects
+    :return: Returns the projects
+    """
+    with open(path, encoding='utf-8') as file:
+        entries = json.load(file)
+    return [Project(_['config'], _.get('hara'), _.get('output_dir')) for _ in entries]
+
+
+def _check_outputs(projects):
+    """
+    Checks that the projects do not write the same files, e.g. two HARA sheets with the same config and no output
+    folder. A project whose config cannot be loaded is left out of the check, it is reported in the summary without
+    being run.
+    :return: Returns the error of each project whose config cannot be loaded, by index of the project
+    """
+    owners = {}
+    errors = {}
+    for i_project, project in enumerate(projects):
+        try:
+            config = project.config()
+            paths = [os.path.abspath(config.get_entry('Scenario_List', key)) for key in OUTPUT_KEYS]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            print(f"Status: Error in {project.name}: {exc}")
+            errors[i_project] = exc
+            continue
+        for path in paths:
+            if path in owners:
+                raise ValueError(f"The projects of {owners[path]} and {project.name} both write {path}, "
+                                 f"specify an output folder for each project")
+            owners[path] = project.name
+    return errors
+
+
+def _failed_summary(project, error, seconds=0.0):
+    """
+    Gets the summary of a project which failed
+    :param project: Project
+    :param error: Exception raised by the project
+    :param seconds: Time spent on the project before it failed
+    :return: Returns the summary of the project, without outputs
+    """
+    return {'project': project.name, 'config': project.config_path, 'hara': project.hara_path,
+            'output_dir': project.output_dir, 'outputs': {}, 'rows_written': {}, 'stages': {}, 'error': str(error),
+            'seconds': seconds}
+
+
+def _run_project(project, modes, options):
+    """
+    Runs the preprocessing of a project, the errors are reported in the summary instead of stopping the batch
+    :return: Returns the summary of the project
+    """
+    start = time.perf_counter()
+    summary = {'project': project.name, 'config': project.config_path, 'hara': project.hara_path,
+               'output_dir': project.output_dir}
+    try:
+        config = project.config()
+        if project.output_dir is not None:
+            os.makedirs(project.output_dir, exist_ok=True)
+        report = preprocessing(modes, config=config, **options)
+        summary.update(outputs=report['outputs'], rows_written=report['counters'].get('rows_written', {}),
+                       stages={name: stage['seconds'] for name, stage in report['stages'].items()}, error=None)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        print(f"Status: Error in {project.name}: {exc}")
+        return _failed_summary(project, exc, time.perf_counter() - start)
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def batch(projects, modes, jobs=1, summary_path='Batch_Summary.json', **options):
+    """
+    Generates the scenario lists of several projects
+    :param projects: Projects of the batch
+    :param modes: Modes of the scenario lists of each project (see preprocessing())
+    :param jobs: Number of worker processes, each processing one project at a time.
+                 With a single job the projects are processed one by one in this process.
+    :param summary_path: Path of the JSON summary of the batch
+    :param options: Options of the preprocessing of each project (see preprocessing()), the scenario lists are written
+                    in streaming mode by default to share the scenario template
+    :return: Returns the summary of the batch
+    """
+    options.setdefault('streaming', True)
+    start = time.perf_counter()
+    errors = _check_outputs(projects)
+    runnable = [project for i_project, project in enumerate(projects) if i_project not in errors]
+    if jobs <= 1:
+        summaries = [_run_project(_, modes, options) for _ in runnable]
+    else:
+        # The projects are distributed one by one, the workers are kept for the whole batch with their caches
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            summaries = list(executor.map(_run_project, runnable, [modes] * len(runnable),
+                                          [options] * len(runnable), chunksize=1))
+    # The summaries are in the order of the projects
+    summaries = iter(summaries)
+    summaries = [_failed_summary(project, errors[i_project]) if i_project in errors else next(summaries)
+                 for i_project, project in enumerate(projects)]
+    summary = {'seconds': time.perf_counter() - start, 'jobs': jobs, 'modes': list(modes),
+               'failed': sum(_['error'] is not None for _ in summaries), 'projects': summaries}
+    print(f"Status: Saving the batch summary to {summary_path}...")
+    with open(summary_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+    print(f"Status: {len(summaries) - summary['failed']} of {len(summaries)} projects done")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('projects', help='JSON file listing the config file, HARA sheet and output folder of each '
+                                         'project')
+    parser.add_argument('--modes', nargs='+', default=['Scenario_List'],
+                        choices=['Scenario_List', 'FTTI_List', 'Acceptance_List'],
+                        help='Scenario lists generated for each project')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of worker processes, each processing one project at a time')
+    parser.add_argument('--summary', default='Batch_Summary.json', help='Path of the JSON summary of the batch')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Derive only the hazardous events changed since the previous run of each project')
+    parser.add_argument('--columnar', choices=['csv', 'parquet'],
+                        help='Also write the scenario lists in a columnar format, next to the workbooks')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Write each physical scenario only once, with a mapping sheet of the shared test runs')
+    args = parser.parse_args()
+    batch(load_projects(args.projects), args.modes, args.jobs, args.summary, incremental=args.incremental,
+          columnar=args.columnar, dedup=args.dedup)
@@ -0,0 +1,240 @@
+"""
+Benchmark of the preprocessing on synthetic HARA sheets.
+The HARA sheets are generated with the column layout of the Hara_Sheet section of config.ini, and each stage of the
+preprocessing is timed separately: HARA load, Scenario construction, ScenarioList.write and ScenarioList.save.
+"""
+import argparse
+import configparser
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+from packages.config import Config
+from preprocessing import Hara, Scenario, ScenarioList, ScenarioRules
+
+LOCATIONS = ['City', 'Highway', 'Country road', 'Parking lot']
+SLOPES = ['Flat', 'Slight slope', 'Downhill', 'Uphill']
+SPEEDS = ['Standstill', 'Very low', 'Low', 'Medium', 'High']
+# A curve radius is only specified for the speeds with as many radiuses as speeds (see Scenario._get_road_radius)
+CURVE_SPEEDS = ['Low', 'Medium', 'High']
+ROAD_CONDITIONS = ['Dry', 'Wet', 'Gravel']
+LOW_FRICTION_CONDITIONS = ['Icy', 'Snow']
+GEARS = ['D', 'R', 'N']
+BRAKE_PEDALS = ['Pressed', 'Released']
+MANEUVERS = ['Overtaking', 'Cruising', 'Parking']
+HAZARDS = {'TQ1': 'Unintended acceleration during driving',
+           'TQ2': 'Unintended acceleration with potential loss of stability',
+           'TQ3': 'Unintended acceleration during standstill in intended direction',
+           'TQ4': 'Unintended acceleration during standstill in wrong direction',
+           'TQ5': 'Unintended regenerative braking',
+           'TQ6': 'Unintended regenerative braking with potential loss of stability',
+           'TQ7': 'Unintended loss of regenerative braking'}
+
+
+def generate_hara(config, path, size, seed=0, *,  # pylint: disable=too-many-arguments disable=too-many-locals
+                  hazard_weights=None, curve_share=0.3, low_friction_share=0.2, mu_split_share=0.05,
+                  relevant_share=0.9):
+    """
+    Generates a synthetic HARA sheet with the column layout of the config
+    :param config: Config, the sheet name, header size and column indexes of the Hara_Sheet section are used
+    :param path: Path of the HARA workbook to write
+    :param size: Number of hazardous events
+    :param seed: Seed of the random generator, the same seed always gives the same HARA
+    :param hazard_weights: Relative weights of the hazards by code (e.g. {'TQ1': 2, 'TQ7': 0}), all equal by default
+    :param curve_share: Share of the hazardous events on a curve
+    :param low_friction_share: Share of the hazardous events on an icy or snowy road
+    :param mu_split_share: Share of the hazardous events on a mu-split road
+    :param relevant_share: Share of the hazardous events which are relevant for the simulation
+    """
+    generator = random.Random(seed)
+    indexes = Hara.Indexes(config)
+    hazard_weights = hazard_weights if hazard_weights is not None else {_: 1 for _ in HAZARDS}
+    hazards = [f"[{code}] {HAZARDS[code]}" for code in hazard_weights]
+    weights = list(hazard_weights.values())
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(config.get_entry('Hara_Sheet', 'sheet_name'))
+    row_size = max(indexes.columns())
+    for i in range(config.get_int('Hara_Sheet', 'header_size')):
+        sheet.append([f"Header {i + 1}"])
+    for i in range(size):
+        speed = generator.choice(SPEEDS)
+        draw = generator.random()
+        if draw < mu_split_share:
+            road_condition = 'mu-split'
+        elif draw < mu_split_share + low_friction_share:
+            road_condition = generator.choice(LOW_FRICTION_CONDITIONS)
+        else:
+            road_condition = generator.choice(ROAD_CONDITIONS)
+        values = {indexes.id: f"HE_{i + 1:06d}",
+                  indexes.location: generator.choice(LOCATIONS),
+                  indexes.slope: generator.choice(SLOPES),
+                  indexes.route: 'Curve' if speed in CURVE_SPEEDS and generator.random() < curve_share else 'Straight',
+                  indexes.road_condition: road_condition,
+                  indexes.engaged_gear: generator.choice(GEARS),
+                  indexes.vehicle_speed: speed,
+                  indexes.brake_pedal: generator.choice(BRAKE_PEDALS),
+                  indexes.maneuver: generator.choice(MANEUVERS),
+                  indexes.hazard: generator.choices(hazards, weights)[0],
+                  indexes.relevance: 'x' if generator.random() < relevant_share else None,
+                  indexes.comment: None}
+        sheet.append([values.get(idx_column) for idx_column in range(1, row_size + 1)])
+    workbook.save(path)
+
+
+def write_config(path, hara_path, output_dir):
+    """
+    Writes a copy of config.ini reading the synthetic HARA and writing the scenario lists to the output folder
+    :param path: Path of the config copy
+    :param hara_path: Path of the synthetic HARA
+    :param output_dir: Folder of the scenario lists
+    """
+    config_parser = configparser.ConfigParser()
+    config_parser.read('config.ini')
+    config_parser['Hara_Sheet']['path'] = hara_path
+    config_parser['Scenario_Template']['path'] = os.path.abspath(config_parser['Scenario_Template']['path'])
+    for key in ('path', 'ftti_path', 'acceptance_path', 'manifest_path'):
+        config_parser['Scenario_List'][key] = os.path.join(output_dir, config_parser['Scenario_List'][key])
+    with open(path, 'w', encoding='utf-8') as file:
+        config_parser.write(file)
+
+
+class Stage:
+    """
+    Measures the duration and the peak memory of a stage, and counts the items it processed
+    """
+
+    def __init__(self, name, trace_memory):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+        self.peak_memory = None
+        self._trace_memory = trace_memory
+        self._start = None
+
+    def __enter__(self):
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._start
+        if self._trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def result(self):
+        """
+        Gets the measurements of the stage
+        :return: Returns the measurements as a dict
+        """
+        return {'stage': self.name, 'items': self.items, 'seconds': self.seconds,
+                'items_per_second': self.items / self.seconds if self.seconds else None,
+                'peak_memory': self.peak_memory}
+
+
+def run(config, streaming=False, trace_memory=True):
+    """
+    Runs the stages of the preprocessing on the HARA of the config, in Scenario_List mode
+    :param config: Config
+    :param streaming: Streaming mode of the ScenarioList
+    :param trace_memory: When True the peak memory of each stage is measured with tracemalloc, which slows down the run
+    :return: Returns the measurements of each stage
+    """
+    hara_load, scenario_construction, write, save = stages = [
+        Stage(_, trace_memory) for _ in ('HARA load', 'Scenario construction', 'ScenarioList.write',
+                                         'ScenarioList.save')]
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with hara_load:
+            hazardous_events = [_ for _ in Hara(config).hazardous_events() if _.relevant]
+            hara_load.items = len(hazardous_events)
+        with scenario_construction:
+            rules = ScenarioRules(config)
+            scenarios = [Scenario(config, _, rules) for _ in hazardous_events]
+            scenario_construction.items = len(scenarios)
+        with write:
+            scenario_list = ScenarioList(config, 'Scenario_List', streaming)
+            for hazardous_event, scenario in zip(hazardous_events, scenarios):
+                scenario_list.write(hazardous_event, scenario)
+            write.items = scenario_list.row_count
+        with save:
+            scenario_list.save()
+            save.items = scenario_list.row_count
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return [_.result() for _ in stages]
+
+
+def benchmark(sizes, seed=0, streaming=False, trace_memory=True, output_dir=None, **hara_options):
+    """
+    Generates a synthetic HARA of each size and runs the stages of the preprocessing on it
+    :param sizes: Numbers of hazardous events
+    :param seed: Seed of the synthetic HARA
+    :param streaming: Streaming mode of the ScenarioList
+    :param trace_memory: When True the peak memory of each stage is measured
+    :param output_dir: Folder of the synthetic HARA and of the scenario lists, a temporary folder by default
+    :param hara_options: Options of the synthetic HARA (see generate_hara())
+    :return: Returns the measurements of each stage for each size
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        output_dir = output_dir if output_dir is not None else temporary_dir
+        os.makedirs(output_dir, exist_ok=True)
+        for size in sizes:
+            hara_path = os.path.join(output_dir, f"Synthetic_HARA_{size}.xlsx")
+            config_path = os.path.join(output_dir, f"config_{size}.ini")
+            print(f"Status: Generating a synthetic HARA of {size} hazardous events...")
+            write_config(config_path, hara_path, output_dir)
+            config = Config(config_path)
+            generate_hara(config, hara_path, size, seed, **hara_options)
+            for result in run(config, streaming, trace_memory):
+                results.append(dict(result, size=size))
+                print_result(results[-1])
+    return results
+
+
+def print_result(result):
+    """
+    Prints the measurements of a stage
+    :param result: Measurements of the stage (see Stage.result())
+    """
+    throughput = f"{result['items_per_second']:10.0f}/s" if result['items_per_second'] else f"{'-':>12}"
+    memory = f"{result['peak_memory'] / 2 ** 20:8.1f} MiB" if result['peak_memory'] is not None else ''
+    print(f"{result['size']:>7} {result['stage']:<22} {result['seconds']:8.3f} s {result['items']:>9} items "
+          f"{throughput} {memory}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000],
+                        help='Numbers of hazardous events of the synthetic HARA sheets')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic HARA sheets')
+    parser.add_argument('--hazard-weights', type=float, nargs=7, metavar='WEIGHT',
+                        help='Relative weights of the hazards [TQ1] to [TQ7]')
+    parser.add_argument('--curve-share', type=float, default=0.3,
+                        help='Share of the hazardous events on a curve')
+    parser.add_argument('--low-friction-share', type=float, default=0.2,
+                        help='Share of the hazardous events on an icy or snowy road')
+    parser.add_argument('--mu-split-share', type=float, default=0.05,
+                        help='Share of the hazardous events on a mu-split road')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Write the scenario list in streaming mode')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Do not measure the peak memory, tracemalloc slows down the stages')
+    parser.add_argument('--output-dir', help='Keep the synthetic HARA sheets and the scenario lists in this folder')
+    parser.add_argument('--json', help='Write the measurements to this JSON file')
+    args = parser.parse_args()
+    hazard_mix = dict(zip(HAZARDS, args.hazard_weights)) if args.hazard_weights else None
+    measurements = benchmark(args.sizes, args.seed, args.streaming, not args.no_memory, args.output_dir,
+                             hazard_weights=hazard_mix, curve_share=args.curve_share,
+                             low_friction_share=args.low_friction_share, mu_split_share=args.mu_split_share)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(measurements, json_file, indent=2)
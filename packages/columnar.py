@@ -0,0 +1,90 @@
+"""
+Machine-readable columnar outputs of the scenario list, written row by row next to the formatted workbook
+"""
+import csv
+
+
+class CsvWriter:
+    """
+    Streams the rows to a CSV file, with a header line containing the column names
+    """
+
+    def __init__(self, path, columns):
+        """
+        :param path: Path of the CSV file
+        :param columns: Names of the columns, in order
+        """
+        self.path = path
+        self._columns = columns
+        self._file = open(path, 'w', newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, record):
+        """
+        Writes a row
+        :param record: Values of the row by column name, the missing columns are left empty
+        """
+        self._writer.writerow([record.get(column) for column in self._columns])
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Streams the rows to a Parquet file in row groups. Requires the optional pyarrow package.
+    """
+
+    def __init__(self, path, columns, text_columns, row_group_size=10000):
+        """
+        :param path: Path of the Parquet file
+        :param columns: Names of the columns, in order
+        :param text_columns: Names of the columns stored as text, the other columns are stored as floats
+        :param row_group_size: Number of rows buffered before a row group is written
+        """
+        try:
+            import pyarrow  # pylint: disable=import-outside-toplevel
+            import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError("The pyarrow package is required to write the scenario list as Parquet, "
+                              "use the CSV format otherwise") from exc
+        self.path = path
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(column, pyarrow.string() if column in text_columns else pyarrow.float64())
+                                       for column in columns])
+        self._text_columns = text_columns
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._rows = []
+
+    def write(self, record):
+        """
+        Writes a row
+        :param record: Values of the row by column name, the missing columns are left empty
+        """
+        self._rows.append(record)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        columns = {}
+        for field in self._schema:
+            values = [row.get(field.name) for row in self._rows]
+            if field.name in self._text_columns:
+                columns[field.name] = [None if _ is None else str(_) for _ in values]
+            else:
+                columns[field.name] = [float(_) if isinstance(_, (int, float)) else None for _ in values]
+        self._writer.write_table(self._pyarrow.table(columns, schema=self._schema))
+        self._rows = []
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the file
+        """
+        if self._rows:
+            self._flush()
+        self._writer.close()
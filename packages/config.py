@@ -3,18 +3,177 @@ Loads a config file and gets config values
 """
 import os
 import configparser
+import hashlib
+from types import MappingProxyType
+
+
+def _to_int(entry):
+    return int(entry)
+
+
+def _to_float(entry):
+    return float(entry)
+
+
+def _to_list(entry):
+    """
+    Converts a single value (e.g. 120) or a list of values in brackets (e.g. [20, 40]) to a tuple of floats
+    """
+    return tuple(float(_) for _ in entry.strip().strip('[').strip(']').split(','))
+
+
+def _to_friction(entry):
+    """
+    Converts a friction coefficient (e.g. 0.9) to a float, or a mu-split friction (e.g. 0.9/0.3) to a tuple of floats
+    """
+    if '/' in entry:
+        return tuple(float(_) for _ in entry.split('/'))
+    return float(entry)
+
+
+_TYPE_NAMES = {_to_int: 'an int', _to_float: 'float', _to_list: 'a list of floats',
+               _to_friction: 'a float or a mu-split (e.g. 0.9/0.3)'}
+
+# Types of the config entries by section. The '*' entry applies to all the keys of the section which are not listed.
+# The entries of the sections not listed are kept as text.
+SCHEMA = {
+    'Hara_Sheet': {'path': str, 'sheet_name': str, 'results_path': str, '*': _to_int},
+    'Scenario_Template': {'path': str, 'sheet_name': str, '*': _to_int},
+    'Testrun_List': {'skip_sheet_generation': _to_int, '*': str},
+    'Vehicle': {'*': _to_float},
+    'Speed': {'*': _to_list},
+    'Driver': {'*': _to_float},
+    'Reaction': {'*': _to_float},
+    'Slope': {'*': _to_float},
+    'Radius': {'*': _to_list},
+    'Road_friction': {'*': _to_friction},
+    'Hazard_TQ': {'*': _to_float},
+    'Sweep': {'strategy': str, 'samples': _to_int, 'seed': _to_int, '*': _to_list},
+    'Simulation_Cost': {'*': _to_float},
+}
+
+
+class ConfigSection:
+    """
+    Read-only typed values of a config section.
+    The values can be read as attributes (e.g. config.Speed.low, with '-' replaced by '_' in the key)
+    or by key (e.g. config.Road_friction['mu-split']).
+    """
+    __slots__ = ('name', '_values')
+
+    def __init__(self, name, values):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, '_values', MappingProxyType(values))
+
+    def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        for candidate in (key.lower(), key.lower().replace('_', '-')):
+            if candidate in self._values:
+                return self._values[candidate]
+        raise AttributeError(f"Key '{key}' was not found in section '{self.name}' of the config file")
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key.lower()]
+        except KeyError as exc:
+            raise KeyError(f"Key '{key}' was not found in section '{self.name}' of the config file") from exc
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Config section '{self.name}' is read-only")
+
+    def __contains__(self, key):
+        return key.lower() in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __reduce__(self):
+        return ConfigSection, (self.name, dict(self._values))
 
 
 class Config:
     """
-    Loads a config file and gets config values
+    Loads a config file and gets config values.
+    All the entries are validated and converted to their type (see SCHEMA) once, when the config is loaded.
     """
 
-    def __init__(self, path):
+    def __init__(self, path, overrides=None):
+        """
+        :param path: Path of the config file
+        :param overrides: Entries replacing the ones of the file, as {(section, key): entry}, e.g. the HARA of a project
+        """
         if not os.path.exists(path):
             raise FileNotFoundError(f"Config file was not found: {os.path.abspath(path)}")
-        self._config = configparser.ConfigParser()
-        self._config.read(path)
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        for (section, key), entry in (overrides or {}).items():
+            if not parser.has_section(section):
+                parser.add_section(section)
+            parser[section][key] = entry
+        self.path = path
+        self._entries = {section: dict(parser[section]) for section in parser.sections()}
+        self._sections = {}
+        self._converted = {}
+        errors = []
+        for section, entries in self._entries.items():
+            types = SCHEMA.get(section, {})
+            values = {}
+            for key in entries:
+                to_type = types.get(key, types.get('*', str))
+                try:
+                    values[key] = self._convert(section, key, to_type)
+                except ValueError as exc:
+                    errors.append(str(exc))
+            self._sections[section] = ConfigSection(section, values)
+        if errors:
+            raise ValueError(f"Invalid config file {os.path.abspath(path)}:\n" + '\n'.join(errors))
+
+    def __getattr__(self, section):
+        if section.startswith('_'):
+            raise AttributeError(section)
+        try:
+            return self._sections[section]
+        except KeyError as exc:
+            raise AttributeError(f"Section '{section}' was not found in the config file") from exc
+
+    def section(self, section):
+        """
+        Gets the typed values of a config section
+        :param section: Section of the config file
+        :return: Returns the read-only ConfigSection
+        """
+        if section in self._sections:
+            return self._sections[section]
+        raise KeyError(f"Section '{section}' was not found in the config file")
+
+    def _convert(self, section, key, to_type):
+        """
+        Converts a config entry to a type, the result is cached
+        """
+        try:
+            return self._converted[section, key, to_type]
+        except KeyError:
+            pass
+        entry = self.get_entry(section, key)
+        if to_type is str:
+            return entry
+        try:
+            value = to_type(entry)
+        except ValueError as exc:
+            raise ValueError(f"Invalid config entry: '{entry}' in section '{section}', key '{key}'. "
+                             f"The type of the value has to be {_TYPE_NAMES[to_type]}") from exc
+        self._converted[section, key, to_type] = value
+        return value
+
+    def digest(self, sections):
+        """
+        Gets a hash of the entries of config sections, to detect the changes of the config between runs
+        :param sections: Names of the sections
+        :return: Returns the hash as a hexadecimal string
+        """
+        entries = [(section, sorted(self._entries.get(section, {}).items())) for section in sections]
+        return hashlib.sha1(repr(entries).encode('utf-8')).hexdigest()
 
     def get_entry(self, section, key):
         """
@@ -23,9 +182,9 @@ class Config:
         :param key: Name of the config entry to read
         :return: The config entry
         """
-        if section in self._config:
-            if key in self._config[section]:
-                return self._config[section][key]
+        if section in self._entries:
+            if key.lower() in self._entries[section]:
+                return self._entries[section][key.lower()]
             raise KeyError(f"Key '{key}' was not found in section '{section}' of the config file")
         raise KeyError(f"Section '{section}' was not found in the config file")
 
@@ -36,12 +195,7 @@ class Config:
         :param key: Name of the config entry to be read as a float
         :return: The config entry converted to float
         """
-        entry = self.get_entry(section, key)
-        try:
-            return float(entry)
-        except ValueError as exc:
-            raise ValueError(f"Invalid config entry: {entry} in section '{section}', key '{key}'. "
-                             f"The type of the value has to be float") from exc
+        return self._convert(section, key, _to_float)
 
     def get_int(self, section, key):
         """
@@ -50,9 +204,14 @@ class Config:
         :param key: Name of the config entry to read as an int
         :return: The config entry converted to int
         """
-        entry = self.get_entry(section, key)
-        try:
-            return int(entry)
-        except ValueError as exc:
-            raise ValueError(f"Invalid config entry: '{entry}' for section '{section}', key '{key}'. "
-                             f"The type of the value has to be an int") from exc
+        return self._convert(section, key, _to_int)
+
+    def get_list(self, section, key):
+        """
+        Reads a config value containing a single value (e.g. 120) or a list of values in brackets (e.g. [20, 40])
+        and converts it to a tuple of floats. Throws an error if the values cannot be interpreted as floats.
+        :param section: Section of the config file
+        :param key: Name of the config entry to read as a list
+        :return: The config entry converted to a tuple of floats
+        """
+        return self._convert(section, key, _to_list)
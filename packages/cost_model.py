@@ -0,0 +1,81 @@
+"""
+Estimation of the simulation cost of the test runs, to balance the work of the simulation workers
+"""
+import math
+
+
+class CostModel:
+    """
+    Estimates the simulation cost of a test run as the length of the track simulated by VSM, in meters, computed as in
+    VSM_Testrun_Export.m: the driver model needs a longer track for higher speeds. The length is multiplied by the
+    factors of the Simulation_Cost config section for curves, depending on their radius, low friction and mu-split
+    roads.
+    The number of FTTI variants is not a factor of the cost: each FTTI of a line is a test run of its own, estimated
+    separately, so the FTTI list is counted with its 5 test runs per line when it is sharded by cost. As all the
+    hazards have the same number of FTTI, it does not change the order of the lines either.
+    """
+
+    def __init__(self, config):
+        """
+        :param config: Config containing the Simulation_Cost section
+        """
+        section = config.section('Simulation_Cost')
+        self.standstill_length = section['standstill_length']
+        self.curve = section['curve']
+        self.curve_radius = section['curve_radius']
+        self.low_friction = section['low_friction']
+        self.low_friction_limit = section['low_friction_limit']
+        self.mu_split = section['mu_split']
+
+    def track_length(self, vehicle_speed, acceleration=0):
+        """
+        Gets the length of the track simulated for a test run
+        :param vehicle_speed: Desired vehicle speed in km/h
+        :param acceleration: Acceleration in m/s2 before the malfunction
+        :return: Returns the length in meters, the length of a time based test run at standstill is a config value
+        """
+        if not vehicle_speed:
+            return self.standstill_length
+        distance_fault_injection = math.ceil((20 + vehicle_speed / 3.6 * 10) / 10) * 10
+        if distance_fault_injection < 50 and (acceleration or 0) > 0:
+            distance_fault_injection = 60
+        return math.ceil((distance_fault_injection + max(vehicle_speed, 30) / 3.6 * 10) / 50) * 50
+
+    def curve_factor(self, road_radius):
+        """
+        Gets the cost factor of a curve, the driver model is steering more on tighter curves
+        :param road_radius: Radius of the curve in meters
+        :return: Returns the factor of the Simulation_Cost section for a curve of curve_radius meters, tending to 1 for
+                 large radiuses and to 2 * curve - 1 for the tightest curves
+        """
+        return 1 + 2 * (self.curve - 1) * self.curve_radius / (self.curve_radius + road_radius)
+
+    def cost(self, line):
+        """
+        Estimates the simulation cost of a test run
+        :param line: Values of the test run, with the names of the ScenarioList.Indexes as keys
+        :return: Returns the estimated cost
+        """
+        cost = self.track_length(line.get('desired_vehicle_speed'), line.get('acceleration'))
+        radius = line.get('constant_road_radius')
+        if not isinstance(radius, str):
+            cost *= self.curve_factor(radius)
+        friction = line.get('road_friction_coefficient')
+        if isinstance(friction, str):
+            # The friction of a mu-split road is written as text, e.g. 0.9/0.3
+            cost *= self.mu_split
+        elif friction is not None and friction <= self.low_friction_limit:
+            cost *= self.low_friction
+        return cost
+
+    def order(self, derived):
+        """
+        Orders the lines by decreasing estimated cost, so the most expensive test runs are simulated first and the
+        simulation workers finish together. All the lines are kept in memory to be sorted.
+        :param derived: (hazardous event, lines) in the order of the hazardous events
+        :return: Returns (hazardous event, [line]) for each line, the lines of the same cost keep their order
+        """
+        lines = [(hazardous_event, line) for hazardous_event, event_lines in derived for line in event_lines]
+        lines.sort(key=lambda _: -self.cost(_[1]))
+        for hazardous_event, line in lines:
+            yield hazardous_event, [line]
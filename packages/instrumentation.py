@@ -0,0 +1,174 @@
+"""
+Instrumentation of a run of the preprocessing: stage timers, counters, progress reporting and a JSON run report
+"""
+import collections
+import contextlib
+import datetime
+import json
+import os
+import time
+import tracemalloc
+
+
+class Instrumentation:  # pylint: disable=too-many-instance-attributes
+    """
+    Measures the time spent in each stage of a run and counts what was processed.
+    The stages can be nested, the time of a nested stage is not counted in the enclosing stage. This way the stages of
+    chained generators (e.g. reading the HARA while deriving the scenarios) are measured separately.
+    """
+
+    def __init__(self, trace_memory=False, progress_interval=1.0):
+        """
+        :param trace_memory: When True the peak memory of the run is measured with tracemalloc, which slows down the run
+        :param progress_interval: Minimum time in seconds between two progress messages
+        """
+        self.stages = collections.defaultdict(lambda: {'seconds': 0.0, 'calls': 0})
+        self.counters = {}
+        self.outputs = {}
+        self.skipped = {}
+        self._trace_memory = trace_memory
+        self._progress_interval = progress_interval
+        self._last_progress = None
+        self._active = []
+        self._started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._last_switch = self._start
+        if trace_memory:
+            tracemalloc.start()
+
+    def _switch(self):
+        now = time.perf_counter()
+        if self._active:
+            self.stages[self._active[-1]]['seconds'] += now - self._last_switch
+        self._last_switch = now
+
+    def start(self, name):
+        """
+        Starts a stage, the enclosing stage is paused until the stage is stopped
+        :param name: Name of the stage
+        """
+        self._switch()
+        self._active.append(name)
+        self.stages[name]['calls'] += 1
+
+    def stop(self):
+        """
+        Stops the last started stage
+        """
+        self._switch()
+        self._active.pop()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measures a block as a stage, e.g. with instrumentation.stage('save'): ...
+        :param name: Name of the stage
+        """
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def timed(self, iterable, name):
+        """
+        Measures the time spent producing the items of an iterable (e.g. a generator) as a stage
+        :param iterable: Items
+        :param name: Name of the stage
+        :return: Returns the items one by one
+        """
+        iterator = iter(iterable)
+        while True:
+            self.start(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            yield item
+
+    def count(self, name, amount=1, key=None):
+        """
+        Increments a counter
+        :param name: Name of the counter
+        :param amount: Increment
+        :param key: When specified the counter is a group of counters by key (e.g. the scenarios by hazard code)
+        """
+        if key is None:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        else:
+            group = self.counters.setdefault(name, {})
+            group[key] = group.get(key, 0) + amount
+
+    def merge(self, stages, counters):
+        """
+        Adds the measurements of stages run separately, e.g. in another process (see Pipeline)
+        :param stages: Stages of the report of the other instrumentation
+        :param counters: Counters of the report of the other instrumentation
+        """
+        for name, stage in stages.items():
+            self.stages[name]['seconds'] += stage['seconds']
+            self.stages[name]['calls'] += stage['calls']
+        for name, counter in counters.items():
+            if isinstance(counter, dict):
+                for key, amount in counter.items():
+                    self.count(name, amount, key)
+            else:
+                self.count(name, counter)
+
+    def progress(self, message):
+        """
+        Prints a progress message, at most once per progress interval
+        :param message: Function returning the message, it is only called when the message is printed
+        """
+        now = time.perf_counter()
+        if self._last_progress is None or now - self._last_progress >= self._progress_interval:
+            self._last_progress = now
+            print(f"Status: {message()}")
+
+    def add_skipped(self, name, key, items):
+        """
+        Records the items skipped by a run, e.g. the invalid VSM testruns of a scenario list
+        :param name: Name of the skipped items
+        :param key: Key of the items (e.g. the mode of the scenario list)
+        :param items: IDs of the skipped items
+        """
+        self.skipped.setdefault(name, {}).setdefault(key, []).extend(items)
+
+    def add_output(self, path):
+        """
+        Records the size of a file written by the run
+        :param path: Path of the file
+        """
+        self.outputs[path] = os.path.getsize(path)
+
+    def report(self):
+        """
+        Gets the measurements of the run
+        :return: Returns the measurements as a dict
+        """
+        self._switch()
+        report = {'started': self._started.isoformat(timespec='seconds'),
+                  'seconds': time.perf_counter() - self._start,
+                  'stages': dict(self.stages),
+                  'counters': self.counters,
+                  'outputs': self.outputs,
+                  'skipped': self.skipped,
+                  'bytes_saved': sum(self.outputs.values())}
+        if self._trace_memory:
+            report['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        return report
+
+    def save(self, path):
+        """
+        Writes the run report as JSON and stops the memory tracing
+        :param path: Path of the run report
+        :return: Returns the measurements written
+        """
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        if self._trace_memory:
+            tracemalloc.stop()
+        return report
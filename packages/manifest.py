@@ -0,0 +1,99 @@
+"""
+Sidecar manifest of the scenario lists, to regenerate only the hazardous events changed since the last run
+"""
+import dataclasses
+import hashlib
+import json
+import os
+
+
+class Manifest:
+    """
+    Keeps the lines of the scenario list derived from each hazardous event, keyed by a hash of the HARA columns of the
+    hazardous event and of the config sections the derivation depends on, and the test runs written to each scenario
+    list. On the next run the lines of the unchanged hazardous events are reused, and the test runs are compared.
+    """
+    VERSION = 1
+
+    def __init__(self, path, config_digest):
+        """
+        :param path: Path of the manifest file, the previous manifest is loaded if it exists.
+                     None for a manifest kept only in memory (see reuse())
+        :param config_digest: Hash of the config sections the lines depend on
+        """
+        self._path = path
+        self._config_digest = config_digest
+        self._previous_events = {}
+        self._previous_test_runs = {}
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                content = json.load(file)
+            if content.get('version') == self.VERSION:
+                self._previous_events = content['events']
+                self._previous_test_runs = content['test_runs']
+        self._events = {}
+        self._test_runs = {}
+        self._changes = {}
+        self.reused = 0
+        self.derived = 0
+
+    def reuse(self, previous):
+        """
+        Takes the lines and the test runs of a previous manifest kept in memory as the previous run
+        :param previous: Manifest of the previous run
+        """
+        # pylint: disable=protected-access
+        self._previous_events = previous._events
+        self._previous_test_runs = previous._test_runs
+
+    def _hash(self, hazardous_event):
+        values = repr((self._config_digest, dataclasses.astuple(hazardous_event)))
+        return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+    def get_lines(self, hazardous_event):
+        """
+        Gets the lines derived from the same hazardous event in the previous run
+        :param hazardous_event: HARA entry
+        :return: Returns the lines, None if the hazardous event or the config has changed
+        """
+        event_hash = self._hash(hazardous_event)
+        lines = self._previous_events.get(event_hash)
+        if lines is not None:
+            self._events[event_hash] = lines
+            self.reused += 1
+        return lines
+
+    def add_lines(self, hazardous_event, lines):
+        """
+        Records the lines derived from a hazardous event
+        :param hazardous_event: HARA entry
+        :param lines: Values of the lines
+        """
+        self._events[self._hash(hazardous_event)] = lines
+        self.derived += 1
+
+    def add_test_runs(self, name, test_runs):
+        """
+        Records the test runs written to a scenario list and compares them to the previous run
+        :param name: Name of the scenario list (mode)
+        :param test_runs: Values written for each test run ID
+        :return: Returns the test run IDs which are new, removed and changed since the previous run
+        """
+        digests = {test_run_id: hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+                   for test_run_id, row in test_runs.items()}
+        previous = self._previous_test_runs.get(name, {})
+        self._test_runs[name] = digests
+        new = sorted(set(digests) - set(previous))
+        removed = sorted(set(previous) - set(digests))
+        changed = sorted(_ for _ in set(digests) & set(previous) if digests[_] != previous[_])
+        self._changes[name] = {'new': new, 'removed': removed, 'changed': changed}
+        return new, removed, changed
+
+    def save(self):
+        """
+        Saves the manifest, the hazardous events which are not in the HARA anymore are dropped.
+        The test run IDs changed since the previous run are saved as well, to simulate only these test runs.
+        """
+        with open(self._path, 'w', encoding='utf-8') as file:
+            json.dump({'version': self.VERSION, 'changes': self._changes, 'events': self._events,
+                       'test_runs': self._test_runs}, file)
@@ -0,0 +1,230 @@
+"""
+Pipelined execution of the stages of a run (e.g. reading the HARA and deriving the scenarios): each stage runs in its
+own thread or process and passes its items to the next stage through a bounded queue, while the items of the last
+stage are consumed by the caller (e.g. writing the scenario lists). The stages overlap, so the wall time approaches the
+time of the slowest stage instead of the sum of the stages.
+"""
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+
+from packages.instrumentation import Instrumentation
+
+# Time in seconds between two checks of the stop of the pipeline while a stage waits for a queue
+_POLL_INTERVAL = 0.1
+# Time in seconds given to the stages to stop before their processes are terminated
+_STOP_TIMEOUT = 5.0
+
+
+class StageError(Exception):
+    """
+    Traceback of an error raised in a stage, set as the cause of the error raised to the caller
+    """
+
+
+class _Stopped(Exception):
+    """
+    Raised in a stage when the pipeline is stopped, e.g. after an error in another stage
+    """
+
+
+class _UpstreamError(Exception):
+    """
+    Raised in a stage when a previous stage failed, the error is passed on to the next stage
+    """
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues. A stage waits when the queue of the next stage is full, so the items do not
+    pile up in memory when a stage is faster than the next one (backpressure). An error in a stage stops all the
+    stages and is raised to the caller with the traceback of the stage as cause, an error of the caller stops all the
+    stages as well. The time a stage waits for the previous stage or for the next stage is measured as
+    '<name>_wait', the time the caller waits for the last stage as 'pipeline_wait'.
+    """
+    KINDS = ('thread', 'process')
+
+    def __init__(self, kind='process', queue_size=4, batch_size=64, instrumentation=None):
+        """
+        :param kind: Either 'thread' or 'process'. The threads share the interpreter lock, so only the stages waiting
+                     for input/output overlap, the processes run the stages in parallel.
+        :param queue_size: Number of batches of items waiting between two stages
+        :param batch_size: Number of items passed at once to the next stage
+        :param instrumentation: Instrumentation of the run, the measurements of the stages are added to it
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Pipeline kind {kind} is invalid. It has to be one of {', '.join(self.KINDS)}")
+        self._kind = kind
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self._stages = []
+        self._workers = []
+        self._stop = None
+
+    def add_stage(self, name, function, *args):
+        """
+        Adds a stage after the stages already added
+        :param name: Name of the stage
+        :param function: Function called as function(items, instrumentation, *args) in the thread or process of the
+                         stage, returning the items of the stage. The items are the ones of the previous stage (None
+                         for the first stage), the instrumentation measures the stage. With processes the function,
+                         its arguments and the items have to be picklable.
+        :param args: Arguments of the function
+        """
+        self._stages.append((name, function, args))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __iter__(self):
+        """
+        Starts the stages
+        :return: Returns the items of the last stage one by one
+        """
+        if self._kind == 'process':
+            # The processes are not daemonic, so a stage can use a process pool (e.g. the jobs deriving the scenarios)
+            queue_class, event_class, worker_class, daemon = (multiprocessing.Queue, multiprocessing.Event,
+                                                              multiprocessing.Process, False)
+        else:
+            queue_class, event_class, worker_class, daemon = queue.Queue, threading.Event, threading.Thread, True
+        queues = [queue_class(self._queue_size) for _ in self._stages]
+        reports = queue_class()
+        self._stop = event_class()
+        self._workers = [worker_class(target=_run_stage, args=(name, function, args,
+                                                               queues[i_stage - 1] if i_stage else None,
+                                                               queues[i_stage], self._stop, reports, self._batch_size),
+                                      name=name, daemon=daemon)
+                         for i_stage, (name, function, args) in enumerate(self._stages)]
+        for worker in self._workers:
+            worker.start()
+        while True:
+            with self._instrumentation.stage('pipeline_wait'):
+                kind, payload = self._get(queues[-1])
+            if kind == 'items':
+                yield from payload
+            elif kind == 'done':
+                break
+            else:
+                _raise(payload)
+        for _ in self._stages:
+            stages, counters = reports.get()
+            self._instrumentation.merge(stages, counters)
+
+    def _get(self, source):
+        """
+        Gets the next message of the last stage, checking that the processes of the stages are still running
+        """
+        while True:
+            try:
+                return source.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                for worker in self._workers:
+                    # A process killed (e.g. out of memory) does not send any message
+                    if getattr(worker, 'exitcode', None) not in (None, 0):
+                        raise RuntimeError(f"Stage {worker.name} stopped unexpectedly "  # pylint: disable=raise-missing-from
+                                           f"with exit code {worker.exitcode}")
+
+    def close(self):
+        """
+        Stops the stages still running, e.g. after an error, and waits for them
+        """
+        if self._stop is not None:
+            self._stop.set()
+        for worker in self._workers:
+            worker.join(_STOP_TIMEOUT)
+            if self._kind == 'process' and worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self._workers = []
+
+
+def _raise(error):
+    name, exception, traceback_text = error
+    raise exception from StageError(f"Error in the {name} stage:\n{traceback_text}")
+
+
+def _run_stage(name, function, args, source, target, stop,  # pylint: disable=too-many-arguments
+               reports, batch_size):
+    """
+    Runs a stage in its thread or process, until the items of the previous stage are all processed, an error is raised
+    or the pipeline is stopped
+    """
+    instrumentation = Instrumentation()
+    wait_name = f'{name}_wait'
+    try:
+        items = _receive(source, stop, instrumentation, wait_name) if source is not None else None
+        batch = []
+        for item in function(items, instrumentation, *args):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                with instrumentation.stage(wait_name):
+                    _put(target, ('items', batch), stop)
+                batch = []
+        with instrumentation.stage(wait_name):
+            if batch:
+                _put(target, ('items', batch), stop)
+            report = instrumentation.report()
+            # The report is sent first, so all the reports are available when the last stage is done
+            reports.put((report['stages'], report['counters']))
+            _put(target, ('done', None), stop)
+    except _Stopped:
+        pass
+    except _UpstreamError as exc:
+        _put_error(target, exc.args[0], stop)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        try:
+            pickle.dumps(exc)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # The error is raised in another process, it is replaced when it cannot be sent
+            exc = RuntimeError(f"{type(exc).__name__}: {exc}")
+        _put_error(target, (name, exc, traceback.format_exc()), stop)
+    if stop.is_set() and hasattr(target, 'cancel_join_thread'):
+        # The items not consumed are dropped, so the process can exit
+        target.cancel_join_thread()
+
+
+def _receive(source, stop, instrumentation, wait_name):
+    """
+    Gets the items of the previous stage one by one
+    """
+    while True:
+        with instrumentation.stage(wait_name):
+            while True:
+                try:
+                    kind, payload = source.get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty as exc:
+                    if stop.is_set():
+                        raise _Stopped() from exc
+        if kind == 'items':
+            yield from payload
+        elif kind == 'done':
+            return
+        else:
+            raise _UpstreamError(payload)
+
+
+def _put(target, message, stop):
+    """
+    Sends a message to the next stage, waiting while its queue is full
+    """
+    while True:
+        try:
+            target.put(message, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full as exc:
+            if stop.is_set():
+                raise _Stopped() from exc
+
+
+def _put_error(target, error, stop):
+    try:
+        _put(target, ('error', error), stop)
+    except _Stopped:
+        pass
@@ -0,0 +1,264 @@
+"""
+Direct access to the XML of a sheet of an XLSX file, without loading the workbook with openpyxl: some columns are read
+in a single streaming pass (see iter_rows()), and some cells are updated (see SheetPatch). Only the rows of the cells
+updated are rewritten, the other rows and the other parts of the file are copied as they are, so a large sheet is read
+and updated in a fraction of the time of loading and saving it with openpyxl, and the content that openpyxl does not
+support (e.g. images) is kept.
+"""
+import os
+import posixpath
+import re
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import zipfile
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+NAMESPACES = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+              'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+              'rel': 'http://schemas.openxmlformats.org/package/2006/relationships'}
+CALC_CHAIN = 'calcChain.xml'
+
+_ROW = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.DOTALL)
+_CELL = re.compile(r'<c\b[^>]*?\br="([A-Z]+)\d+"[^>]*?(?:/>|>.*?</c>)', re.DOTALL)
+_CELL_COLUMN = re.compile(r'[A-Z]*')
+_STYLE = re.compile(r'\ss="(\d+)"')
+_SPANS = re.compile(r'\sspans="[^"]*"')
+_DIMENSION = re.compile(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+def _read_workbook(source):
+    """
+    Reads the workbook part of an XLSX file
+    :return: Returns the path and the root element of the workbook part
+    """
+    root_relationships = ElementTree.fromstring(source.read('_rels/.rels'))
+    workbook_path = next(_.get('Target') for _ in root_relationships.findall('rel:Relationship', NAMESPACES)
+                         if _.get('Type').endswith('/officeDocument')).lstrip('/')
+    return workbook_path, ElementTree.fromstring(source.read(workbook_path))
+
+
+def get_sheet_names(path):
+    """
+    Gets the names of the sheets of an XLSX file
+    :param path: Path of the XLSX file
+    :return: Returns the names of the sheets, in the order of the workbook
+    """
+    with zipfile.ZipFile(path) as source:
+        _, workbook = _read_workbook(source)
+    return [_.get('name') for _ in workbook.findall('main:sheets/main:sheet', NAMESPACES)]
+
+
+def get_sheet_path(source, sheet_name):
+    """
+    Gets the path of the XML of a sheet in an XLSX file, from the relationships of the workbook
+    :param source: Opened zipfile.ZipFile of the XLSX file
+    :param sheet_name: Name of the sheet
+    :return: Returns the path in the XLSX file
+    """
+    workbook_path, workbook = _read_workbook(source)
+    relationships_path = posixpath.join(posixpath.dirname(workbook_path), '_rels',
+                                        posixpath.basename(workbook_path) + '.rels')
+    relationships = ElementTree.fromstring(source.read(relationships_path))
+    sheets = {_.get('name'): _.get(f"{{{NAMESPACES['r']}}}id")
+              for _ in workbook.findall('main:sheets/main:sheet', NAMESPACES)}
+    if sheet_name not in sheets:
+        raise KeyError(f"Sheet {sheet_name} was not found in {source.filename}")
+    target = next(_.get('Target') for _ in relationships.findall('rel:Relationship', NAMESPACES)
+                  if _.get('Id') == sheets[sheet_name])
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(workbook_path), target))
+
+
+def _read_shared_strings(source):
+    try:
+        data = source.read('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    return [''.join(_.itertext()) for _ in ElementTree.fromstring(data).findall('main:si', NAMESPACES)]
+
+
+def iter_rows(path, sheet_name, columns, min_row=1):  # pylint: disable=too-many-locals
+    """
+    Reads some columns of a sheet in a single streaming pass, the other cells are skipped without being decoded
+    :param path: Path of the XLSX file
+    :param sheet_name: Name of the sheet
+    :param columns: Columns read, starting from 1
+    :param min_row: First row read, starting from 1
+    :return: Returns (row, values) of each row of the sheet from min_row, the values of the columns are in the order
+             of the columns (None for an empty cell). The values are the ones stored in the file, e.g. the value of a
+             formula as last calculated, and the dates are not converted.
+    """
+    positions = {get_column_letter(column): position for position, column in enumerate(columns)}
+    sheet_data_tag = f"{{{NAMESPACES['main']}}}sheetData"
+    row_tag = f"{{{NAMESPACES['main']}}}row"
+    value_tag = f"{{{NAMESPACES['main']}}}v"
+    text_tag = f"{{{NAMESPACES['main']}}}t"
+    with zipfile.ZipFile(path) as source:
+        shared_strings = _read_shared_strings(source)
+        with source.open(get_sheet_path(source, sheet_name)) as sheet:
+            sheet_data = None
+            i_row = 0
+            for event, element in ElementTree.iterparse(sheet, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == sheet_data_tag:
+                        sheet_data = element
+                    continue
+                if element.tag != row_tag:
+                    continue
+                i_row = int(element.get('r', i_row + 1))
+                if i_row >= min_row:
+                    values = [None] * len(positions)
+                    for cell in element:
+                        position = positions.get(_CELL_COLUMN.match(cell.get('r', '')).group(0))
+                        if position is not None:
+                            values[position] = _get_value(cell, shared_strings, value_tag, text_tag)
+                    yield i_row, values
+                # The rows read are released, so the memory does not grow with the sheet
+                sheet_data.clear()
+
+
+def _get_value(cell, shared_strings, value_tag, text_tag):
+    data_type = cell.get('t', 'n')
+    if data_type == 'inlineStr':
+        return ''.join(_.text or '' for _ in cell.iter(text_tag))
+    value = cell.findtext(value_tag)
+    if not value:
+        # A formula which was not calculated has no value
+        return None
+    if data_type == 's':
+        return shared_strings[int(value)]
+    if data_type == 'b':
+        return value == '1'
+    if data_type == 'n':
+        return float(value) if any(_ in value for _ in '.eE') else int(value)
+    return value
+
+
+class SheetPatch:
+    """
+    Cells updated in a sheet of an XLSX file, written with save()
+    """
+
+    def __init__(self, path, sheet_name):
+        """
+        :param path: Path of the XLSX file
+        :param sheet_name: Name of the sheet
+        """
+        self.path = path
+        with zipfile.ZipFile(path) as source:
+            self._sheet_path = get_sheet_path(source, sheet_name)
+        # Values of the cells updated by row and column
+        self._cells = {}
+        # When a formula is replaced the calculation chain of the workbook is removed, Excel rebuilds it
+        self._formula_replaced = False
+
+    def __len__(self):
+        return sum(len(_) for _ in self._cells.values())
+
+    def set(self, row, column, value):
+        """
+        Updates the value of a cell, its style is kept
+        :param row: Row of the cell, starting from 1
+        :param column: Column of the cell, starting from 1
+        :param value: Either a number, a text or None to clear the cell
+        """
+        self._cells.setdefault(row, {})[column] = value
+
+    def save(self, output_path=None):
+        """
+        Writes the XLSX file with the cells updated
+        :param output_path: Path of the file written, the file is updated in place by default
+        """
+        output_path = output_path if output_path is not None else self.path
+        temporary_path = output_path + '.tmp'
+        with zipfile.ZipFile(self.path) as source, zipfile.ZipFile(temporary_path, 'w', zipfile.ZIP_DEFLATED) as target:
+            sheet = self._patch_sheet(source.read(self._sheet_path).decode('utf-8'))
+            for info in source.infolist():
+                if self._formula_replaced and posixpath.basename(info.filename) == CALC_CHAIN:
+                    continue
+                if info.filename == self._sheet_path:
+                    data = sheet.encode('utf-8')
+                elif self._formula_replaced and (info.filename == '[Content_Types].xml' or
+                                                 info.filename.endswith('.rels')):
+                    data = re.sub(rf'<(Override|Relationship)\b[^>]*{CALC_CHAIN}[^>]*/>', '',
+                                  source.read(info).decode('utf-8')).encode('utf-8')
+                else:
+                    data = source.read(info)
+                target.writestr(info, data)
+        os.replace(temporary_path, output_path)
+
+    def _patch_sheet(self, xml):
+        """
+        Replaces the rows of the cells updated in the XML of the sheet, the missing rows are inserted in order
+        """
+        xml = re.sub(r'<sheetData\s*/>', '<sheetData></sheetData>', xml, count=1)
+        start = xml.index('>', xml.index('<sheetData')) + 1
+        end = xml.index('</sheetData>')
+        pending = sorted(self._cells)
+        i_pending = 0
+        pieces = [xml[:start]]
+        position = start
+        for match in _ROW.finditer(xml, start, end):
+            number = int(match.group(1))
+            pieces.append(xml[position:match.start()])
+            while i_pending < len(pending) and pending[i_pending] < number:
+                pieces.append(self._patch_row(f'<row r="{pending[i_pending]}"/>', pending[i_pending]))
+                i_pending += 1
+            if i_pending < len(pending) and pending[i_pending] == number:
+                pieces.append(self._patch_row(match.group(0), number))
+                i_pending += 1
+            else:
+                pieces.append(match.group(0))
+            position = match.end()
+        pieces.append(xml[position:end])
+        pieces.extend(self._patch_row(f'<row r="{_}"/>', _) for _ in pending[i_pending:])
+        pieces.append(xml[end:])
+        return self._patch_dimension(''.join(pieces))
+
+    def _patch_row(self, row, number):
+        if row.endswith('</row>'):
+            open_tag = row[:row.index('>') + 1]
+            content = row[len(open_tag):-len('</row>')]
+        else:
+            open_tag = row[:-2].rstrip() + '>'
+            content = ''
+        # The span of the columns is optional, it is removed as the row may get new columns
+        open_tag = _SPANS.sub('', open_tag)
+        cells = {column_index_from_string(_.group(1)): _.group(0) for _ in _CELL.finditer(content)}
+        for column, value in self._cells[number].items():
+            style = None
+            if column in cells:
+                cell = cells[column]
+                style = _STYLE.search(cell[:cell.index('>')])
+                self._formula_replaced = self._formula_replaced or '<f' in cell
+            cells[column] = self._get_cell(f'{get_column_letter(column)}{number}', value,
+                                           style.group(1) if style is not None else None)
+        return open_tag + ''.join(cells[_] for _ in sorted(cells)) + '</row>'
+
+    @staticmethod
+    def _get_cell(reference, value, style):
+        style = f' s="{style}"' if style is not None else ''
+        if value is None:
+            return f'<c r="{reference}"{style}/>'
+        if isinstance(value, bool):
+            return f'<c r="{reference}"{style} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{reference}"{style}><v>{value!r}</v></c>'
+        return f'<c r="{reference}"{style} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+    def _patch_dimension(self, xml):
+        """
+        Extends the dimension of the sheet to the cells updated
+        """
+        match = _DIMENSION.search(xml)
+        if match is None or not self._cells:
+            return xml
+        first_column, first_row, last_column, last_row = match.groups()
+        last_column = column_index_from_string(last_column or first_column)
+        last_row = int(last_row or first_row)
+        last_column = max([last_column] + [max(_) for _ in self._cells.values() if _])
+        last_row = max(last_row, *self._cells)
+        return (xml[:match.start()] + f'<dimension ref="{first_column}{first_row}:{get_column_letter(last_column)}'
+                f'{last_row}"' + xml[match.end():])
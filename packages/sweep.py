@@ -0,0 +1,156 @@
+"""
+Parameter sweeps of the scenarios, for robustness studies around the values derived from the HARA
+"""
+import copy
+import dataclasses
+import itertools
+import math
+import random
+
+# Parameters which can be swept, as keys of the Sweep config section
+PARAMETERS = ('speed', 'road_friction', 'road_gradient', 'slew_rate', 'braking')
+STRATEGIES = ('full_factorial', 'latin_hypercube')
+
+
+class Sweep:
+    """
+    Samples the swept parameters of the Sweep config section and applies them to the scenarios.
+    Each parameter is specified as a range [first, last, count]. The parameters not specified keep the value derived
+    from the HARA. The samples are generated one by one, the sweep is never held in memory.
+    The variants follow the rules of the scenarios derived from the HARA: the swept speeds are limited by the speed
+    limit of the road condition (e.g. on an icy road), the acceleration is derived again for the swept speeds, and the
+    friction of a mu-split road is not swept. With full_factorial the values repeated by these rules are only swept
+    once.
+    """
+
+    def __init__(self, config):
+        """
+        :param config: Config containing the Sweep section
+        """
+        section = config.section('Sweep')
+        self.strategy = section['strategy']
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Invalid sweep strategy '{self.strategy}', it has to be one of {', '.join(STRATEGIES)}")
+        self.samples = section['samples'] if 'samples' in section else None
+        if self.strategy == 'latin_hypercube' and not self.samples:
+            raise ValueError("The number of samples has to be specified for the latin_hypercube sweep strategy")
+        self.seed = section['seed'] if 'seed' in section else 0
+        self.ranges = {}
+        for parameter in PARAMETERS:
+            if parameter not in section:
+                continue
+            value_range = section[parameter]
+            if len(value_range) != 3 or value_range[2] < 1:
+                raise ValueError(f"Invalid sweep range for '{parameter}': {list(value_range)}. "
+                                 f"The range has to be specified as [first, last, count]")
+            self.ranges[parameter] = value_range
+
+    def _axes(self, scenario):
+        """
+        Gets the values of the swept parameters of a scenario for the full_factorial strategy
+        :param scenario: Scenario derived from the HARA
+        :return: Returns the distinct values of each swept parameter
+        """
+        axes = {parameter: self._linspace(*value_range) for parameter, value_range in self.ranges.items()}
+        if 'speed' in axes:
+            axes['speed'] = list(dict.fromkeys(self._limit(_, scenario) for _ in axes['speed']))
+        if not isinstance(scenario.road_friction, float):
+            axes.pop('road_friction', None)
+        return axes
+
+    @staticmethod
+    def _limit(speed, scenario):
+        return min(speed, scenario.speed_limit) if scenario.speed_limit is not None else speed
+
+    def sample(self, identifier, scenario):
+        """
+        Generates the values of the swept parameters for a hazardous event
+        :param identifier: ID of the hazardous event, the latin hypercube samples are seeded with it to be reproducible
+        :param scenario: Scenario derived from the HARA
+        :return: Returns a dict of the swept parameters and their values for each sample
+        """
+        if self.strategy == 'full_factorial':
+            axes = self._axes(scenario)
+            for combination in itertools.product(*axes.values()):
+                yield dict(zip(axes, combination))
+            return
+
+        generator = random.Random(f"{self.seed}:{identifier}")
+        strata = {_: generator.sample(range(self.samples), self.samples) for _ in self.ranges}
+        for i in range(self.samples):
+            sample = {parameter: first + (strata[parameter][i] + generator.random()) / self.samples * (last - first)
+                      for parameter, (first, last, _) in self.ranges.items()}
+            if 'speed' in sample:
+                sample['speed'] = self._limit(sample['speed'], scenario)
+            if not isinstance(scenario.road_friction, float):
+                sample.pop('road_friction', None)
+            yield sample
+
+    def count(self, identifier, scenario, line_count):
+        """
+        Counts the lines of the variants of a scenario without generating them, from the number of values of each
+        swept parameter. Only the swept friction changes the number of reactions, the samples of the latin_hypercube
+        strategy are generated when the friction is swept.
+        :param identifier: ID of the hazardous event
+        :param scenario: Scenario derived from the HARA
+        :param line_count: Function giving the number of lines of each vehicle speed of a variant on a road friction
+        :return: Returns the number of lines of the variants
+        """
+        speed_count = 1 if 'speed' in self.ranges else len(scenario.vehicle_speed)
+        if self.strategy == 'full_factorial':
+            axes = self._axes(scenario)
+            frictions = axes.pop('road_friction', [scenario.road_friction])
+            return math.prod(len(_) for _ in axes.values()) * speed_count * sum(line_count(_) for _ in frictions)
+        if 'road_friction' in self.ranges and isinstance(scenario.road_friction, float):
+            return speed_count * sum(line_count(_['road_friction']) for _ in self.sample(identifier, scenario))
+        return self.samples * speed_count * line_count(scenario.road_friction)
+
+    @staticmethod
+    def _linspace(first, last, count):
+        count = int(count)
+        if count == 1:
+            return [first]
+        return [(first * (count - 1 - i) + last * i) / (count - 1) for i in range(count)]
+
+    def scenarios(self, identifier, scenario):
+        """
+        Generates the variants of a scenario, one for each sample of the sweep
+        :param identifier: ID of the hazardous event
+        :param scenario: Scenario derived from the HARA
+        :return: Returns a copy of the scenario with the swept values and the sample, for each sample
+        """
+        for sample in self.sample(identifier, scenario):
+            variant = copy.copy(scenario)
+            if 'speed' in sample:
+                variant.vehicle_speed = [sample['speed']]
+                variant.acceleration = scenario.get_acceleration(variant.vehicle_speed)
+                if not isinstance(scenario.road_radius, str):
+                    # The curve of the closest speed derived from the HARA is kept
+                    nearest = min(range(len(scenario.vehicle_speed)),
+                                  key=lambda i, speed=sample['speed']: abs(scenario.vehicle_speed[i] - speed))
+                    variant.road_radius = [scenario.road_radius[nearest]]
+            if 'road_friction' in sample:
+                variant.road_friction = sample['road_friction']
+            if 'road_gradient' in sample:
+                variant.road_gradient = sample['road_gradient']
+            if 'slew_rate' in sample:
+                # The faults are shared between the scenarios, the swept faults are new ones
+                variant.faults = tuple(dataclasses.replace(_, slew_rate=sample['slew_rate']) for _ in scenario.faults)
+            yield variant, sample
+
+    @staticmethod
+    def reaction(reaction, sample):
+        """
+        Applies the swept braking level to the braking reactions, the reactions without braking are kept as they are
+        :param reaction: Either None, one reaction or a list of reactions
+        :param sample: Values of the swept parameters
+        :return: Returns the reaction with the swept braking level
+        """
+        if 'braking' not in sample or reaction is None:
+            return reaction
+        swept = []
+        for single_reaction in reaction if isinstance(reaction, list) else [reaction]:
+            if getattr(single_reaction, 'braking', 0) != 0:
+                single_reaction = dataclasses.replace(single_reaction, braking=sample['braking'])
+            swept.append(single_reaction)
+        return swept if isinstance(reaction, list) else swept[0]
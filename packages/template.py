@@ -0,0 +1,109 @@
+"""
+Descriptor of the Scenario template: the layout, the header rows and the column styles of the template sheet are
+extracted once and cached as long as the template file does not change
+"""
+import copy
+import hashlib
+import os
+
+import openpyxl
+import openpyxl.cell
+
+# Descriptors by path, sheet name, header size and column count, with the state and the hash of the file they were
+# extracted from
+_cache = {}
+
+
+class TemplateDescriptor:  # pylint: disable=too-many-instance-attributes
+    """
+    Layout of the Scenario template, used to stamp out write-only sheets without loading the template workbook again
+    """
+
+    def __init__(self, template_sheet, header_size, column_count):
+        """
+        :param template_sheet: Sheet of the Scenario template
+        :param header_size: Number of the header rows
+        :param column_count: Minimum number of columns, the columns of the template are always included
+        """
+        self.header_size = header_size
+        self.column_count = max(template_sheet.max_column, column_count)
+        self.column_dimensions = [(key, dimension.min, dimension.max, dimension.width, dimension.hidden)
+                                  for key, dimension in template_sheet.column_dimensions.items()]
+        self.freeze_panes = template_sheet.freeze_panes
+        self.merged_ranges = [merged_range.coord for merged_range in template_sheet.merged_cells.ranges
+                              if merged_range.max_row <= header_size]
+        self.conditional_formats = [(str(conditional_format.sqref), list(conditional_format.rules))
+                                    for conditional_format in template_sheet.conditional_formatting]
+        self.row_heights = [template_sheet.row_dimensions[i_row].height for i_row in range(1, header_size + 1)]
+        self.header_rows = [[(template_sheet.cell(row=i_row, column=i_col).value,
+                              self._get_style(template_sheet.cell(row=i_row, column=i_col)))
+                             for i_col in range(1, self.column_count + 1)]
+                            for i_row in range(1, header_size + 1)]
+        self.column_styles = [self._get_style(template_sheet.cell(row=header_size + 1, column=i_col))
+                              for i_col in range(1, self.column_count + 1)]
+
+    @classmethod
+    def load(cls, path, sheet_name, header_size, column_count):
+        """
+        Gets the descriptor of a template, it is only extracted again when the content of the file changed
+        :param path: Path of the Scenario template
+        :param sheet_name: Name of the template sheet
+        :param header_size: Number of the header rows
+        :param column_count: Minimum number of columns
+        :return: Returns the descriptor of the template
+        """
+        key = (os.path.abspath(path), sheet_name, header_size, column_count)
+        stat = os.stat(path)
+        state = (stat.st_mtime_ns, stat.st_size)
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == state:
+            return cached[2]
+        # A template saved again without any change (e.g. checked out) keeps its descriptor
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        if cached is not None and cached[1] == digest:
+            _cache[key] = (state, digest, cached[2])
+            return cached[2]
+        template_workbook = openpyxl.load_workbook(path)
+        if sheet_name not in template_workbook.sheetnames:
+            raise KeyError(f"Sheet {sheet_name} was not found in {path}")
+        descriptor = cls(template_workbook[sheet_name], header_size, column_count)
+        _cache[key] = (state, digest, descriptor)
+        return descriptor
+
+    @staticmethod
+    def _get_style(template_cell):
+        return (copy.copy(template_cell.font), copy.copy(template_cell.fill), copy.copy(template_cell.border),
+                copy.copy(template_cell.alignment), copy.copy(template_cell.protection), template_cell.number_format)
+
+    @staticmethod
+    def _get_cell(sheet, value, style):
+        cell = openpyxl.cell.WriteOnlyCell(sheet, value)
+        cell.font, cell.fill, cell.border, cell.alignment, cell.protection, cell.number_format = style
+        return cell
+
+    def stamp(self, sheet, column_visibility=None):
+        """
+        Copies the layout and the header rows of the template to a write-only sheet
+        :param sheet: Empty write-only sheet
+        :param column_visibility: Visibility of the columns which differs from the template, by column letter
+        :return: Returns a styled cell for each column, to be used as the style of the rows written
+        """
+        # In a write-only sheet the column settings have to be applied before the first row is appended
+        for key, *settings in self.column_dimensions:
+            dimension = sheet.column_dimensions[key]
+            dimension.min, dimension.max, dimension.width, dimension.hidden = settings
+        for key, visible in (column_visibility or {}).items():
+            sheet.column_dimensions[key].hidden = not visible
+        sheet.freeze_panes = self.freeze_panes
+        for merged_range in self.merged_ranges:
+            sheet.merged_cells.add(merged_range)
+        for sqref, rules in self.conditional_formats:
+            for rule in rules:
+                # The rules are copied as the differential style ID is set on them when a workbook is saved
+                sheet.conditional_formatting.add(sqref, copy.copy(rule))
+
+        for i_row, (height, header_row) in enumerate(zip(self.row_heights, self.header_rows), 1):
+            sheet.row_dimensions[i_row].height = height
+            sheet.append([self._get_cell(sheet, value, style) for value, style in header_row])
+        return [self._get_cell(sheet, None, style) for style in self.column_styles]
@@ -0,0 +1,551 @@
+"""
+VSM testruns of the scenario list, generated from the rows of the scenario list as VSM_Testrun_Export.m does, with the
+track profiles computed as NumPy arrays. The testruns are written at once to the .vsd input file of VSM (a MATLAB
+MAT-file), without reading the scenario list back from the workbook.
+Requires the optional numpy and scipy packages.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import io
+import math
+import os
+import struct
+import zlib
+
+try:
+    import numpy as np
+    import scipy.io
+except ImportError as exc:
+    raise ImportError("The numpy and scipy packages are required to generate the VSM testruns") from exc
+
+import openpyxl
+
+# Control mode of the VSM driver model following the vehicle speed
+SPEED_CONTROL_MODE = 22
+# Track of the time based testruns (at standstill): end time, time step and fault injection time in seconds
+TIME_BASED_END = 10
+TIME_BASED_STEP = 0.5
+TIME_BASED_FAULT_INJECTION = 4.99
+# Speed in m/s converting the time of the time based testruns to the distance of their track
+TIME_BASED_TRACK_SPEED = 100
+# Distance in meters between the points of the track of the distance based testruns
+DISTANCE_STEP = 1
+# Distance in meters of the acceleration before the fault injection
+ACCELERATION_DISTANCE = 50
+# Straight distance in meters at the start of the track, the curvature is then ramped up (see track_geometry())
+INITIAL_STRAIGHT = 20
+# Values of the maps which are the same for every testrun, as (map, key) and the value at both ends of the track
+CONSTANT_MAPS = [(('AddDMD1Map', 'AddDMD1'), 1), (('AddDMD2Map', 'AddDMD2'), 0),
+                 (('AddDMD3Map', 'AddDMD3'), 1.2882297539194254E-231), (('AddDMD4Map', 'AddDMD4'), -1),
+                 (('AddDMD5Map', 'AddDMD5'), 0), (('AddDMD6Map', 'AddDMD6'), 0), (('AddDMD7Map', 'AddDMD7'), 0),
+                 (('AddpBrakeMap', 'AddpBrake'), 0), (('ClutchMap', 'Clutch'), 0), (('DMDGearMap', 'DMDGear'), -2),
+                 (('DMDSpeedMap', 'DMDSpeed'), 0), (('DisableGSMap', 'DisableGS'), 0),
+                 (('GripFLMap', 'Grip'), 100), (('GripRLMap', 'Grip'), 100), (('MaxGearMap', 'MaxGear'), 7),
+                 (('MinGearMap', 'MinGear'), 1), (('RBMap', 'Banking'), 0), (('SteerModeMap', 'SteerMode'), 0),
+                 (('kNormMap', 'kNorm'), 0)]
+# Maps of the grip by direction, only their distance is set as the long and lat grip maps are not used
+GRIP_DIRECTION_MAPS = [f'{direction}Grip{wheel}Map' for direction in ('Lat', 'Long')
+                       for wheel in ('FL', 'FR', 'RL', 'RR')]
+# Values of the testrun table columns which are the same for every point of the track
+CONSTANT_COLUMNS = {'mode': 'Speed', 'banking': 0, 'gripFL': 100, 'gripRL': 100, 'maxGear': 7, 'minGear': 1,
+                    'roadRoughnessFL': 0, 'roadRoughnessFR': 0, 'roadRoughnessRL': 0, 'roadRoughnessRR': 0,
+                    'demandGear': 'D', 'disableGearShift': 'FALSE', 'steerMode': 'Driver', 'starterBit': 'ON',
+                    'demandTCC': 'UseMap', 'controlExternTorque': 'FALSE', 'driveTriggerDisabled': 'FALSE',
+                    'currentManeuver': 'UNKNOWN'}
+# Prefix of the testrun names and suffix of the paths by mode of the scenario list
+NAME_PREFIXES = {'ftti_list': 'FTTI_', 'acceptance_list': 'ACCEPTANCE_'}
+PATH_SUFFIXES = {'ftti_list': '_FTTI', 'acceptance_list': '_Acceptance'}
+
+# MAT-file data types and class of the struct arrays
+MI_INT8, MI_INT32, MI_UINT32, MI_MATRIX, MI_COMPRESSED = 1, 5, 6, 14, 15
+MX_STRUCT_CLASS = 2
+# Size of the header of a MAT-file
+MAT_HEADER_SIZE = 128
+
+_worker_state = {}
+
+
+@dataclass
+class TrackProfile:
+    """
+    Points of the track of a testrun: distance (or time for a time based testrun), fault activation and vehicle speed
+    """
+    distance: np.ndarray
+    fault_active: np.ndarray
+    vehicle_speed: np.ndarray
+    time_based: bool
+    # Desired vehicle speed in km/h, raised to the minimum speed of an accelerating testrun
+    desired_speed: float
+    # The control mode is a column for an accelerating testrun, a row otherwise, as in VSM_Testrun_Export.m
+    control_mode_column: bool = False
+
+
+def _insert_point(distance, position, what, test_run_id):
+    """
+    Inserts a point in the track, unless the track already has it. The point cannot be the first or the last one.
+    :return: Returns the track and the index of the point
+    """
+    index = int(np.searchsorted(distance, position, side='left'))
+    if position <= distance[0] or index >= len(distance) - 1:
+        raise ValueError(f"Scenario {test_run_id}: Specified {what} could not be used")
+    if distance[index] != position:
+        distance = np.insert(distance, index, position)
+    return distance, index
+
+
+def _grid(end, step):
+    step_count = math.floor(end / step)
+    distance = np.linspace(0, step_count * step, step_count + 1)
+    if step_count * step != end:
+        distance = np.append(distance, end)
+    return distance
+
+
+def track_profile(test_run_id, desired_speed, acceleration):
+    """
+    Gets the points of the track of a testrun.
+    At standstill the testrun is time based, the fault is injected after 5 s. Otherwise the testrun is distance based,
+    the length of the track depends on the speed, and an acceleration is applied on the 50 m before the fault injection.
+    :param test_run_id: Test run ID, for the error messages
+    :param desired_speed: Desired vehicle speed in km/h
+    :param acceleration: Acceleration in m/s2 before the malfunction, None if not specified
+    :return: Returns the TrackProfile
+    """
+    if not isinstance(desired_speed, (int, float)):
+        raise ValueError(f"Scenario {test_run_id}: Vehicle speed has to be numeric")
+    if desired_speed == 0:
+        distance, i_fault = _insert_point(_grid(TIME_BASED_END, TIME_BASED_STEP), TIME_BASED_FAULT_INJECTION,
+                                          'fault injection', test_run_id)
+        return TrackProfile(distance, (np.arange(len(distance)) > i_fault).astype(float),
+                            np.full(len(distance), float(desired_speed)), True, desired_speed)
+
+    accelerating = acceleration is not None and acceleration != 0
+    if acceleration is not None and acceleration > 0:
+        # The speed before the acceleration is at least 5 km/h, the speed at the fault injection is then higher
+        initial_speed = 3.6 * math.sqrt(max((desired_speed / 3.6) ** 2 - 2 * acceleration * ACCELERATION_DISTANCE, 0))
+        if initial_speed < 5:
+            initial_speed = desired_speed = 5
+    # The driver model needs a longer track for higher speeds
+    distance_fault_injection = math.ceil((20 + desired_speed / 3.6 * 10) / 10) * 10
+    if distance_fault_injection < 50 and acceleration is not None and acceleration > 0:
+        distance_fault_injection = 60
+    end_distance = math.ceil((distance_fault_injection + max(desired_speed, 30) / 3.6 * 10) / 50) * 50
+    distance_fault_injection -= 0.01
+    distance = _grid(end_distance, DISTANCE_STEP)
+    if not accelerating:
+        distance, i_fault = _insert_point(distance, distance_fault_injection, 'fault injection', test_run_id)
+        return TrackProfile(distance, (np.arange(len(distance)) > i_fault).astype(float),
+                            np.full(len(distance), float(desired_speed)), False, desired_speed)
+
+    distance_acceleration = distance_fault_injection - ACCELERATION_DISTANCE
+    if distance_acceleration < 0:
+        raise ValueError(f"Scenario {test_run_id}: Specified speed is too low")
+    if acceleration <= 0:
+        initial_speed = 3.6 * math.sqrt((desired_speed / 3.6) ** 2 - 2 * acceleration * ACCELERATION_DISTANCE)
+    distance, i_acceleration = _insert_point(distance, distance_acceleration, 'acceleration', test_run_id)
+    distance, i_fault = _insert_point(distance, distance_fault_injection, 'fault injection', test_run_id)
+    # Constant acceleration from the acceleration point: v^2 = v0^2 + 2 * a * d (in km/h, m/s2 and m), the vehicle
+    # stops when braking on a longer distance. As in VSM_Testrun_Export.m the speed of the last point is not set.
+    vehicle_speed = np.zeros(len(distance))
+    vehicle_speed[:i_acceleration + 1] = initial_speed
+    accelerated = distance[i_acceleration + 1:-1] - distance[i_acceleration]
+    vehicle_speed[i_acceleration + 1:-1] = np.sqrt(np.maximum(initial_speed ** 2 + 2 * acceleration * 12.96 *
+                                                              accelerated, 0))
+    return TrackProfile(distance, (np.arange(len(distance)) > i_fault).astype(float), vehicle_speed, False,
+                        desired_speed, control_mode_column=True)
+
+
+def track_geometry(test_run_id, distance, target_curvature, road_gradient,  # pylint: disable=too-many-locals
+                   desired_speed):
+    """
+    Gets the coordinates of the points of the track, after a straight start the curvature is ramped up along a cosine
+    to the curvature of the road
+    :param test_run_id: Test run ID, for the error messages
+    :param distance: Distance of each point of the track in m
+    :param target_curvature: Curvature of the road in 1/m
+    :param road_gradient: Road gradient in %
+    :param desired_speed: Desired vehicle speed in km/h, the ramp of the curvature is longer for higher speeds
+    :return: Returns the x, y and z coordinates and the curvature of each point
+    """
+    ramp_end = INITIAL_STRAIGHT + math.ceil(desired_speed / 3.6 * 5 / 10) * 10
+    curvature = np.where(distance > INITIAL_STRAIGHT, target_curvature, 0.0)
+    ramp = (distance > INITIAL_STRAIGHT) & (distance < ramp_end)
+    if ramp.any():
+        curvature[ramp] = ((1 - np.cos((distance[ramp] - INITIAL_STRAIGHT) / (ramp_end - INITIAL_STRAIGHT) * np.pi))
+                           / 2 * target_curvature)
+    curvature[0] = 0
+    if curvature[-1] != target_curvature:
+        raise ValueError(f"Scenario {test_run_id}: The specified curvature ({target_curvature} 1/m) could not be "
+                         f"reached before the end of the track ({distance[-1]} m)")
+    delta_distance = np.diff(distance)
+    delta_phi = delta_distance * curvature[1:]
+    # Heading before each step
+    phi = np.concatenate(([0.0], np.cumsum(delta_phi)[:-1]))
+    straight = curvature[1:] == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = 1 / curvature[1:]
+        step_x = np.where(straight, delta_distance, radius * np.sin(delta_phi))
+        step_y = np.where(straight, 0.0, radius * (1 - np.cos(delta_phi)))
+    track_x = np.concatenate(([0.0], np.cumsum(step_x * np.cos(phi) - step_y * np.sin(phi))))
+    track_y = np.concatenate(([0.0], np.cumsum(step_y * np.cos(phi) + step_x * np.sin(phi))))
+    track_z = np.concatenate(([0.0], np.cumsum(road_gradient / 100 * delta_distance)))
+    return track_x, track_y, track_z, curvature
+
+
+def _get_value(value):
+    return np.nan if value is None else value
+
+
+def _get_curvature(test_run_id, radius):
+    if isinstance(radius, str):
+        if radius.lower() == 'straight':
+            return 0.0
+        try:
+            radius = float(radius)
+        except ValueError as exc:
+            raise ValueError(f"Scenario {test_run_id}: Road radius ({radius}) is invalid") from exc
+    if not isinstance(radius, (int, float)):
+        raise ValueError(f"Scenario {test_run_id}: Road radius ({radius}) is invalid")
+    return 1 / radius if radius > 0 else 0.0
+
+
+def _get_friction(friction):
+    """
+    Gets the friction of the left wheels and the ratio of the right wheels, e.g. 0.9/0.3 for a mu-split road
+    """
+    if isinstance(friction, str):
+        frictions = [float(_) for _ in friction.split('/')]
+        return frictions[0], (frictions[1] / frictions[0] if len(frictions) > 1 else 1.0)
+    return friction, 1.0
+
+
+def _struct(template, **fields):
+    """
+    Copies a struct of the template with some fields replaced, the struct is saved from a dict
+    """
+    record = template[0, 0]
+    values = {name: record[name] for name in template.dtype.names}
+    values.update(fields)
+    return values
+
+
+def _row(*values):
+    return np.array([values], dtype=float)
+
+
+def _column(values):
+    return np.asarray(values, dtype=float).reshape(-1, 1)
+
+
+class VsmTestrunWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Generates the VSM testrun of each row of a scenario list and saves them as the .vsd input file of VSM.
+    The testruns are generated and encoded in the MAT-file format by chunks while the rows are written, in a pool of
+    processes when several jobs are specified, the chunks are then only assembled in the .vsd file.
+    A testrun which VSM_Testrun_Export.m rejects (e.g. a speed too low for the acceleration) raises a ValueError as
+    the MATLAB script stops, unless the invalid testruns are skipped: they are then listed in skipped.
+    Unless skip_sheet_generation is set, the testrun tables (the columns of the headers of the Testrun_List config
+    section) are also written to a workbook, one sheet per testrun.
+    """
+
+    CHUNK_SIZE = 256
+
+    def __init__(self, config, mode, shard_name=None, jobs=1,  # pylint: disable=too-many-arguments
+                 skip_invalid=False):
+        """
+        :param config: Config containing the VSM_Testrun and Testrun_List sections
+        :param mode: Mode of the scenario list, the testruns and the files of the FTTI and Acceptance lists are named
+                     after the mode
+        :param shard_name: Suffix of the paths of a shard of the scenario list
+        :param jobs: Number of processes generating the testruns
+        :param skip_invalid: When True the invalid testruns are skipped with a warning instead of raising an error
+        """
+        suffix = PATH_SUFFIXES.get(mode.lower(), '') + (f'_{shard_name}' if shard_name is not None else '')
+        root, extension = os.path.splitext(config.get_entry('VSM_Testrun', 'path'))
+        self.path = root + suffix + extension
+        self._template_path = config.get_entry('VSM_Testrun', 'template_path')
+        self._headers = [_.strip() for _ in config.get_entry('Testrun_List', 'headers').split(',')]
+        self.table_path = None
+        if config.get_int('Testrun_List', 'skip_sheet_generation') != 1:
+            root, extension = os.path.splitext(config.get_entry('Testrun_List', 'path'))
+            self.table_path = root + suffix + extension
+        self._prefix = NAME_PREFIXES.get(mode.lower(), '')
+        self._jobs = jobs
+        self._skip_invalid = skip_invalid
+        # Test run IDs of the testruns skipped
+        self.skipped = []
+        self._template = load_template(self._template_path)
+        self._chunk = []
+        # Encoded chunks, or their futures when encoded in the pool
+        self._encoded = []
+        self._executor = None
+
+    def add(self, test_run_id, row):
+        """
+        Adds the testrun of a row
+        :param test_run_id: Test run ID of the row
+        :param row: Values of the row, with the names of the ScenarioList.Indexes as keys
+        """
+        self._chunk.append((test_run_id, row))
+        if len(self._chunk) >= self.CHUNK_SIZE:
+            self._encode_chunk()
+
+    def _encode_chunk(self):
+        if not self._chunk:
+            return
+        headers = self._headers if self.table_path is not None else None
+        if self._jobs <= 1:
+            self._encoded.append(encode_testruns(self._template, self._chunk, self._prefix, headers,
+                                                 self._skip_invalid))
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._jobs, initializer=_init_worker,
+                                                     initargs=(self._template_path,))
+            self._encoded.append(self._executor.submit(_encode_chunk, self._chunk, self._prefix, headers,
+                                                       self._skip_invalid))
+        self._chunk = []
+
+    def _collect_chunks(self):
+        """
+        Waits for the chunks being encoded and records the testruns skipped
+        :return: Returns the encoded chunks
+        """
+        self._encode_chunk()
+        try:
+            chunks = [_.result() if hasattr(_, 'result') else _ for _ in self._encoded]
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        for chunk in chunks:
+            for test_run_id, error in chunk.errors:
+                print(f"Status: Warning: {error}, the testrun is skipped")
+                self.skipped.append(test_run_id)
+        return chunks
+
+    def save(self):
+        """
+        Saves the testruns to the .vsd file, and the testrun tables to their workbook
+        """
+        chunks = self._collect_chunks()
+        print(f"Status: Saving to {self.path}...")
+        field_names = self._template.dtype.names
+        track_names = self._template['Track'].dtype.names
+        tracks_size = sum(len(_.elements) for _ in chunks)
+        track_count = sum(_.count for _ in chunks)
+        # The fields of the Data struct after the tracks, as in the template
+        others = _encode_fields([{name: self._template[name] for name in field_names}], field_names[1:])
+        track_header = _struct_header('', (1, track_count), track_names, tracks_size)
+        parts = [_struct_header('vsmTestRuns', (1, 1), field_names, len(track_header) + tracks_size + len(others)),
+                 track_header, *(_.elements for _ in chunks), others]
+        # The variable is compressed as a single stream, as saved by MATLAB
+        compressor = zlib.compressobj()
+        compressed = [compressor.compress(_) for _ in parts] + [compressor.flush()]
+        file_header = io.BytesIO()
+        scipy.io.savemat(file_header, {})
+        with open(self.path, 'wb') as file:
+            file.write(file_header.getvalue())
+            file.write(struct.pack('<II', MI_COMPRESSED, sum(len(_) for _ in compressed)))
+            file.writelines(compressed)
+        if self.table_path is not None:
+            print(f"Status: Saving to {self.table_path}...")
+            self._save_tables([table for chunk in chunks for table in chunk.tables])
+
+    def _save_tables(self, tables):
+        workbook = openpyxl.Workbook(write_only=True)
+        for test_run_id, table in tables:
+            # The sheets are named after the test run ID
+            sheet = workbook.create_sheet(f"{int(test_run_id):05d}")
+            sheet.append(self._headers)
+            columns = [table[header] for header in self._headers]
+            for values in zip(*columns):
+                # An empty cell is written for NaN, as MATLAB does
+                sheet.append([None if isinstance(_, float) and math.isnan(_) else _ for _ in values])
+        workbook.save(self.table_path)
+
+
+@dataclass
+class EncodedTestruns:
+    """
+    Testruns of a chunk of rows, encoded as the elements of the Track struct array of a MAT-file
+    """
+    count: int
+    elements: bytes
+    # (test run ID, table) of each testrun when the tables are generated
+    tables: list
+    # (test run ID, error message) of the testruns skipped
+    errors: list
+
+
+def _element(data_type, data):
+    """
+    Encodes a data element of a MAT-file, the data of up to 4 bytes is packed with its tag
+    """
+    if len(data) <= 4:
+        return struct.pack('<HH', data_type, len(data)) + data.ljust(4, b'\0')
+    return struct.pack('<II', data_type, len(data)) + data + b'\0' * (-len(data) % 8)
+
+
+def _struct_header(name, dims, field_names, fields_size):
+    """
+    Encodes the header of a struct array of a MAT-file, followed by the encoded fields of its elements
+    :param name: Name of the variable, empty for a field
+    :param dims: Dimensions of the struct array
+    :param field_names: Names of the fields
+    :param fields_size: Size in bytes of the encoded fields
+    """
+    # The field names are null-terminated, in slots of the same length, as written by scipy
+    name_length = max(len(_) for _ in field_names) + 1
+    header = (_element(MI_UINT32, struct.pack('<II', MX_STRUCT_CLASS, 0)) +
+              _element(MI_INT32, struct.pack(f'<{len(dims)}i', *dims)) + _element(MI_INT8, name.encode('ascii')) +
+              _element(MI_INT32, struct.pack('<i', name_length)) +
+              _element(MI_INT8, b''.join(_.encode('ascii').ljust(name_length, b'\0') for _ in field_names)))
+    return struct.pack('<II', MI_MATRIX, len(header) + fields_size) + header
+
+
+def _skip_element(data, position):
+    data_type, byte_count = struct.unpack_from('<II', data, position)
+    if data_type >> 16:
+        return position + 8
+    return position + 8 + byte_count + (-byte_count % 8)
+
+
+def _encode_fields(records, field_names):
+    """
+    Encodes the fields of the elements of a struct array, with the MAT-file writer of scipy
+    :param records: Values of the fields of each element
+    :param field_names: Names of the fields
+    :return: Returns the encoded fields, without the header of the struct array
+    """
+    array = np.empty((1, len(records)), dtype=[(name, object) for name in field_names])
+    for i_record, record in enumerate(records):
+        array[0, i_record] = tuple(record[name] for name in field_names)
+    buffer = io.BytesIO()
+    scipy.io.savemat(buffer, {'records': array}, oned_as='column')
+    data = buffer.getbuffer()
+    # The fields follow the file header, the tag of the variable and its flags, dimensions, name and field names
+    position = MAT_HEADER_SIZE + 8
+    for _ in range(5):
+        position = _skip_element(data, position)
+    return bytes(data[position:])
+
+
+def load_template(path):
+    """
+    Loads the template of the testruns
+    :param path: Path of the template .vsd file, containing the Data struct with a single track
+    :return: Returns the Data struct
+    """
+    return scipy.io.loadmat(path, mat_dtype=True)['Data'][0, 0]
+
+
+def _init_worker(template_path):
+    _worker_state['template'] = load_template(template_path)
+
+
+def _encode_chunk(rows, prefix, headers, skip_invalid):
+    return encode_testruns(_worker_state['template'], rows, prefix, headers, skip_invalid)
+
+
+def encode_testruns(template, rows, prefix='', headers=None, skip_invalid=False):
+    """
+    Generates the testruns of rows of a scenario list and encodes them
+    :param template: Data struct of the template (see load_template())
+    :param rows: (test run ID, values of the row) of each testrun
+    :param prefix: Prefix of the testrun names
+    :param headers: Columns of the testrun tables, the tables are not generated when None
+    :param skip_invalid: When True the invalid testruns are skipped and listed in the errors, otherwise the ValueError
+                         of the first one is raised
+    :return: Returns the EncodedTestruns
+    """
+    tracks = []
+    tables = []
+    errors = []
+    template_track = template['Track'][0, 0]
+    for test_run_id, row in rows:
+        try:
+            track, table = generate_testrun(template_track, test_run_id, row, prefix, headers)
+        except ValueError as exc:
+            if not skip_invalid:
+                raise
+            errors.append((test_run_id, str(exc)))
+            continue
+        tracks.append(track)
+        if table is not None:
+            tables.append((test_run_id, table))
+    return EncodedTestruns(len(tracks), _encode_fields(tracks, template_track.dtype.names), tables, errors)
+
+
+def generate_testrun(template_track, test_run_id, row, prefix='',  # pylint: disable=too-many-locals
+                     headers=None):
+    """
+    Generates the testrun of a row of a scenario list
+    :param template_track: Track of the template, its fields are copied and the ones of the testrun are replaced
+    :param test_run_id: Test run ID of the row
+    :param row: Values of the row, with the names of the ScenarioList.Indexes as keys
+    :param prefix: Prefix of the testrun name
+    :param headers: Columns of the testrun table, the table is not generated when None
+    :return: Returns the track as a dict, and the table as a dict of columns (None if not generated)
+    """
+    name = f"{prefix}Scenario_{test_run_id}"
+    profile = track_profile(test_run_id, row.get('desired_vehicle_speed'), row.get('acceleration'))
+    distance = profile.distance
+    point_count = len(distance)
+    ends = _column([distance[0], distance[-1]])
+    track_distance = (distance - distance[0]) * TIME_BASED_TRACK_SPEED if profile.time_based else distance
+    friction, friction_ratio = _get_friction(row.get('road_friction_coefficient'))
+    road_gradient = row.get('road_gradient')
+    track_x, track_y, track_z, curvature = track_geometry(
+        test_run_id, track_distance, _get_curvature(test_run_id, row.get('constant_road_radius')), road_gradient,
+        profile.desired_speed)
+    ftti = row.get('ftti')
+    channels = [profile.fault_active, 0, 0, 0, 0, _get_value(row.get('torque_front_axle')),
+                _get_value(row.get('torque_rear_axle')), row.get('torque_slew_rate') or 0, 0, 0, 0, 0, 0, np.nan,
+                _get_value(row.get('very_slow_steering')), _get_value(row.get('slow_steering')),
+                _get_value(row.get('braking')), 1000 if ftti is None else ftti / 1000, float(test_run_id)]
+    customer_channels = np.column_stack([np.broadcast_to(np.asarray(_, dtype=float), point_count)
+                                         for _ in channels])
+
+    track = {name: template_track[name] for name in template_track.dtype.names}
+    track.update(DisplayName=name, SetupName=name, CycleBase=float(profile.time_based),
+                 ManeuverStruct=_struct(template_track['ManeuverStruct'], SetupName=name),
+                 ControlMode=(np.full((point_count, 1), float(SPEED_CONTROL_MODE)) if profile.control_mode_column
+                              else np.full((1, point_count), float(SPEED_CONTROL_MODE))),
+                 v=_column(profile.vehicle_speed), CustomerChannels=customer_channels, dist=_column(distance),
+                 k=curvature.reshape(1, -1))
+    for (map_name, key), value in CONSTANT_MAPS:
+        track[map_name] = _struct(template_track[map_name], Dist=ends, **{key: _row(value, value)})
+    for map_name, value in (('GripMap', 100 * friction), ('GripFRMap', 100 * friction_ratio),
+                            ('GripRRMap', 100 * friction_ratio), ('RGMap', road_gradient)):
+        key = 'RG' if map_name == 'RGMap' else 'Grip'
+        track[map_name] = _struct(template_track[map_name], Dist=ends, **{key: _row(value, value)})
+    for map_name in GRIP_DIRECTION_MAPS:
+        track[map_name] = _struct(template_track[map_name], Dist=ends)
+    track['SteerAngleMap'] = _struct(template_track['SteerAngleMap'], Dist=ends, SteerAngle=np.zeros((2, 1)))
+    track['ZSMap'] = _struct(template_track['ZSMap'], Dist=ends, **{key: np.zeros((1, 2)) for key in
+                                                                    ('ZS_FL', 'ZS_FR', 'ZS_RL', 'ZS_RR')})
+    velocity_limit = template_track['VelocityLimit']
+    track['VelocityLimit'] = _struct(velocity_limit, DemandSpeedMap=_struct(
+        velocity_limit[0, 0]['DemandSpeedMap'], Dist=ends, Speed=np.zeros((1, 2))))
+    track_info = template_track['TrackInfo']
+    track['TrackInfo'] = _struct(track_info, Dist=_column(track_distance), Length=float(track_distance[-1]),
+                                 Name=name, Speed=_column(profile.vehicle_speed),
+                                 Sectors=_struct(track_info[0, 0]['Sectors'], Pos=float(track_distance[-1])),
+                                 Segments=_struct(track_info[0, 0]['Segments'], Pos=float(track_distance[-1])),
+                                 TrackX=track_x.reshape(1, -1), TrackY=track_y.reshape(1, -1),
+                                 TrackZ=track_z.reshape(1, -1), WidthLeft=np.zeros((1, point_count)),
+                                 WidthRight=np.zeros((1, point_count)))
+    if headers is None:
+        return track, None
+
+    columns = dict(CONSTANT_COLUMNS, time=distance if profile.time_based else 0.0,
+                   distance=0.0 if profile.time_based else distance, vehicleSpeed=profile.vehicle_speed,
+                   curvature=curvature, roadGradient=road_gradient, gripOverall=100 * friction,
+                   gripFR=100 * friction_ratio, gripRR=100 * friction_ratio)
+    channel_headers = [str(_[0]) for _ in template_track['CustomerChannelHeaders'].ravel()]
+    columns.update(zip(channel_headers, customer_channels.T))
+    table = {}
+    for header in headers:
+        value = columns.get(header, 0.0)
+        table[header] = (value.tolist() if isinstance(value, np.ndarray) else [value] * point_count)
+    return track, table
@@ -1,47 +1,462 @@
 """
 Generates a list of scenarios for the simulation using the HARA sheet as input.
 """
+# pylint: disable=too-many-lines
+import argparse
+import bisect
+import collections
+from concurrent.futures import ProcessPoolExecutor
 import copy
 from dataclasses import dataclass
+import functools
+import itertools
+import json
 import os
+import re
+import sys
 
-import openpyxl
-import openpyxl.styles
-
+from packages.columnar import CsvWriter, ParquetWriter
 from packages.config import Config
-
-
-def preprocessing(mode):
+from packages.cost_model import CostModel
+from packages.instrumentation import Instrumentation
+from packages.manifest import Manifest
+from packages.pipeline import Pipeline
+from packages.sweep import Sweep
+
+# Config sections the scenarios depend on
+SCENARIO_SECTIONS = ('Speed', 'Radius', 'Slope', 'Road_friction', 'Driver', 'Reaction', 'Hazard_TQ')
+# Entries of the Scenario_List section written by a run, moved to the output folder of a run
+OUTPUT_KEYS = ('path', 'ftti_path', 'acceptance_path', 'manifest_path', 'report_path')
+# Entries of the Scenario_List section with the path of the scenario list of each mode
+LIST_PATH_KEYS = {'scenario_list': 'path', 'ftti_list': 'ftti_path', 'acceptance_list': 'acceptance_path'}
+# Approximate compressed size in bytes of a row of a scenario list (e.g. 97 bytes in the lists of the sample HARA),
+# the size of a scenario list is projected as the size of the template and this size for each row
+ROW_SIZE = 100
+
+
+def load_config(path, hara_path=None, output_dir=None, output_paths=None):
+    """
+    Loads the config of a run
+    :param path: Path of the config file
+    :param hara_path: Path of the HARA sheet, the one of the config by default
+    :param output_dir: Folder of the scenario lists and of the run report, the paths of the config by default
+    :param output_paths: Paths of the scenario lists by mode (e.g. {'Scenario_List': 'List.xlsx'}), they take
+                         precedence over the output folder
+    :return: Returns the Config, with the HARA sheet and the output paths of the run
+    """
+    config = Config(path)
+    overrides = {}
+    if hara_path is not None:
+        overrides['Hara_Sheet', 'path'] = hara_path
+    if output_dir is not None:
+        for key in OUTPUT_KEYS:
+            overrides['Scenario_List', key] = os.path.join(output_dir,
+                                                           os.path.basename(config.get_entry('Scenario_List', key)))
+    for mode_name, output_path in (output_paths or {}).items():
+        overrides['Scenario_List', LIST_PATH_KEYS[mode_name.lower()]] = output_path
+    return Config(path, overrides) if overrides else config
+
+
+def preprocessing(mode, streaming=False, jobs=1,  # pylint: disable=too-many-arguments,too-many-locals
+                  incremental=False, *, columnar=None, sweep=False, dedup=False, shard_by=None, shards=None,
+                  order_by_cost=False, trace_memory=False, vsm=False, vsm_skip_invalid=False,
+                  pipeline=None, config=None):
     """
 Generates a list of scenarios for the simulation using the HARA sheet as input.
+    :param mode: Either 'Scenario_List', 'FTTI_List' or 'Acceptance_List', or a list of these modes.
+                 With several modes the HARA is read and the scenarios are derived only once for all the lists.
+    :param streaming: When True the scenario list is written with a write-only workbook (see ScenarioList)
+    :param jobs: Number of processes deriving the scenarios, the scenario list is the same for any number of jobs
+    :param incremental: When True only the hazardous events changed since the previous run are derived, the lines of
+                        the others are reused from the manifest (see Manifest)
+    :param columnar: Either None, 'csv' or 'parquet'.
+                     The scenario lists are also written in this format (see ScenarioList)
+    :param sweep: When True the parameters of the Sweep config section are swept for each hazardous event (see Sweep).
+                  The lines are generated one by one while written, with a single job. The scenario lists are always
+                  written in streaming mode, and the Scenario_List is split by count into shards when its rows do not
+                  fit in a sheet (see ScenarioList.MAX_ROWS).
+    :param dedup: When True each physical scenario is written only once, the test run shared by the hazardous events
+                  is recorded in a mapping sheet of the scenario list (see ScenarioList)
+    :param shard_by: Either None, 'count', 'hazard' or 'cost'. The scenario lists are split into several workbooks
+                     which can be simulated concurrently (see ScenarioList)
+    :param shards: Number of workbooks of the 'count' and 'cost' sharding
+    :param order_by_cost: When True the test runs are written by decreasing estimated simulation cost (see CostModel),
+                          so the simulation workers taking the test runs in order finish together
+    :param trace_memory: When True the peak memory is measured and added to the run report (see Instrumentation)
+    :param vsm: When True the VSM testruns of the scenario lists are also generated and saved as .vsd files, with the
+                jobs generating them (see VsmTestrunWriter)
+    :param vsm_skip_invalid: When True the VSM testruns which VSM_Testrun_Export.m rejects are skipped and listed in
+                             the run report, otherwise the run fails on the first one as VSM_Testrun_Export.m does
+    :param pipeline: Either None, 'thread' or 'process'. The HARA is read and the scenarios are derived in their own
+                     threads or processes while the scenario lists are written (see Pipeline), the incremental mode
+                     and the sweep are not supported in this mode
+    :param config: Config of the run, config.ini is loaded when not specified (e.g. a project of a batch, see batch.py)
+    :return: Returns the measurements of the run report
     """
 
     print('Status: Started')
+    if sweep and (incremental or jobs > 1):
+        raise ValueError("The sweep is only supported with a single job, without incremental mode")
+    if pipeline is not None and (incremental or sweep):
+        raise ValueError("The pipeline is not supported in incremental mode and with the sweep")
+
+    if config is None:
+        config = Config('config.ini')
+    instrumentation = Instrumentation(trace_memory)
+    modes = [mode] if isinstance(mode, str) else mode
+    options = {'columnar': columnar, 'dedup': dedup, 'shard_by': shard_by, 'shards': shards,
+               'order_by_cost': order_by_cost, 'vsm': vsm, 'vsm_skip_invalid': vsm_skip_invalid,
+               'instrumentation': instrumentation}
+    manifest = None
+    if pipeline is not None:
+        with Pipeline(pipeline, instrumentation=instrumentation) as stages:
+            stages.add_stage('read', _read_stage, config)
+            stages.add_stage('derive', _derive_stage, config, jobs)
+            write_scenario_lists(config, None, modes, streaming, jobs, derived=iter(stages), **options)
+    else:
+        hazardous_events = _read_hazardous_events(Hara(config), instrumentation)
+        if incremental:
+            manifest = Manifest(config.get_entry('Scenario_List', 'manifest_path'), config.digest(SCENARIO_SECTIONS))
+        write_scenario_lists(config, hazardous_events, modes, streaming, jobs, manifest=manifest, sweep=sweep,
+                             **options)
+    if manifest is not None:
+        manifest.save()
+    report_path = config.get_entry('Scenario_List', 'report_path')
+    print(f"Status: Saving the run report to {report_path}...")
+    report = instrumentation.save(report_path)
+
+    print('Status: Done')
+    return report
 
-    config_path = 'config.ini'
-    config = Config(config_path)
-    hara = Hara(config)
-    scenario_list = ScenarioList(config, mode)
 
-    for hazardous_event in hara.hazardous_events():
+def plan(mode, jobs=1, *, dedup=False, config=None):  # pylint: disable=too-many-locals
+    """
+    Plans a run: the HARA is read and the scenarios are derived as by preprocessing(), but the rows of the scenario
+    lists are only counted, no workbook is opened and no file is written
+    :param mode: Either 'Scenario_List', 'FTTI_List' or 'Acceptance_List', or a list of these modes
+    :param jobs: Number of processes deriving the scenarios
+    :param dedup: When True each physical scenario is counted only once
+    :param config: Config of the run, config.ini is loaded when not specified
+    :return: Returns the number of rows of each scenario list, in total and by hazard code, and its projected size in
+             bytes (see ROW_SIZE)
+    """
+    print('Status: Planning')
+    if config is None:
+        config = Config('config.ini')
+    instrumentation = Instrumentation()
+    modes = [mode] if isinstance(mode, str) else mode
+    scenario_lists = [ScenarioList(config, _, dedup=dedup, dry_run=True) for _ in modes]
+    hazardous_events = _read_hazardous_events(Hara(config), instrumentation)
+    _write_scenarios(derive_scenarios(config, hazardous_events, jobs), scenario_lists, instrumentation)
+
+    template_size = os.path.getsize(config.get_entry('Scenario_Template', 'path'))
+    counters = instrumentation.counters
+    result = {'hazardous_events': counters.get('rows_read', 0),
+              'relevant_events': counters.get('rows_read', 0) - counters.get('events_not_relevant', 0),
+              'lists': {}}
+    for mode_name, scenario_list in zip(modes, scenario_lists):
+        rows = scenario_list.row_count
+        result['lists'][mode_name] = {'rows': rows, 'rows_per_hazard': dict(scenario_list.rows_per_hazard),
+                                      'projected_size': template_size + rows * ROW_SIZE}
+        print(f"Status: {mode_name}: {rows} rows, about {(template_size + rows * ROW_SIZE) / 1e6:.1f} MB")
+        counts = ', '.join(f"{hazard_code}: {count}" for hazard_code, count in scenario_list.rows_per_hazard.items())
+        print(f"Status:     {counts}")
+    result['seconds'] = instrumentation.report()['seconds']
+    print(f"Status: {result['relevant_events']} of {result['hazardous_events']} hazardous events relevant, "
+          f"planned in {result['seconds']:.1f} s")
+    return result
+
+
+def write_scenario_lists(config, hazardous_events, modes,  # pylint: disable=too-many-arguments,too-many-locals
+                         streaming=False, jobs=1, *, manifest=None, columnar=None, sweep=False, dedup=False,
+                         shard_by=None, shards=None, order_by_cost=False, vsm=False, vsm_skip_invalid=False,
+                         instrumentation=None, derived=None):
+    """
+    Derives the scenarios of the hazardous events and writes the scenario lists of the modes (see preprocessing())
+    :param config: Config
+    :param hazardous_events: Hazardous events in HARA order
+    :param modes: List of the modes of the scenario lists
+    :param streaming: Streaming mode of the scenario lists
+    :param jobs: Number of processes deriving the scenarios
+    :param manifest: Manifest of the previous run in incremental mode, None otherwise
+    :param columnar: Either None, 'csv' or 'parquet'
+    :param sweep: When True the parameters of the Sweep config section are swept, in streaming mode
+    :param dedup: When True each physical scenario is written only once
+    :param shard_by: Either None, 'count', 'hazard' or 'cost'
+    :param shards: Number of shards of the 'count' and 'cost' sharding
+    :param order_by_cost: When True the lines are written by decreasing estimated simulation cost
+    :param vsm: When True the VSM testruns of the scenario lists are also generated
+    :param vsm_skip_invalid: When True the invalid VSM testruns are skipped instead of failing the run
+    :param instrumentation: Instrumentation of the run
+    :param derived: (hazardous event, lines) already derived in the order of the hazardous events (e.g. by a
+                    Pipeline), the hazardous events are then not used
+    :return: Returns the paths of the files written
+    """
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    shard_options = {_: (shard_by, shards) for _ in modes}
+    if derived is None and sweep:
+        # The sweep is always written to write-only workbooks, and split into shards when a sheet cannot hold it
+        streaming = True
+        hazardous_events = list(hazardous_events)
+        with instrumentation.stage('derive'):
+            row_count = count_sweep(config, hazardous_events, Sweep(config))
+        shard_options.update({_: _fit_rows(config, row_count, shard_by, shards) for _ in modes
+                              if _.lower() == 'scenario_list'})
+    scenario_lists = [ScenarioList(config, _, streaming, track_test_runs=manifest is not None, columnar=columnar,
+                                   dedup=dedup, shard_by=shard_options[_][0], shards=shard_options[_][1], vsm=vsm,
+                                   vsm_jobs=jobs, vsm_skip_invalid=vsm_skip_invalid)
+                      for _ in modes]
+    # The FTTI and Acceptance lists only contain the test runs targeted by the HARA comments, they are built directly
+    # from their test run ID when the IDs do not depend on the lines written before (see TestRunIndex)
+    if (derived is None and not (sweep or dedup or order_by_cost) and manifest is None and
+            all(_.lower() in ('ftti_list', 'acceptance_list') for _ in modes)):
+        _write_test_runs(config, hazardous_events, scenario_lists, instrumentation)
+    else:
+        if derived is None and sweep:
+            derived = derive_sweep(config, hazardous_events, Sweep(config))
+        elif derived is None:
+            derived = derive_scenarios(config, hazardous_events, jobs, manifest=manifest)
+        if order_by_cost:
+            derived = CostModel(config).order(derived)
+        _write_scenarios(derived, scenario_lists, instrumentation)
+    paths = []
+    for mode_name, scenario_list in zip(modes, scenario_lists):
+        with instrumentation.stage('save'):
+            scenario_list.save()
+        instrumentation.count('rows_written', scenario_list.row_count, key=mode_name)
+        if dedup:
+            instrumentation.count('duplicate_scenarios', scenario_list.duplicate_count, key=mode_name)
+        if vsm:
+            instrumentation.add_skipped('vsm_testruns', mode_name, scenario_list.vsm_skipped)
+        for path in scenario_list.output_paths:
+            instrumentation.add_output(path)
+            paths.append(path)
+        if manifest is not None:
+            new, removed, changed = manifest.add_test_runs(mode_name, scenario_list.test_runs)
+            print(f"Status: {mode_name} test runs: {len(new)} new, {len(removed)} removed, {len(changed)} changed")
+    if manifest is not None:
+        print(f"Status: {manifest.derived} hazardous events derived, {manifest.reused} reused")
+    return paths
+
+
+def _fit_rows(config, row_count, shard_by, shards):
+    """
+    Checks that the rows of a scenario list fit in the sheets of its workbooks (see ScenarioList.MAX_ROWS), a list
+    which is not sharded is split by count into as many shards as needed
+    :param config: Config
+    :param row_count: Number of rows of the scenario list
+    :param shard_by: Sharding of the run
+    :param shards: Number of shards of the run
+    :return: Returns the sharding and the number of shards of the scenario list
+    """
+    max_rows = ScenarioList.MAX_ROWS - config.get_int('Scenario_Template', 'header_size')
+    if shard_by is None and row_count > max_rows:
+        shards = -(-row_count // max_rows)
+        print(f"Status: {row_count} rows do not fit in a sheet, the scenario list is split into {shards} shards")
+        return 'count', shards
+    if shard_by == 'count' and -(-row_count // shards) > max_rows:
+        raise ValueError(f"{row_count} rows do not fit in {shards} shards of at most {max_rows} rows, "
+                         f"at least {-(-row_count // max_rows)} shards are needed")
+    return shard_by, shards
+
+
+def _read_stage(_, instrumentation, config):
+    """
+    Stage of a Pipeline reading the hazardous events of the HARA
+    """
+    return _read_hazardous_events(Hara(config), instrumentation)
+
+
+def _derive_stage(hazardous_events, instrumentation, config, jobs):
+    """
+    Stage of a Pipeline deriving the lines of the hazardous events read
+    """
+    return instrumentation.timed(derive_scenarios(config, hazardous_events, jobs), 'derive')
+
+
+def _read_hazardous_events(hara, instrumentation):
+    for hazardous_event in instrumentation.timed(hara.hazardous_events(), 'read'):
+        instrumentation.count('rows_read')
         if not hazardous_event.relevant:
+            instrumentation.count('events_not_relevant')
+        yield hazardous_event
+
+
+def _write_scenarios(derived, scenario_lists, instrumentation):
+    """
+    Writes the derived lines to all the scenario lists
+    :param derived: (hazardous event, lines) in the order of the hazardous events
+    :param scenario_lists: ScenarioList of each mode
+    :param instrumentation: Instrumentation of the run
+    """
+    def progress():
+        return f"Writing item #{max(_.row_count for _ in scenario_lists)}"
+
+    # Nothing is written by the dry runs of a plan
+    writing = not all(_.dry_run for _ in scenario_lists)
+    for hazardous_event, lines in instrumentation.timed(derived, 'derive'):
+        hazard_code = hazardous_event.hazard_code
+        with instrumentation.stage('write'):
+            # The lines are written to all the lists one by one, so they can be generated lazily
+            for line in instrumentation.timed(lines, 'derive'):
+                for scenario_list in scenario_lists:
+                    scenario_list.write_line(hazardous_event, line)
+                instrumentation.count('scenarios_per_hazard', key=hazard_code)
+                if writing:
+                    instrumentation.progress(progress)
+
+
+def _write_test_runs(config, hazardous_events, scenario_lists, instrumentation):
+    """
+    Writes the test runs targeted by the comments of the hazardous events to the FTTI and Acceptance lists, only the
+    targeted lines are expanded
+    :param config: Config
+    :param hazardous_events: Hazardous events in HARA order
+    :param scenario_lists: ScenarioList of each mode
+    :param instrumentation: Instrumentation of the run
+    """
+    with instrumentation.stage('derive'):
+        test_run_index = TestRunIndex(config, hazardous_events)
+    for i_event, hazardous_event in enumerate(test_run_index.hazardous_events):
+        if hazardous_event.comment is None:
+            continue
+        # The test run is only written by the hazardous event it belongs to
+        location = test_run_index.locate(int(hazardous_event.comment))
+        if location is None or location[0] != i_event:
             continue
-        scenario = Scenario(config, hazardous_event)
-        scenario_list.write(hazardous_event, scenario)
-    scenario_list.save()
+        with instrumentation.stage('derive'):
+            line = test_run_index.line(location)
+        with instrumentation.stage('write'):
+            for scenario_list in scenario_lists:
+                scenario_list.write_test_run(hazardous_event, line)
+        instrumentation.count('scenarios_per_hazard', key=hazardous_event.hazard_code)
 
-    print('Status: Done')
 
+def derive_scenarios(config, hazardous_events, jobs=1, chunk_size=64, manifest=None):
+    """
+    Converts the relevant hazardous events to scenarios and expands them to the lines of the scenario list
+    :param config: Config
+    :param hazardous_events: Hazardous events in HARA order
+    :param jobs: Number of processes, with more than 1 job the hazardous events are derived in a process pool
+    :param chunk_size: Number of hazardous events sent at once to a process
+    :param manifest: Manifest of the previous run, the lines of the unchanged hazardous events are reused
+    :return: Returns (hazardous event, lines) in the order of the hazardous events (see ScenarioList.lines())
+    """
+    relevant_events = (_ for _ in hazardous_events if _.relevant)
+    if jobs <= 1:
+        rules = ScenarioRules.load(config)
+        for hazardous_event in relevant_events:
+            lines = manifest.get_lines(hazardous_event) if manifest is not None else None
+            if lines is None:
+                lines = _derive_lines(config, rules, hazardous_event)
+                if manifest is not None:
+                    manifest.add_lines(hazardous_event, lines)
+            yield hazardous_event, lines
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(config,)) as executor:
+        # Only a few chunks are in flight, so the HARA is read at the pace of the writing
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(relevant_events, chunk_size))
+            if chunk:
+                cached = [manifest.get_lines(_) if manifest is not None else None for _ in chunk]
+                derived = executor.submit(_derive_chunk, [e for e, lines in zip(chunk, cached) if lines is None])
+                pending.append((chunk, cached, derived))
+            if pending and (not chunk or len(pending) > 2 * jobs):
+                yield from _merge_chunk(*pending.popleft(), manifest)
+            elif not chunk:
+                break
 
-class TorqueFault:
+
+def derive_sweep(config, hazardous_events, sweep):
     """
-    E-motor torque malfunction
+    Converts the relevant hazardous events to scenarios and expands the variants of the sweep of each scenario
+    :param config: Config
+    :param hazardous_events: Hazardous events in HARA order
+    :param sweep: Sweep
+    :return: Returns (hazardous event, lines) in the order of the hazardous events, the lines are generated lazily
     """
+    rules = ScenarioRules.load(config)
+    for hazardous_event in hazardous_events:
+        if hazardous_event.relevant:
+            scenario = Scenario(config, hazardous_event, rules)
+            yield hazardous_event, _sweep_lines(config, hazardous_event, scenario, sweep)
+
+
+def count_sweep(config, hazardous_events, sweep):
+    """
+    Counts the lines of the sweep without expanding them (see Sweep.count())
+    :param config: Config
+    :param hazardous_events: Hazardous events in HARA order
+    :param sweep: Sweep
+    :return: Returns the number of lines of the sweep of all the relevant hazardous events
+    """
+    rules = ScenarioRules.load(config)
+    count = 0
+    for hazardous_event in hazardous_events:
+        if hazardous_event.relevant:
+            scenario = Scenario(config, hazardous_event, rules)
+            count += sweep.count(hazardous_event.identifier, scenario,
+                                 functools.partial(_count_reactions, config, scenario))
+    return count
+
+
+def _count_reactions(config, scenario, road_friction):
+    """
+    Counts the reactions to all the faults of a scenario on a road friction
+    """
+    variant = copy.copy(scenario)
+    variant.road_friction = road_friction
+    return sum(len(ScenarioList._get_reactions(config, fault, variant))  # pylint: disable=protected-access
+               for fault in scenario.faults)
+
 
-    def __init__(self, torque_error_front=None, torque_error_rear=None, slew_rate=None):
-        self.torque_error_front = torque_error_front
-        self.torque_error_rear = torque_error_rear
-        self.slew_rate = slew_rate
+def _sweep_lines(config, hazardous_event, scenario, sweep):
+    for variant, sample in sweep.scenarios(hazardous_event.identifier, scenario):
+        # The swept faults and frictions are new for each sample, the reactions are not shared through the rules
+        combinations = ((speed, radius, fault, sweep.reaction(reaction, sample))
+                        for speed, radius, fault, reaction in ScenarioList.combinations(config, variant))
+        yield from ScenarioList.lines(config, hazardous_event, variant, combinations)
+
+
+def _merge_chunk(chunk, cached, derived, manifest):
+    derived_lines = collections.deque(derived.result())
+    for hazardous_event, lines in zip(chunk, cached):
+        if lines is None:
+            lines = derived_lines.popleft()
+            if manifest is not None:
+                manifest.add_lines(hazardous_event, lines)
+        yield hazardous_event, lines
+
+
+def _derive_lines(config, rules, hazardous_event):
+    scenario = Scenario(config, hazardous_event, rules)
+    return ScenarioList.lines(config, hazardous_event, scenario, ScenarioList.combinations(config, scenario, rules))
+
+
+_worker_state = {}
+
+
+def _init_worker(config):
+    _worker_state['config'] = config
+    _worker_state['rules'] = ScenarioRules.load(config)
+
+
+def _derive_chunk(hazardous_events):
+    return [_derive_lines(_worker_state['config'], _worker_state['rules'], hazardous_event)
+            for hazardous_event in hazardous_events]
+
+
+@dataclass(frozen=True, slots=True)
+class TorqueFault:
+    """
+    E-motor torque malfunction.
+    The faults are shared between the scenarios (see ScenarioRules.faults()), they are never modified.
+    """
+    torque_error_front: float = None
+    torque_error_rear: float = None
+    slew_rate: float = None
 
     def get_overall_torque(self):
         """
@@ -69,7 +484,7 @@ class TorqueFault:
         return False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class VerySlowSteeringReaction:
     """
     Applied steering reaction by the driver in degrees per second
@@ -77,7 +492,7 @@ class VerySlowSteeringReaction:
     steering_rate_limit: float
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SlowSteeringReaction:
     """
     Applied steering reaction by the driver in degrees per second
@@ -85,7 +500,7 @@ class SlowSteeringReaction:
     steering_rate_limit: float
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class BrakingReaction:
     """
     Applied braking reaction by the driver in percentage
@@ -93,7 +508,7 @@ class BrakingReaction:
     braking: float
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FaultTolerantTime:
     """
     Fault duration in milliseconds for the determination of the Fault Tolerant Time Interval (FTTI)
@@ -101,10 +516,11 @@ class FaultTolerantTime:
     ftti: float
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HazardousEvent:  # pylint: disable=too-many-instance-attributes
     """
-    Type containing all information for a Hazardous Event
+    Type containing all information for a Hazardous Event.
+    The texts repeated in the HARA are interned when read (see Hara._get_hazardous_event()).
     """
     identifier: str
     location: str
@@ -119,201 +535,373 @@ class HazardousEvent:  # pylint: disable=too-many-instance-attributes
     relevant: bool
     comment: str
 
+    @property
+    def hazard_code(self):
+        """
+        Code of the hazard (e.g. 'TQ1' for '[TQ1] Unintended acceleration during driving'), 'unknown' if not found
+        """
+        match = re.search(r'\[(TQ\d+)]', self.hazard or '')
+        return match.group(1) if match else 'unknown'
+
+
+class ScenarioRules:  # pylint: disable=too-many-instance-attributes
+    """
+    Rule table translating the texts of the HARA columns to the physical values of a Scenario.
+    The rules are compiled once from the config and the result is cached for each distinct (lower case) text,
+    so the same phrases repeated in the HARA are only evaluated once.
+    """
+    # Rule tables by digest of the scenario sections of the config, shared by the runs of a process (see load())
+    _loaded = {}
+
+    def __init__(self, config):
+        # Each rule is (texts matching exactly, keywords contained in the text, config key), see Table
+        # TODO: remove 'any' from the script, specify correctly the slope, speed and route in the HARA
+        self._slope_rules = self._compile('Slope', config.get_float, [
+            (('-',), ('any', 'flat'), 'flat'),
+            ((), ('slight',), 'slight_slope'),
+            ((), ('downhill',), 'downhill'),
+            ((), ('uphill',), 'uphill')])
+        self._speed_rules = self._compile('Speed', config.get_list, [
+            (('-',), ('any', 'stand'), 'standstill'),
+            ((), ('very low',), 'very_low'),
+            ((), ('low',), 'low'),
+            ((), ('medium',), 'medium'),
+            ((), ('high',), 'high')])
+        self._straight_rules = self.Table([(('-',), ('any', 'straight'), True)])
+        self._curve_rules = self.Table([((), ('curve',), True)])
+        self._curve_radius_rules = self._compile('Radius', config.get_list, [
+            ((), ('very_low',), 'curve_very_low_speed'),
+            (('-',), ('any', 'stand', 'low'), 'curve_low_speed'),
+            ((), ('medium',), 'curve_medium_speed'),
+            ((), ('high',), 'curve_high_speed')])
+        # Each road condition gives (friction, speed limit), the vehicle speed is only limited on icy and snowy roads.
+        # The mu-split friction (e.g. 0.9/0.3) is written to the scenario list as it is in the config
+        self._road_friction_rules = self.Table([
+            (('-',), ('any', 'dry'), (config.get_float('Road_friction', 'dry'), None)),
+            ((), ('wet',), (config.get_float('Road_friction', 'wet'), None)),
+            ((), ('icy', 'snow'), (config.get_float('Road_friction', 'icy'), 80)),
+            ((), ('gravel',), (config.get_float('Road_friction', 'gravel'), None)),
+            ((), ('mu-split',), (config.get_entry('Road_friction', 'mu-split'), None))])
+        self._acceleration_rules = self._compile('Driver', config.get_float, [
+            ((), ('pressed',), 'brake_pressed')])
+        self._maneuver_rules = self._compile('Driver', config.get_float, [
+            ((), ('overtaking',), 'overtaking')])
+        self._faults = self._compile_faults(config)
+        # Reactions by (fault, straight road, road friction), see reactions()
+        self._reactions = {}
+        self._config = config
+
+    @classmethod
+    def load(cls, config):
+        """
+        Gets the rule tables of a config, they are only compiled again when the scenario sections of the config differ
+        from the ones of the configs already loaded (e.g. the projects of a batch sharing the same rules)
+        :param config: Config
+        :return: Returns the ScenarioRules
+        """
+        digest = config.digest(SCENARIO_SECTIONS)
+        rules = cls._loaded.get(digest)
+        if rules is None:
+            rules = cls._loaded[digest] = cls(config)
+        return rules
+
+    @classmethod
+    def _compile(cls, section, get_value, rules):
+        return cls.Table([(texts, keywords, get_value(section, key)) for texts, keywords, key in rules])
+
+    @staticmethod
+    def _compile_faults(config):
+        """
+        Builds the faults of each hazard once, as (hazard code, faults) in the order the codes are searched for
+        """
+        slew_rate = config.get_float('Hazard_TQ', 'slew_rate')
+        torque = {code: config.get_float('Hazard_TQ', code) for code in
+                  ('TQ1', 'TQ2', 'TQ3', 'TQ4', 'TQ5', 'TQ6', 'TQ7')}
+        return [
+            ('[TQ1]', (TorqueFault(torque['TQ1'], torque['TQ1'], slew_rate),)),
+            ('[TQ2]', (TorqueFault(torque['TQ2'], torque['TQ2'], slew_rate),
+                       TorqueFault(torque_error_front=torque['TQ2'], slew_rate=slew_rate),
+                       TorqueFault(torque_error_rear=torque['TQ2'], slew_rate=slew_rate))),
+            ('[TQ3]', (TorqueFault(torque['TQ3'], torque['TQ3'], slew_rate),)),
+            ('[TQ4]', (TorqueFault(-1 * torque['TQ4'], -1 * torque['TQ4'], slew_rate),)),
+            ('[TQ5]', (TorqueFault(-1 * torque['TQ5'], -1 * torque['TQ5'], slew_rate),)),
+            ('[TQ6]', (TorqueFault(torque_error_front=-1 * torque['TQ6'], slew_rate=slew_rate),
+                       TorqueFault(torque_error_rear=-1 * torque['TQ6'], slew_rate=slew_rate),
+                       TorqueFault(-1 * torque['TQ6'], -1 * torque['TQ6'], slew_rate),
+                       TorqueFault(torque['TQ6'], -1 * torque['TQ6'], slew_rate),
+                       TorqueFault(-1 * torque['TQ6'], torque['TQ6'], slew_rate))),
+            ('[TQ7]', (TorqueFault(torque['TQ7'], torque['TQ7'], slew_rate),))]
+
+    def road_gradient(self, slope):
+        """
+        Gets the road gradient for the text of the 'Slope' column
+        :param slope: Slope text in lower case
+        :return: Returns the road gradient in %, None if the text is not recognized
+        """
+        return self._slope_rules.lookup(slope)
+
+    def vehicle_speed(self, vehicle_speed):
+        """
+        Gets the vehicle speeds for the text of the 'Vehicle Speed' column
+        :param vehicle_speed: Vehicle speed text in lower case
+        :return: Returns a tuple of vehicle speeds in km/h, None if the text is not recognized
+        """
+        return self._speed_rules.lookup(vehicle_speed)
+
+    def is_straight(self, route):
+        """
+        Checks if the text of the 'Route' column means a straight road
+        :param route: Route text in lower case
+        :return: Returns True for a straight road, False for a curve, None if the text is not recognized
+        """
+        if self._straight_rules.lookup(route) is not None:
+            return True
+        if self._curve_rules.lookup(route) is not None:
+            return False
+        return None
+
+    def curve_radius(self, vehicle_speed):
+        """
+        Gets the curve radiuses for the text of the 'Vehicle Speed' column
+        :param vehicle_speed: Vehicle speed text in lower case
+        :return: Returns a tuple of curve radiuses in m, None if the text is not recognized
+        """
+        return self._curve_radius_rules.lookup(vehicle_speed)
+
+    def road_friction(self, road_condition):
+        """
+        Gets the road friction and the speed limit for the text of the 'Road Condition' column
+        :param road_condition: Road condition text in lower case
+        :return: Returns (friction coefficient (the text for mu-split), maximum vehicle speed in km/h or None if the
+                 speed is not limited), None if the text is not recognized
+        """
+        return self._road_friction_rules.lookup(road_condition)
+
+    def acceleration(self, brake_pedal, maneuver):
+        """
+        Gets the acceleration from the driver inputs prior to the malfunction
+        :param brake_pedal: Brake pedal text in lower case
+        :param maneuver: Maneuver text in lower case
+        :return: Returns the acceleration in m/s2
+        """
+        acceleration = self._acceleration_rules.lookup(brake_pedal)
+        if acceleration is None:
+            acceleration = self._maneuver_rules.lookup(maneuver)
+        return acceleration if acceleration is not None else 0.0
+
+    def faults(self, hazard):
+        """
+        Gets the faults for the text of the 'Hazard' column
+        :param hazard: Hazard text, containing the hazard code (e.g. '[TQ1] Unintended acceleration during driving')
+        :return: Returns a tuple of faults shared by all the scenarios of the hazard, empty if no code is found
+        """
+        if hazard is not None:
+            for code, faults in self._faults:
+                if code in hazard:
+                    return faults
+        return ()
+
+    def reactions(self, fault, scenario):
+        """
+        Gets the expected reactions to a fault, they are only derived once for each fault and road (see
+        ScenarioList._get_reactions())
+        :param fault: Malfunction
+        :param scenario: Scenario
+        :return: Returns all the expected reactions in a list, shared by all the scenarios on the same road
+        """
+        friction = scenario.road_friction if isinstance(scenario.road_friction, float) else None
+        key = (fault, isinstance(scenario.road_radius, str), friction)
+        try:
+            return self._reactions[key]
+        except KeyError:
+            pass
+        reactions = ScenarioList._get_reactions(self._config, fault, scenario)  # pylint: disable=protected-access
+        self._reactions[key] = reactions
+        return reactions
+
+    class Table:  # pylint: disable=too-few-public-methods
+        """
+        Ordered rules of (texts matching exactly, keywords contained in the text, value), the first match wins
+        """
+        def __init__(self, rules):
+            self._rules = rules
+            self._cache = {}
+
+        def lookup(self, text):
+            """
+            Gets the value of the first rule matching the text
+            :param text: Text of a HARA column in lower case
+            :return: Returns the value of the rule, None if no rule is matching
+            """
+            try:
+                return self._cache[text]
+            except KeyError:
+                pass
+            value = None
+            for texts, keywords, rule_value in self._rules:
+                if text in texts or any(_ in text for _ in keywords):
+                    value = rule_value
+                    break
+            self._cache[text] = value
+            return value
+
 
 class Scenario:  # pylint: disable=too-few-public-methods
     """
     Converts a Hazardous event to a Scenario (using the config settings)
     """
+    __slots__ = ('_config', '_rules', '_hazardous_event', 'road_gradient', 'vehicle_speed', 'road_radius',
+                 'road_friction', 'speed_limit', 'acceleration', 'faults')
 
-    def __init__(self, config, hazardous_event):
+    def __init__(self, config, hazardous_event, rules=None):
+        """
+        :param config: Config
+        :param hazardous_event: Hazardous event of the HARA
+        :param rules: ScenarioRules compiled from the same config, shared between the scenarios
+        """
         self._config = config
+        self._rules = rules if rules is not None else ScenarioRules.load(config)
         self._hazardous_event = hazardous_event
         slope = hazardous_event.slope.lower()
         route = hazardous_event.route.lower()
         road_condition = hazardous_event.road_condition.lower()
         engaged_gear = hazardous_event.engaged_gear.lower()
         vehicle_speed = hazardous_event.vehicle_speed.lower()
-        brake_pedal = hazardous_event.brake_pedal.lower()
-        maneuver = hazardous_event.maneuver.lower()
 
         self.road_gradient = self._get_road_gradient(slope)
-        self.vehicle_speed = self._get_vehicle_speed(vehicle_speed, engaged_gear)
+        self.vehicle_speed = self._get_vehicle_speed(vehicle_speed)
         self.road_radius = self._get_road_radius(route, vehicle_speed)
         self.road_friction = self._get_road_friction(road_condition)
-        self.acceleration = self._get_acceleration(brake_pedal, maneuver)
+        self.acceleration = self.get_acceleration(self.vehicle_speed)
         self.faults = self._get_faults(engaged_gear)
 
     def _get_road_gradient(self, slope):
-        if slope == '-' or any(_ in slope for _ in ['any', 'flat']):
-            # TODO: remove 'any' from the script, specify correctly the slope in the HARA
-            road_gradient = self._config.get_entry('Slope', 'flat')
-        elif 'slight' in slope:
-            road_gradient = self._config.get_entry('Slope', 'slight_slope')
-        elif 'downhill' in slope:
-            road_gradient = self._config.get_entry('Slope', 'downhill')
-        elif 'uphill' in slope:
-            road_gradient = self._config.get_entry('Slope', 'uphill')
-        else:
+        road_gradient = self._rules.road_gradient(slope)
+        if road_gradient is None:
             raise KeyError(f"Slope {slope} not recognized in hazardous event {self._hazardous_event.identifier}")
-        try:
-            return float(road_gradient)
-        except ValueError as exc:
-            raise ValueError(f"Invalid road gradient '{road_gradient}' in config file, in Slope section") from exc
-
-    def _get_vehicle_speed(self, vehicle_speed, engaged_gear):
-        if vehicle_speed == '-' or any(_ in vehicle_speed for _ in ['any', 'stand']):
-            # TODO: remove 'any' from the script, specify correctly the speed in the HARA
-            speed_list_text = self._config.get_entry('Speed', 'standstill')
-        elif 'very low' in vehicle_speed:
-            speed_list_text = self._config.get_entry('Speed', 'very_low')
-        elif 'low' in vehicle_speed:
-            speed_list_text = self._config.get_entry('Speed', 'low')
-        elif 'medium' in vehicle_speed:
-            speed_list_text = self._config.get_entry('Speed', 'medium')
-        elif 'high' in vehicle_speed:
-            speed_list_text = self._config.get_entry('Speed', 'high')
-        else:
+        return road_gradient
+
+    def _get_vehicle_speed(self, vehicle_speed):
+        speed = self._rules.vehicle_speed(vehicle_speed)
+        if speed is None:
             raise KeyError(f"Speed '{vehicle_speed}' not recognized "
                            f"in hazardous event {self._hazardous_event.identifier}")
-        speed_list = speed_list_text.strip('[').strip(']').split(',')
-        speed = [.0] * len(speed_list)
-        for i, _ in enumerate(speed_list):
-            try:
-                speed[i] = float(speed_list[i]) if engaged_gear != 'r' else 1 * float(speed_list[i])
-            except ValueError as exc:
-                raise ValueError(f"Invalid speed thresholds in config file, "
-                                 f"'{speed_list_text}' in Speed section") from exc
-        return speed
+        return list(speed)
 
     def _get_road_radius(self, route, vehicle_speed):
-        if route == '-' or any(_ in route for _ in ['any', 'straight']):
-            # TODO: remove 'any' from the script, specify correctly the route in the HARA
-            road_radius = 'straight'
-        elif 'curve' in route:
-            if 'very_low' in vehicle_speed:
-                radius = self._config.get_entry('Radius', 'curve_very_low_speed')
-            elif vehicle_speed == '-' or any(_ in vehicle_speed for _ in ['any', 'stand', 'low']):
-                # TODO: remove 'any' from the script, specify correctly the speed in the HARA
-                radius = self._config.get_entry('Radius', 'curve_low_speed')
-            elif 'medium' in vehicle_speed:
-                radius = self._config.get_entry('Radius', 'curve_medium_speed')
-            elif 'high' in vehicle_speed:
-                radius = self._config.get_entry('Radius', 'curve_high_speed')
-            else:
-                raise KeyError(f"Speed '{vehicle_speed}' not recognized "
-                               f"in hazardous event {self._hazardous_event.identifier}")
-            radius_list = radius.strip('[').strip(']').split(',')
-            road_radius = [.0] * len(radius_list)
-            for i, _ in enumerate(radius_list):
-                try:
-                    road_radius[i] = float(radius_list[i])
-                except ValueError as exc:
-                    raise ValueError(f"Invalid curve radius in config file, '{radius}' in Radius section") from exc
-            if len(road_radius) != len(self.vehicle_speed):
-                raise ValueError("Invalid curve radius specification in config file, "
-                                 "the number of radius specified has to match the number of speeds defined.")
-        else:
+        straight = self._rules.is_straight(route)
+        if straight is None:
             raise KeyError(f"Route '{route}' not recognized")
-        return road_radius
+        if straight:
+            return 'straight'
+        road_radius = self._rules.curve_radius(vehicle_speed)
+        if road_radius is None:
+            raise KeyError(f"Speed '{vehicle_speed}' not recognized "
+                           f"in hazardous event {self._hazardous_event.identifier}")
+        if len(road_radius) != len(self.vehicle_speed):
+            raise ValueError("Invalid curve radius specification in config file, "
+                             "the number of radius specified has to match the number of speeds defined.")
+        return list(road_radius)
 
     def _get_road_friction(self, road_condition):
-        if road_condition == '-' or any(_ in road_condition for _ in ['any', 'dry']):
-            road_friction_text = self._config.get_entry('Road_friction', 'dry')
-        elif 'wet' in road_condition:
-            road_friction_text = self._config.get_entry('Road_friction', 'wet')
-        elif 'icy' in road_condition or 'snow' in road_condition:
-            road_friction_text = self._config.get_entry('Road_friction', 'icy')
-            for i, _ in enumerate(self.vehicle_speed):
-                self.vehicle_speed[i] = min(self.vehicle_speed[i], 80)
-        elif 'gravel' in road_condition:
-            road_friction_text = self._config.get_entry('Road_friction', 'gravel')
-        elif 'mu-split' in road_condition:
-            road_friction_text = self._config.get_entry('Road_friction', 'mu-split')
-        else:
+        rule = self._rules.road_friction(road_condition)
+        if rule is None:
             raise KeyError(f"Road condition {road_condition} not recognized "
                            f"in hazardous event {self._hazardous_event.identifier}")
+        road_friction, self.speed_limit = rule
+        if self.speed_limit is not None:
+            for i, _ in enumerate(self.vehicle_speed):
+                self.vehicle_speed[i] = min(self.vehicle_speed[i], self.speed_limit)
+        return road_friction
 
-        if 'mu-split' not in road_condition:
-            try:
-                road_friction = float(road_friction_text)
-            except ValueError as exc:
-                raise ValueError(f"Invalid road friction in config file, "
-                                 f"'{road_friction_text}' in Road_friction section") from exc
-        else:
-            road_friction = road_friction_text
+    def get_acceleration(self, vehicle_speed):
+        """
+        Gets the acceleration from the driver inputs prior to the malfunction, e.g. for the swept speeds (see Sweep)
+        :param vehicle_speed: List of vehicle speeds in km/h
+        :return: Returns the acceleration in m/s2, None at standstill
+        """
+        if any(v != 0 for v in vehicle_speed):
+            return self._rules.acceleration(self._hazardous_event.brake_pedal.lower(),
+                                            self._hazardous_event.maneuver.lower())
+        return None
 
-        return road_friction
+    def _get_faults(self, engaged_gear):  # pylint: disable=unused-argument
+        # The direction of the faults does not depend on the engaged gear, the faults are shared between the scenarios
+        return self._rules.faults(self._hazardous_event.hazard)
 
-    def _get_acceleration(self, brake_pedal, maneuver):
-        if any(v != 0 for v in self.vehicle_speed):
-            if 'pressed' in brake_pedal:
-                acceleration_text = self._config.get_entry('Driver', 'brake_pressed')
-            elif 'overtaking' in maneuver:
-                acceleration_text = self._config.get_entry('Driver', 'overtaking')
-            else:
-                acceleration_text = 0
-            try:
-                acceleration = float(acceleration_text)
-            except ValueError as exc:
-                raise ValueError(f"Invalid driver input value in config file, "
-                                 f"'{acceleration_text}' in Driver section") from exc
-        else:
-            acceleration = None
 
-        return acceleration
+class TestRunIndex:
+    """
+    Addresses the lines of the Scenario_List by test run ID without expanding the scenarios.
+    The number of lines of each relevant hazardous event is computed from its vehicle speeds, faults and reactions,
+    and a test run ID is located by bisection in the prefix sums of these numbers. The IDs are the ones of the
+    lines written one by one in HARA order (see ScenarioList.write_line()), without dedup, sweep or cost ordering.
+    """
 
-    def _get_faults(self, engaged_gear):
-        faults = []
-        if self._hazardous_event.hazard is None:
-            return []
-        if engaged_gear is None or engaged_gear != 'R':
-            direction = 1
-        else:
-            direction = 1
-
-        if '[TQ1]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=self._config.get_float('Hazard_TQ', 'TQ1'),
-                                      torque_error_rear=self._config.get_float('Hazard_TQ', 'TQ1'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ2]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=self._config.get_float('Hazard_TQ', 'TQ2'),
-                                      torque_error_rear=self._config.get_float('Hazard_TQ', 'TQ2'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_front=self._config.get_float('Hazard_TQ', 'TQ2'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_rear=self._config.get_float('Hazard_TQ', 'TQ2'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ3]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=direction * self._config.get_float('Hazard_TQ', 'TQ3'),
-                                      torque_error_rear=direction * self._config.get_float('Hazard_TQ', 'TQ3'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ4]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ4'),
-                                      torque_error_rear=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ4'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ5]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ5'),
-                                      torque_error_rear=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ5'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ6]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_rear=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_front=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      torque_error_rear=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_front=direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      torque_error_rear=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-            faults.append(TorqueFault(torque_error_front=-1 * direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      torque_error_rear=direction * self._config.get_float('Hazard_TQ', 'TQ6'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        elif '[TQ7]' in self._hazardous_event.hazard:
-            faults.append(TorqueFault(torque_error_front=self._config.get_float('Hazard_TQ', 'TQ7'),
-                                      torque_error_rear=self._config.get_float('Hazard_TQ', 'TQ7'),
-                                      slew_rate=self._config.get_float('Hazard_TQ', 'slew_rate')))
-        return faults
+    def __init__(self, config, hazardous_events, rules=None):
+        """
+        :param config: Config
+        :param hazardous_events: Hazardous events in HARA order, the ones which are not relevant are skipped
+        :param rules: ScenarioRules compiled from the same config
+        """
+        self._rules = rules if rules is not None else ScenarioRules.load(config)
+        self.hazardous_events = []
+        self._scenarios = []
+        # Last test run ID of each hazardous event
+        self._last_ids = []
+        last_id = 0
+        for hazardous_event in hazardous_events:
+            if not hazardous_event.relevant:
+                continue
+            scenario = Scenario(config, hazardous_event, self._rules)
+            last_id += len(scenario.vehicle_speed) * sum(self._reaction_counts(scenario))
+            self.hazardous_events.append(hazardous_event)
+            self._scenarios.append(scenario)
+            self._last_ids.append(last_id)
+
+    @property
+    def test_run_count(self):
+        """
+        Number of test runs of the Scenario_List
+        """
+        return self._last_ids[-1] if self._last_ids else 0
+
+    def _reaction_counts(self, scenario):
+        return [len(self._rules.reactions(fault, scenario)) for fault in scenario.faults]
+
+    def locate(self, test_run_id):
+        """
+        Gets the combination of a test run
+        :param test_run_id: Test run ID of the Scenario_List, starting from 1
+        :return: Returns (hazardous event index, speed index, fault index, reaction index), None if there is no such
+                 test run. The hazardous event index refers to hazardous_events.
+        """
+        if not 1 <= test_run_id <= self.test_run_count:
+            return None
+        # The hazardous events without any line have the same last ID as the previous one, the first one is the owner
+        i_event = bisect.bisect_left(self._last_ids, test_run_id)
+        offset = test_run_id - 1 - (self._last_ids[i_event - 1] if i_event > 0 else 0)
+        reaction_counts = self._reaction_counts(self._scenarios[i_event])
+        i_speed, offset = divmod(offset, sum(reaction_counts))
+        for i_fault, reaction_count in enumerate(reaction_counts):
+            if offset < reaction_count:
+                return i_event, i_speed, i_fault, offset
+            offset -= reaction_count
+        return None
+
+    def line(self, location):
+        """
+        Expands a single line of a scenario
+        :param location: Combination of the test run (see locate())
+        :return: Returns the values of the line, as ScenarioList.lines()
+        """
+        i_event, i_speed, i_fault, i_reaction = location
+        scenario = self._scenarios[i_event]
+        radius = scenario.road_radius if isinstance(scenario.road_radius, str) else scenario.road_radius[i_speed]
+        fault = scenario.faults[i_fault]
+        reaction = self._rules.reactions(fault, scenario)[i_reaction]
+        return ScenarioList._get_line(self.hazardous_events[i_event], scenario,  # pylint: disable=protected-access
+                                      scenario.vehicle_speed[i_speed], radius, fault, reaction)
 
 
 class Hara:
@@ -321,22 +909,39 @@ class Hara:
     Loads the HARA sheet and gets the hazardous events
     """
 
-    def __init__(self, config):
+    def __init__(self, config, streaming=True):
+        """
+        :param config: Config
+        :param streaming: When True (default) the HARA is opened in read-only mode and scanned row by row,
+                          otherwise the whole workbook is loaded and the cells are accessed randomly
+        """
         self._config = config
-        hara_path = self._config.get_entry('Hara_Sheet', 'path')
-        sheet_name = self._config.get_entry('Hara_Sheet', 'sheet_name')
-        if not os.path.exists(hara_path):
-            raise FileNotFoundError(f"Hara sheet was not found: {hara_path}")
-        hara_workbook = openpyxl.load_workbook(hara_path, data_only=True)
-        try:
-            self._sheet = hara_workbook[sheet_name]
-        except KeyError as exc:
-            raise KeyError(f"Sheet {sheet_name} was not found in {hara_path}") from exc
+        self._path = self._config.get_entry('Hara_Sheet', 'path')
+        if not os.path.exists(self._path):
+            raise FileNotFoundError(f"Hara sheet was not found: {self._path}")
+        self._streaming = streaming
         header_size = self._config.get_int('Hara_Sheet', 'header_size')
         if header_size < 0:
             raise ValueError(f"Header size {header_size} is invalid. It has to be greater or equal to 0")
         self._current_row = header_size
         self._indexes = self.Indexes(config)
+        # The read-only workbook keeps the file open until it is closed, it is only opened while it is scanned
+        self._workbook = self._sheet = None
+        if not streaming:
+            self._open_workbook()
+
+    def _open_workbook(self):
+        """
+        Opens the HARA workbook and selects the HARA sheet, the workbook is closed again if the sheet is missing
+        """
+        sheet_name = self._config.get_entry('Hara_Sheet', 'sheet_name')
+        # openpyxl is only imported when a workbook is opened, so the command line starts fast
+        import openpyxl  # pylint: disable=import-outside-toplevel
+        self._workbook = openpyxl.load_workbook(self._path, read_only=self._streaming, data_only=True)
+        if sheet_name not in self._workbook.sheetnames:
+            self._workbook.close()
+            raise KeyError(f"Sheet {sheet_name} was not found in {self._path}")
+        self._sheet = self._workbook[sheet_name]
 
     def _read_current_row(self, idx_column):
         return self._sheet.cell(row=self._current_row, column=idx_column).value
@@ -346,29 +951,64 @@ class Hara:
         Gets the hazardous events from the HARA
         :return: Returns a HazardousEvents containing all the info for the hazardous event
         """
+        if self._streaming:
+            yield from self._stream_hazardous_events()
+            return
         while True:
             self._current_row += 1
-            hazardous_event_id = self._read_current_row(self._indexes.id)
-            location = self._read_current_row(self._indexes.location)
-            slope = self._read_current_row(self._indexes.slope)
-            route = self._read_current_row(self._indexes.route)
-            road_condition = self._read_current_row(self._indexes.road_condition)
-            engaged_gear = self._read_current_row(self._indexes.engaged_gear)
-            vehicle_speed = self._read_current_row(self._indexes.vehicle_speed)
-            brake_pedal = self._read_current_row(self._indexes.brake_pedal)
-            maneuver = self._read_current_row(self._indexes.maneuver)
-            hazard = self._read_current_row(self._indexes.hazard)
-            relevance = self._read_current_row(self._indexes.relevance) == 'x'
-            comment = self._read_current_row(self._indexes.comment)
-
-            hazardous_event = HazardousEvent(hazardous_event_id, location, slope, route, road_condition, engaged_gear,
-                                             vehicle_speed, brake_pedal, maneuver, hazard, relevance, comment)
-
+            hazardous_event = self._get_hazardous_event(self._read_current_row)
             if hazardous_event.identifier is not None:
                 yield hazardous_event
             else:
                 break
 
+    def _stream_hazardous_events(self):
+        """
+        Scans the HARA sheet sequentially, reading only the range of columns listed in the indexes
+        :return: Returns the hazardous events one by one
+        """
+        columns = self._indexes.columns()
+        min_col = min(columns)
+        max_col = max(columns)
+        self._open_workbook()
+        try:
+            # The dimensions stored in the file are not always reliable, the sheet is scanned until the first empty row
+            self._sheet.reset_dimensions()
+            for row in self._sheet.iter_rows(min_row=self._current_row + 1, min_col=min_col, max_col=max_col,
+                                             values_only=True):
+                self._current_row += 1
+                hazardous_event = self._get_hazardous_event(lambda idx_column, row=row: row[idx_column - min_col])
+                if hazardous_event.identifier is None:
+                    break
+                yield hazardous_event
+        finally:
+            self._workbook.close()
+            self._workbook = self._sheet = None
+
+    def _get_hazardous_event(self, read):
+        """
+        Builds a hazardous event from the current row
+        :param read: Function returning the value of the current row for a column index
+        :return: Returns the hazardous event
+        """
+        # The texts of the conditions and hazards are repeated in the whole HARA, a single copy of each is kept
+        return HazardousEvent(identifier=read(self._indexes.id),
+                              location=self._intern(read(self._indexes.location)),
+                              slope=self._intern(read(self._indexes.slope)),
+                              route=self._intern(read(self._indexes.route)),
+                              road_condition=self._intern(read(self._indexes.road_condition)),
+                              engaged_gear=self._intern(read(self._indexes.engaged_gear)),
+                              vehicle_speed=self._intern(read(self._indexes.vehicle_speed)),
+                              brake_pedal=self._intern(read(self._indexes.brake_pedal)),
+                              maneuver=self._intern(read(self._indexes.maneuver)),
+                              hazard=self._intern(read(self._indexes.hazard)),
+                              relevant=read(self._indexes.relevance) == 'x',
+                              comment=read(self._indexes.comment))
+
+    @staticmethod
+    def _intern(value):
+        return sys.intern(value) if isinstance(value, str) else value
+
     class Indexes:  # pylint: disable=too-many-instance-attributes disable=too-few-public-methods
         """
         Loads the indexes for the columns of the HARA sheet
@@ -387,27 +1027,79 @@ class Hara:
             self.relevance = config.get_int('Hara_Sheet', 'idx_relevance')
             self.comment = config.get_int('Hara_Sheet', 'idx_comment')
 
+        def columns(self):
+            """
+            Gets the indexes of all the columns read from the HARA sheet
+            :return: Returns the column indexes
+            """
+            return list(vars(self).values())
+
 
-class ScenarioList:
+class ScenarioList:  # pylint: disable=too-many-instance-attributes
     """
     Generates the Scenario list to a file
     """
 
-    def __init__(self, config, mode):
+    # Number of rows buffered before they are written to the sheet
+    ROW_BLOCK_SIZE = 1000
+    # Number of rows of an Excel sheet, including the header
+    MAX_ROWS = 1048576
+    # Visibility of the columns after the template columns in the FTTI and Acceptance lists
+    LIST_COLUMN_VISIBILITY = {'Z': False, 'AA': True, 'AB': True, 'AC': False, 'AD': False, 'AE': False, 'AF': False,
+                              'AG': False, 'AH': False, 'AI': True}
+    SHARD_STRATEGIES = ('count', 'hazard', 'cost')
+    # Keys of the line values written by the reactions of the driver
+    REACTION_KEYS = ('very_slow_steering', 'slow_steering', 'braking', 'ftti')
+    # Columns of the columnar outputs which are not always numeric
+    TEXT_COLUMNS = ('hara_id', 'test_run_id', 'constant_road_radius', 'road_friction_coefficient',
+                    'severity_rationale', 'exposure_changed_rationale', 'severity_changed_rationale',
+                    'controllability_rationale')
+
+    def __init__(self, config, mode,  # pylint: disable=too-many-arguments,too-many-statements,too-many-locals
+                 streaming=False, track_test_runs=False, columnar=None, *, dedup=False, shard_by=None, shards=None,
+                 shard_name=None, vsm=False, vsm_jobs=1, vsm_skip_invalid=False, dry_run=False):
+        """
+        :param config: Config
+        :param mode: Either 'Scenario_List', 'FTTI_List' or 'Acceptance_List'
+        :param streaming: When True the rows are appended to a write-only workbook which only contains the header of
+                          the template (stamped out from the cached TemplateDescriptor), otherwise the template is
+                          loaded and filled in place
+        :param track_test_runs: When True the values written for each test run ID are kept in test_runs
+        :param columnar: Either None, 'csv' or 'parquet'. The rows are also written in this format, next to the
+                         workbook, with one column per column of the template (named as the idx_ keys of the
+                         Scenario_Template config section) and the values of the formulas instead of the formulas
+        :param dedup: When True the lines with the same physical scenario (all the values except the HARA ID) share
+                      the test run of the first one, which is written only once. In Scenario_List mode the test run
+                      of each hazardous event is recorded in a mapping sheet (mapping_sheet_name of the Scenario_List
+                      config section). In FTTI_List and Acceptance_List modes the test run IDs of the HARA comments
+                      refer to the shared test runs.
+        :param shard_by: When specified the rows are split into several workbooks (shards), named after the list
+                         with a suffix, which can be simulated concurrently. Either 'count' (the same number of rows
+                         in each shard), 'hazard' (one shard per hazard code) or 'cost' (the same estimated
+                         simulation cost in each shard, see CostModel). The test run IDs are the same as without
+                         sharding, and the test runs of each shard are listed in a JSON manifest next to the workbooks.
+        :param shards: Number of shards of the 'count' and 'cost' sharding
+        :param shard_name: Suffix of the path of a shard, only used for the shards of a sharded list
+        :param vsm: When True the VSM testrun of each row is also generated, and the testruns are saved as the .vsd
+                    input file of VSM (see VsmTestrunWriter), which VSM_Testrun_Export.m generates from the workbook
+        :param vsm_jobs: Number of processes generating the VSM testruns
+        :param vsm_skip_invalid: When True the VSM testruns which VSM_Testrun_Export.m rejects are skipped (see
+                                 vsm_skipped), otherwise a ValueError is raised
+        :param dry_run: When True the rows are only counted, by hazard code in rows_per_hazard, and nothing is
+                        written: the workbook is not opened and save() does nothing
+        """
         self._config = config
+        self.test_runs = {} if track_test_runs else None
         template_path = config.get_entry('Scenario_Template', 'path')
         sheet_name = config.get_entry('Scenario_Template', 'sheet_name')
         if not os.path.exists(template_path):
             raise FileNotFoundError(f"Scenario template was not found: {os.path.abspath(template_path)}")
-        self._workbook = openpyxl.load_workbook(template_path)
-        self._sheet = self._workbook[sheet_name]
-        if self._sheet is None:
-            raise KeyError(f"Sheet {sheet_name} was not found in {template_path}")
         header_size = self._config.get_int('Scenario_Template', 'header_size')
         if header_size < 0:
             raise ValueError(f"Header size {header_size} is invalid. It has to be greater or equal to 0")
         self._header_size = header_size
         self._current_row = header_size
+        self._row_count = 0
         self._current_test_run_id = 0
         self._indexes = self.Indexes(self._config)
         if mode.lower() == 'scenario_list':
@@ -419,9 +1111,117 @@ class ScenarioList:
         else:
             raise ValueError(f"Mode '{mode}' is not valid. "
                              f"Either use mode 'Scenario_List', 'FTTI_List' or 'Acceptance_List'")
+        if shard_name is not None:
+            self._path = f"{os.path.splitext(self._path)[0]}_{shard_name}{os.path.splitext(self._path)[1]}"
         self._mode = mode
+        self._streaming = streaming
+        self._columnar_format = columnar
+        self._shard_by = shard_by
+        self._shard_count = shards
+        self._dry_run = dry_run
+        self.rows_per_hazard = collections.Counter()
+        # Shards by name and their number of rows and estimated cost, the rows are written to the shards
+        self._shards = None
+        if dry_run:
+            self._workbook = self._sheet = self._row_cells = None
+        elif shard_by is not None:
+            if shard_by not in self.SHARD_STRATEGIES:
+                raise ValueError(f"Sharding '{shard_by}' is not valid. "
+                                 f"Either use {', '.join(self.SHARD_STRATEGIES)}")
+            if shard_by != 'hazard' and (shards is None or shards < 1):
+                raise ValueError(f"The number of shards has to be specified for the '{shard_by}' sharding")
+            self._shards = {}
+            self._cost_model = CostModel(config)
+            # Test run IDs and estimated simulation cost of each shard
+            self._shard_test_runs = {}
+            self._shard_costs = {}
+            self._workbook = self._sheet = self._row_cells = None
+        else:
+            self._open_workbook(template_path, sheet_name)
+        # Rows are buffered as lists of values in column order and written to the sheet by blocks
+        self._positions = {key: idx_column - 1 for key, idx_column in vars(self._indexes).items()}
+        row_size = len(self._row_cells) if self._row_cells is not None else max(self._positions.values()) + 1
+        self._empty_row = [None] * row_size
+        self._rows = []
+        self._formulas = self._compile_formulas() if not dry_run else []
+        # Test run ID of each physical scenario, and the test runs of the hazardous events as (HARA ID, test run ID)
+        self._scenario_index = {} if dedup else None
+        self._scenario_mapping = {} if dedup else None
+        self.duplicate_count = 0
+        self._targets_written = set()
+        self._columnar = self._open_columnar(columnar) if self._shards is None and not dry_run else None
+        self._vsm_jobs = vsm_jobs if vsm else None
+        self._vsm_skip_invalid = vsm_skip_invalid
+        self._vsm = self._open_vsm(shard_name) if vsm and self._shards is None and not dry_run else None
+
+    def _open_workbook(self, template_path, sheet_name):
+        import openpyxl  # pylint: disable=import-outside-toplevel
+        from packages.template import TemplateDescriptor  # pylint: disable=import-outside-toplevel
+        if self._streaming:
+            template = TemplateDescriptor.load(template_path, sheet_name, self._header_size,
+                                               max(vars(self._indexes).values()))
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet(sheet_name)
+            self._row_cells = template.stamp(self._sheet, self._get_column_visibility())
+        else:
+            self._workbook = openpyxl.load_workbook(template_path)
+            if sheet_name not in self._workbook.sheetnames:
+                raise KeyError(f"Sheet {sheet_name} was not found in {template_path}")
+            self._sheet = self._workbook[sheet_name]
+            self._row_cells = None
+
+    def _open_columnar(self, columnar):
+        if columnar is None:
+            return None
+        template_section = self._config.section('Scenario_Template')
+        indexes = {template_section[key]: key[len('idx_'):] for key in template_section if key.startswith('idx_')}
+        columns = [indexes.get(i_col, f'column_{i_col}') for i_col in range(1, max(indexes) + 1)]
+        if columnar.lower() == 'csv':
+            return CsvWriter(os.path.splitext(self._path)[0] + '.csv', columns)
+        if columnar.lower() == 'parquet':
+            return ParquetWriter(os.path.splitext(self._path)[0] + '.parquet', columns, self.TEXT_COLUMNS)
+        raise ValueError(f"Columnar format '{columnar}' is not valid. Either use 'csv' or 'parquet'")
+
+    def _open_vsm(self, shard_name):
+        # The testruns need the optional numpy and scipy packages
+        from packages.vsm_testrun import VsmTestrunWriter  # pylint: disable=import-outside-toplevel
+        return VsmTestrunWriter(self._config, self._mode, shard_name, self._vsm_jobs, self._vsm_skip_invalid)
+
+    def _compile_formulas(self):
+        """
+        Compiles the formulas written in each row, only the row number has to be filled in
+        :return: Returns the position and the template of each formula
+        """
+        from openpyxl.utils import get_column_letter  # pylint: disable=import-outside-toplevel
+        radius = get_column_letter(self._indexes.constant_road_radius) + '{0}'
+        friction = get_column_letter(self._indexes.road_friction_coefficient) + '{0}'
+        lateral_acceleration = get_column_letter(self._indexes.lateral_acceleration) + '{0}'
+        speed = get_column_letter(self._indexes.desired_vehicle_speed) + '{0}'
+        return [(self._positions['lateral_acceleration'],
+                 f'=IF(ISNUMBER({radius}), ({speed}/3.6)^2/{radius}, "-")'),
+                (self._positions['friction_coefficient_exploitation'],
+                 f'=IF(ISNUMBER({radius}), {lateral_acceleration}/{friction}*100/9.81, "-")')]
+
+    def _flush_rows(self):
+        """
+        Writes the buffered rows to the sheet
+        """
+        if self._streaming:
+            # The styled cells of the columns are reused for every row, the write-only sheet serializes them at once
+            for row in self._rows:
+                for cell, value in zip(self._row_cells, row):
+                    cell.value = value
+                self._sheet.append(self._row_cells)
+        else:
+            first_row = self._current_row - len(self._rows) + 1
+            for i_row, row in enumerate(self._rows, first_row):
+                for i_col, value in enumerate(row, 1):
+                    if value is not None:
+                        self._sheet.cell(row=i_row, column=i_col, value=value)
+        self._rows.clear()
 
     def _clear_columns(self, idx_first_column):
+        import openpyxl.styles  # pylint: disable=import-outside-toplevel
         i_column = idx_first_column
         while True:
             if self._sheet.cell(row=self._header_size, column=i_column).value is None:
@@ -438,122 +1238,303 @@ class ScenarioList:
             self._sheet.unmerge_cells(start_row=1, start_column=idx_column, end_row=4, end_column=idx_column)
             self._sheet.delete_cols(idx_column, 1)
 
-    def _write_cell(self, idx_col, value):
-        self._sheet.cell(row=self._current_row, column=idx_col).value = value
+    @property
+    def row_count(self):
+        """
+        Number of rows written after the header, in all the shards
+        """
+        return self._row_count
 
-    def write(self, hazardous_event, scenario):
+    @property
+    def dry_run(self):
+        """
+        True when the rows are only counted (see __init__())
+        """
+        return self._dry_run
+
+    @property
+    def output_paths(self):
+        """
+        Paths of the files written by save()
+        """
+        if self._dry_run:
+            return []
+        if self._shards is not None:
+            return [path for shard in self._shards.values() for path in shard.output_paths] + [self._shards_path]
+        paths = [self._path] + ([self._columnar.path] if self._columnar is not None else [])
+        if self._vsm is not None:
+            paths += [self._vsm.path] + ([self._vsm.table_path] if self._vsm.table_path is not None else [])
+        return paths
+
+    @property
+    def vsm_skipped(self):
+        """
+        Test run IDs of the VSM testruns skipped by save(), in all the shards
+        """
+        if self._shards is not None:
+            return [test_run_id for shard in self._shards.values() for test_run_id in shard.vsm_skipped]
+        return list(self._vsm.skipped) if self._vsm is not None else []
+
+    @property
+    def _shards_path(self):
+        return os.path.splitext(self._path)[0] + '_Shards.json'
+
+    def write(self, hazardous_event, scenario, combinations=None):
         """
         Method to deal with the writing of scenarios containing multiple faults and reactions
         :param hazardous_event: HARA entry
         :param scenario: Scenario
+        :param combinations: The combinations of the scenario if already expanded (see combinations())
+        """
+        self.write_lines(hazardous_event, self.lines(self._config, hazardous_event, scenario, combinations))
+
+    @staticmethod
+    def combinations(config, scenario, rules=None):
+        """
+        Expands a scenario to all its combinations of vehicle speeds, faults and reactions
+        :param config: Config
+        :param scenario: Scenario
+        :param rules: ScenarioRules sharing the reactions between the scenarios, the reactions are derived for each
+                      scenario when not specified
+        :return: Returns (vehicle speed, road radius, fault, reaction) for each line of the scenario list
         """
         for i, speed in enumerate(scenario.vehicle_speed):
             radius = scenario.road_radius if isinstance(scenario.road_radius, str) else scenario.road_radius[i]
             for fault in scenario.faults:
-                reactions = self._get_reactions(fault, scenario)
+                if rules is not None:
+                    reactions = rules.reactions(fault, scenario)
+                else:
+                    reactions = ScenarioList._get_reactions(config, fault, scenario)
                 for reaction in reactions:
-                    self._write_line(hazardous_event, scenario, speed, radius, fault, reaction)
+                    yield speed, radius, fault, reaction
 
-    def _write_line(self, hazardous_event, scenario, vehicle_speed, road_radius, fault, reaction):
+    @staticmethod
+    def lines(config, hazardous_event, scenario, combinations=None):
         """
-        Method to deal with the writing of scenarios with a single fault but multiple reactions
+        Gets the values of the lines of a scenario, independently of the mode and of the position in the list
+        :param config: Config
+        :param hazardous_event: HARA entry
+        :param scenario: Scenario
+        :param combinations: The combinations of the scenario if already expanded (see combinations())
+        :return: Returns a dict for each combination, with the names of the Indexes as keys and the cell values
+        """
+        if combinations is None:
+            combinations = ScenarioList.combinations(config, scenario)
+        return [ScenarioList._get_line(hazardous_event, scenario, *combination) for combination in combinations]
+
+    @staticmethod
+    def _get_line(hazardous_event, scenario, vehicle_speed, road_radius, fault, reaction):
+        """
+        Method to deal with a single fault but multiple reactions
         :param hazardous_event: HARA entry
         :param scenario: Scenario
         :param vehicle_speed: Vehicle speed
         :param road_radius: Road radius
         :param fault: A single malfunction
         :param reaction: Either None, one reaction or a list of reactions
+        :return: Returns the values of the line
+        """
+        line = {'hara_id': hazardous_event.identifier,
+                'constant_road_radius': road_radius,
+                'road_friction_coefficient': scenario.road_friction,
+                'road_gradient': scenario.road_gradient,
+                'desired_vehicle_speed': vehicle_speed,
+                'acceleration': scenario.acceleration}
+        if fault is not None:
+            ScenarioList._add_fault(line, fault)
+            if reaction is not None:
+                for single_reaction in reaction if isinstance(reaction, list) else [reaction]:
+                    ScenarioList._add_reaction(line, single_reaction)
+        return line
+
+    def write_lines(self, hazardous_event, lines):
+        """
+        Writes the lines of a hazardous event according to the mode
+        :param hazardous_event: HARA entry
+        :param lines: Values of the lines (see lines())
+        """
+        for line in lines:
+            self.write_line(hazardous_event, line)
+
+    def write_line(self, hazardous_event, line):
         """
-        self._current_test_run_id += 1
+        Writes a line of a hazardous event according to the mode
+        :param hazardous_event: HARA entry
+        :param line: Values of the line (see lines())
+        """
+        duplicate = False
+        if self._scenario_index is not None:
+            scenario_key = tuple(sorted((name, value) for name, value in line.items() if name != 'hara_id'))
+            test_run_id = self._scenario_index.get(scenario_key)
+            if test_run_id is None:
+                self._current_test_run_id += 1
+                test_run_id = self._scenario_index[scenario_key] = self._current_test_run_id
+            else:
+                duplicate = True
+                self.duplicate_count += 1
+            self._scenario_mapping[(hazardous_event.identifier, test_run_id)] = None
+        else:
+            self._current_test_run_id += 1
+            test_run_id = self._current_test_run_id
 
         if self._mode.lower() == 'ftti_list' or self._mode.lower() == 'acceptance_list':
             if hazardous_event.comment is None:
                 return
             target_test_run_id = int(hazardous_event.comment)
-            if target_test_run_id != self._current_test_run_id:
+            # With dedup several hazardous events can target the same shared test run
+            if target_test_run_id != test_run_id or target_test_run_id in self._targets_written:
                 return
+            self._targets_written.add(target_test_run_id)
+            self.write_test_run(hazardous_event, line)
+        elif not duplicate:
+            self._write_row(line, hazardous_event)
 
-            if self._mode.lower() == 'ftti_list':
-                if '[TQ1]' in hazardous_event.hazard.upper():
-                    ftti_list = [100, 200, 300, 400, 500]
-                elif '[TQ2]' in hazardous_event.hazard.upper():
-                    ftti_list = [100, 200, 300, 400, 500]
-                elif '[TQ3]' in hazardous_event.hazard.upper():
-                    ftti_list = [75, 150, 225, 300, 375]
-                elif '[TQ4]' in hazardous_event.hazard.upper():
-                    ftti_list = [75, 150, 225, 300, 375]
-                elif '[TQ5]' in hazardous_event.hazard.upper():
-                    ftti_list = [75, 150, 225, 300, 375]
-                elif '[TQ6]' in hazardous_event.hazard.upper():
-                    ftti_list = [75, 150, 225, 300, 375]
-                else:
-                    raise KeyError(f"The FTTI for {hazardous_event.identifier} could not be determined. "
-                                   f"Hazard could not be recognized: {hazardous_event.hazard}")
-            else:
-                ftti_list = [1000]
-
-            reaction = []
-            for ftti in ftti_list:
-                reaction.append([VerySlowSteeringReaction(0), SlowSteeringReaction(0),
-                                 BrakingReaction(20), FaultTolerantTime(ftti)])
-
-        ftti_cnt = 1
-        if isinstance(reaction, list) and isinstance(reaction[0], list):
-            ftti_cnt = len(reaction)
+    def write_test_run(self, hazardous_event, line):
+        """
+        Writes the rows of the FTTI_List or Acceptance_List for the test run targeted by the comment of a hazardous
+        event, the reactions of the line are replaced by the FTTI reactions
+        :param hazardous_event: HARA entry
+        :param line: Values of the targeted line (see lines())
+        """
+        for ftti in self._get_ftti_list(hazardous_event):
+            row = {key: value for key, value in line.items() if key not in self.REACTION_KEYS}
+            for reaction in [VerySlowSteeringReaction(0), SlowSteeringReaction(0),
+                             BrakingReaction(20), FaultTolerantTime(ftti)]:
+                self._add_reaction(row, reaction)
+            self._write_row(row, hazardous_event)
+
+    def _get_ftti_list(self, hazardous_event):
+        if self._mode.lower() != 'ftti_list':
+            return [1000]
+        if '[TQ1]' in hazardous_event.hazard.upper():
+            ftti_list = [100, 200, 300, 400, 500]
+        elif '[TQ2]' in hazardous_event.hazard.upper():
+            ftti_list = [100, 200, 300, 400, 500]
+        elif '[TQ3]' in hazardous_event.hazard.upper():
+            ftti_list = [75, 150, 225, 300, 375]
+        elif '[TQ4]' in hazardous_event.hazard.upper():
+            ftti_list = [75, 150, 225, 300, 375]
+        elif '[TQ5]' in hazardous_event.hazard.upper():
+            ftti_list = [75, 150, 225, 300, 375]
+        elif '[TQ6]' in hazardous_event.hazard.upper():
+            ftti_list = [75, 150, 225, 300, 375]
         else:
-            reaction = [reaction]
+            raise KeyError(f"The FTTI for {hazardous_event.identifier} could not be determined. "
+                           f"Hazard could not be recognized: {hazardous_event.hazard}")
+        return ftti_list
 
-        for i_ftti in range(ftti_cnt):
-            self._current_row += 1
+    def _write_row(self, row, hazardous_event):
+        """
+        Writes a row after the last one, or after the last one of its shard, with the next test run ID
+        :param row: Values of the row, with the names of the Indexes as keys
+        :param hazardous_event: HARA entry of the row
+        """
+        self._row_count += 1
+        self.rows_per_hazard[hazardous_event.hazard_code] += 1
+        if self._dry_run:
+            return
+        test_run_id = f"{self._row_count:05d}"
+        if self.test_runs is not None:
+            self.test_runs[test_run_id] = row
+        if self._shards is None:
+            self._append_row(row, test_run_id)
+        else:
+            self._get_shard(row, hazardous_event)._append_row(row, test_run_id)  # pylint: disable=protected-access
 
-            loc_test_run_id = self._current_row - self._header_size
-
-            print(f"Status: Writing item #{self._current_row - self._header_size}")
-
-            self._write_cell(self._indexes.hara_id, hazardous_event.identifier)
-            self._write_cell(self._indexes.test_run_id, f"{loc_test_run_id:05d}")
-            self._write_cell(self._indexes.constant_road_radius, road_radius)
-            self._write_cell(self._indexes.road_friction_coefficient, scenario.road_friction)
-            self._write_cell(self._indexes.road_gradient, scenario.road_gradient)
-            self._write_cell(self._indexes.lateral_acceleration,
-                             f'=IF(ISNUMBER(C{self._current_row}), '
-                             f'(H{self._current_row}/3.6)^2/C{self._current_row}, "-")')
-            self._write_cell(self._indexes.friction_coefficient_exploitation,
-                             f'=IF(ISNUMBER(C{self._current_row}), '
-                             f'F{self._current_row}/D{self._current_row}*100/9.81, "-")')
-            self._write_cell(self._indexes.desired_vehicle_speed, vehicle_speed)
-            self._write_cell(self._indexes.acceleration, scenario.acceleration)
-
-            if fault is not None:
-                self._write_fault(fault)
-                if reaction[i_ftti] is not None:
-                    if isinstance(reaction[i_ftti], list):
-                        for single_reaction in reaction[i_ftti]:
-                            self._write_reaction(single_reaction)
-                    else:
-                        self._write_reaction(reaction[i_ftti])
-
-    def _write_reaction(self, reaction):
+    def _get_shard(self, row, hazardous_event):
+        """
+        Gets the shard of a row, the shard is created with its first row
+        :param row: Values of the row
+        :param hazardous_event: HARA entry of the row
+        :return: Returns the ScenarioList of the shard
+        """
+        if self._shard_by == 'hazard':
+            name = hazardous_event.hazard_code
+        else:
+            width = len(str(self._shard_count))
+            names = [f"{i_shard:0{width}d}" for i_shard in range(1, self._shard_count + 1)]
+            if self._shard_by == 'count':
+                name = min(names, key=lambda _: len(self._shard_test_runs.get(_, ())))
+            else:
+                name = min(names, key=lambda _: self._shard_costs.get(_, 0))
+        if name not in self._shards:
+            self._shards[name] = ScenarioList(self._config, self._mode, self._streaming,
+                                              columnar=self._columnar_format, shard_name=name,
+                                              vsm=self._vsm_jobs is not None, vsm_jobs=self._vsm_jobs,
+                                              vsm_skip_invalid=self._vsm_skip_invalid)
+            self._shard_test_runs[name] = []
+            self._shard_costs[name] = 0
+        self._shard_test_runs[name].append(f"{self._row_count:05d}")
+        self._shard_costs[name] += self._cost_model.cost(row)
+        return self._shards[name]
+
+    def _append_row(self, row, test_run_id):
+        """
+        Appends a row to the sheet, with its formulas
+        :param row: Values of the row
+        :param test_run_id: Test run ID of the row
+        """
+        self._current_row += 1
+        if self._current_row > self.MAX_ROWS:
+            raise ValueError(f"The rows of {self._path} do not fit in a sheet of {self.MAX_ROWS} rows, "
+                             f"the scenario list has to be split into more shards")
+        positions = self._positions
+        values = self._empty_row.copy()
+        values[positions['test_run_id']] = test_run_id
+        for position, formula in self._formulas:
+            values[position] = formula.format(self._current_row)
+        for key, value in row.items():
+            values[positions[key]] = value
+        self._rows.append(values)
+        if len(self._rows) >= self.ROW_BLOCK_SIZE:
+            self._flush_rows()
+        if self._columnar is not None:
+            self._columnar.write(self._get_record(test_run_id, row))
+        if self._vsm is not None:
+            self._vsm.add(test_run_id, row)
+
+    @staticmethod
+    def _get_record(test_run_id, row):
+        """
+        Gets the values of a row for the columnar outputs, the formulas of the sheet are evaluated
+        :param test_run_id: Test run ID
+        :param row: Values of the row
+        :return: Returns the values by column name
+        """
+        record = dict(row, test_run_id=test_run_id)
+        radius = row.get('constant_road_radius')
+        friction = row.get('road_friction_coefficient')
+        if isinstance(radius, (int, float)) and radius != 0:
+            record['lateral_acceleration'] = (row['desired_vehicle_speed'] / 3.6) ** 2 / radius
+            if isinstance(friction, (int, float)) and friction != 0:
+                record['friction_coefficient_exploitation'] = record['lateral_acceleration'] / friction * 100 / 9.81
+        return record
+
+    @staticmethod
+    def _add_reaction(line, reaction):
         if isinstance(reaction, BrakingReaction):
-            self._write_cell(self._indexes.braking, reaction.braking)
+            line['braking'] = reaction.braking
         elif isinstance(reaction, VerySlowSteeringReaction):
-            self._write_cell(self._indexes.very_slow_steering, reaction.steering_rate_limit)
+            line['very_slow_steering'] = reaction.steering_rate_limit
         elif isinstance(reaction, SlowSteeringReaction):
-            self._write_cell(self._indexes.slow_steering, reaction.steering_rate_limit)
+            line['slow_steering'] = reaction.steering_rate_limit
         elif isinstance(reaction, FaultTolerantTime):
-            self._write_cell(self._indexes.ftti, reaction.ftti)
+            line['ftti'] = reaction.ftti
         else:
             raise TypeError(f"Type '{type(reaction)}' of the specified reaction is not valid")
 
-    def _write_fault(self, fault):
+    @staticmethod
+    def _add_fault(line, fault):
         if isinstance(fault, TorqueFault):
-            self._write_cell(self._indexes.torque_front_axle, fault.torque_error_front)
-            self._write_cell(self._indexes.torque_rear_axle, fault.torque_error_rear)
-            self._write_cell(self._indexes.torque_slew_rate, fault.slew_rate)
+            line['torque_front_axle'] = fault.torque_error_front
+            line['torque_rear_axle'] = fault.torque_error_rear
+            line['torque_slew_rate'] = fault.slew_rate
 
-    def _get_reactions(self, fault, scenario):
+    @staticmethod
+    def _get_reactions(config, fault, scenario):
         """
         Method to get the expected reactions based on the fault and road conditions
+        :param config: Config
         :param fault: Malfunction
         :param scenario: Scenario
         :return: Returns all the expected reactions in a list
@@ -568,16 +1549,16 @@ class ScenarioList:
 
         if isinstance(fault, TorqueFault):
             if fault.get_overall_torque() > 100:
-                braking_reaction = self._config.get_float('Reaction', 'braking_torque_fault_high')
+                braking_reaction = config.get_float('Reaction', 'braking_torque_fault_high')
             elif fault.get_overall_torque() < 0:
                 braking_reaction = 5
             else:
-                braking_reaction = self._config.get_float('Reaction', 'braking_torque_fault_low')
+                braking_reaction = config.get_float('Reaction', 'braking_torque_fault_low')
         else:
-            braking_reaction = self._config.get_float('Reaction', 'braking_normal')
+            braking_reaction = config.get_float('Reaction', 'braking_normal')
         if (isinstance(scenario.road_friction, float) and
-                scenario.road_friction <= self._config.get_float('Road_friction', 'icy')):
-            braking_reaction = min(braking_reaction, self._config.get_float('Reaction', 'braking_low_friction'))
+                scenario.road_friction <= config.get_float('Road_friction', 'icy')):
+            braking_reaction = min(braking_reaction, config.get_float('Reaction', 'braking_low_friction'))
 
         # Braking without steering is a reaction that is expected always
         # unless the fault is already leading to a high deceleration
@@ -586,44 +1567,92 @@ class ScenarioList:
 
         # Braking reaction together with steering correction is expected always
         # except when driving on a straight road with a high friction
-        friction_limit = self._config.get_float('Road_friction', 'gravel')
+        friction_limit = config.get_float('Road_friction', 'gravel')
         if ((not isinstance(scenario.road_radius, str)) or
                 (isinstance(scenario.road_friction, float) and scenario.road_friction < friction_limit) or
                 (isinstance(fault, TorqueFault) and fault.losing_stability())):
             # Braking with very slow steering reaction:
             reactions.append([BrakingReaction(braking_reaction),
-                              VerySlowSteeringReaction(self._config.get_float('Reaction', 'very_slow_steering'))])
+                              VerySlowSteeringReaction(config.get_float('Reaction', 'very_slow_steering'))])
             # Braking with slow steering reaction:
             reactions.append([BrakingReaction(braking_reaction),
-                              SlowSteeringReaction(self._config.get_float('Reaction', 'slow_steering'))])
+                              SlowSteeringReaction(config.get_float('Reaction', 'slow_steering'))])
         return reactions
 
     def save(self):
         """
         Formatting the sheet and saving it
         """
+        if self._dry_run:
+            return
+        if self._shards is not None:
+            self._save_shards()
+            return
         print(f"Status: Saving to {self._path}...")
-        for i_col in range(1, self._sheet.max_column):
-            font = copy.copy(self._sheet.cell(row=self._header_size + 1, column=i_col).font)
-            alignment = copy.copy(self._sheet.cell(row=self._header_size + 1, column=i_col).alignment)
-            number_format = self._sheet.cell(row=self._header_size + 1, column=i_col).number_format
-            for i_row in range(self._header_size + 2, self._current_row + 1):
-                self._sheet.cell(row=i_row, column=i_col).font = font
-                self._sheet.cell(row=i_row, column=i_col).alignment = alignment
-                self._sheet.cell(row=i_row, column=i_col).number_format = number_format
-        if self._mode.lower() == 'ftti_list' or self._mode.lower() == 'acceptance_list':
-            self._sheet.column_dimensions['Z'].hidden = True
-            self._sheet.column_dimensions['AA'].hidden = False
-            self._sheet.column_dimensions['AB'].hidden = False
-            self._sheet.column_dimensions['AC'].hidden = True
-            self._sheet.column_dimensions['AD'].hidden = True
-            self._sheet.column_dimensions['AE'].hidden = True
-            self._sheet.column_dimensions['AF'].hidden = True
-            self._sheet.column_dimensions['AG'].hidden = True
-            self._sheet.column_dimensions['AH'].hidden = True
-            self._sheet.column_dimensions['AI'].hidden = False
+        self._flush_rows()
+        if self._scenario_mapping is not None and self._mode.lower() == 'scenario_list':
+            self._write_mapping(self._scenario_mapping)
+        if not self._streaming:
+            from openpyxl.styles.cell_style import StyleArray  # pylint: disable=import-outside-toplevel
+            # The font, alignment and number format of the first row are applied by their index in the style tables
+            # of the workbook, instead of registering the same styles again for each cell
+            column_styles = [cell._style or StyleArray() for cell in  # pylint: disable=protected-access
+                             self._sheet[self._header_size + 1][:self._sheet.max_column - 1]]
+            for row in self._sheet.iter_rows(min_row=self._header_size + 2, max_row=self._current_row,
+                                             max_col=len(column_styles)):
+                for cell, column_style in zip(row, column_styles):
+                    if cell._style is None:  # pylint: disable=protected-access
+                        cell._style = StyleArray()  # pylint: disable=protected-access
+                    style = cell._style  # pylint: disable=protected-access
+                    style.fontId = column_style.fontId
+                    style.alignmentId = column_style.alignmentId
+                    style.numFmtId = column_style.numFmtId
+            self._hide_columns()
 
         self._workbook.save(self._path)
+        if self._columnar is not None:
+            print(f"Status: Saving to {self._columnar.path}...")
+            self._columnar.close()
+        if self._vsm is not None:
+            self._vsm.save()
+
+    def _save_shards(self):
+        """
+        Saves the shards and their manifest
+        """
+        shards = []
+        for name, shard in self._shards.items():
+            test_run_ids = self._shard_test_runs[name]
+            if self._scenario_mapping is not None and self._mode.lower() == 'scenario_list':
+                shard_test_run_ids = set(test_run_ids)
+                mapping = [_ for _ in self._scenario_mapping if f"{_[1]:05d}" in shard_test_run_ids]
+                shard._write_mapping(mapping)  # pylint: disable=protected-access
+            shard.save()
+            shards.append({'name': name, 'paths': shard.output_paths, 'rows': len(test_run_ids),
+                           'estimated_cost': self._shard_costs[name], 'test_run_ids': test_run_ids})
+        print(f"Status: Saving the shards manifest to {self._shards_path}...")
+        with open(self._shards_path, 'w', encoding='utf-8') as file:
+            json.dump({'mode': self._mode, 'shard_by': self._shard_by, 'rows': self._row_count, 'shards': shards},
+                      file, indent=2)
+
+    def _write_mapping(self, mapping):
+        """
+        Writes the test run of each hazardous event to the mapping sheet
+        :param mapping: (HARA ID, test run ID) of each test run of each hazardous event
+        """
+        mapping_sheet = self._workbook.create_sheet(self._config.get_entry('Scenario_List', 'mapping_sheet_name'))
+        mapping_sheet.append(['HARA ID', 'Test Run ID'])
+        for hara_id, test_run_id in mapping:
+            mapping_sheet.append([hara_id, f"{test_run_id:05d}"])
+
+    def _get_column_visibility(self):
+        if self._mode.lower() == 'ftti_list' or self._mode.lower() == 'acceptance_list':
+            return self.LIST_COLUMN_VISIBILITY
+        return {}
+
+    def _hide_columns(self):
+        for key, visible in self._get_column_visibility().items():
+            self._sheet.column_dimensions[key].hidden = not visible
 
     class Indexes:  # pylint: disable=too-many-instance-attributes disable=too-few-public-methods
         """
@@ -650,6 +1679,60 @@ class ScenarioList:
 
 
 if __name__ == '__main__':
-    preprocessing('Scenario_List')
-    # preprocessing('FTTI_List')
-    # preprocessing('Acceptance_List')
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', default='config.ini', help='Path of the config file')
+    parser.add_argument('--output-dir',
+                        help='Folder of the scenario lists and of the run report, the paths of the config by default')
+    parser.add_argument('--output',
+                        help='Path of the scenario list, only with a single mode, the path of the config by default')
+    parser.add_argument('--plan', action='store_true',
+                        help='Only count the rows of the scenario lists by hazard code and project their size, '
+                             'without writing them')
+    parser.add_argument('--modes', nargs='+', default=['Scenario_List'],
+                        choices=['Scenario_List', 'FTTI_List', 'Acceptance_List'],
+                        help='Scenario lists generated in a single pass over the HARA')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Write the scenario lists with write-only workbooks, row by row, to bound the memory')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes deriving the scenarios from the hazardous events')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Derive only the hazardous events changed since the previous run')
+    parser.add_argument('--columnar', choices=['csv', 'parquet'],
+                        help='Also write the scenario lists in a columnar format, next to the workbooks')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Sweep the parameters of the Sweep config section for each hazardous event')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Write each physical scenario only once, with a mapping sheet of the shared test runs')
+    parser.add_argument('--shard-by', choices=ScenarioList.SHARD_STRATEGIES,
+                        help='Split the scenario lists into several workbooks, by number of rows, by hazard code or '
+                             'by estimated simulation cost, with a manifest of the test runs of each workbook')
+    parser.add_argument('--shards', type=int,
+                        help='Number of workbooks of the count and cost sharding')
+    parser.add_argument('--order-by-cost', action='store_true',
+                        help='Write the test runs by decreasing estimated simulation cost')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Measure the peak memory of the run, which slows it down, and add it to the run report')
+    parser.add_argument('--vsm', action='store_true',
+                        help='Also generate the VSM testruns of the scenario lists as .vsd files (requires numpy and '
+                             'scipy), instead of running VSM_Testrun_Export.m on the workbooks')
+    parser.add_argument('--vsm-skip-invalid', action='store_true',
+                        help='Skip the VSM testruns which VSM_Testrun_Export.m rejects and list them in the run '
+                             'report, instead of failing the run')
+    parser.add_argument('--pipeline', choices=Pipeline.KINDS,
+                        help='Read the HARA and derive the scenarios in their own threads or processes while the '
+                             'scenario lists are written')
+    args = parser.parse_args()
+    if args.output is not None and len(args.modes) != 1:
+        parser.error('--output can only be used with a single mode')
+    run_config = load_config(args.config, output_dir=args.output_dir,
+                             output_paths={args.modes[0]: args.output} if args.output is not None else None)
+    if args.plan:
+        plan(args.modes, args.jobs, dedup=args.dedup, config=run_config)
+    else:
+        for output_folder in (args.output_dir, os.path.dirname(args.output or '')):
+            if output_folder:
+                os.makedirs(output_folder, exist_ok=True)
+        preprocessing(args.modes, args.streaming, args.jobs, args.incremental, columnar=args.columnar,
+                      sweep=args.sweep, dedup=args.dedup, shard_by=args.shard_by, shards=args.shards,
+                      order_by_cost=args.order_by_cost, trace_memory=args.trace_memory, vsm=args.vsm,
+                      vsm_skip_invalid=args.vsm_skip_invalid, pipeline=args.pipeline, config=run_config)
@@ -0,0 +1,244 @@
+"""
+Back-annotation of the simulation results to the HARA (the Results_To_HARA step).
+The ratings filled in the result columns of the scenario lists (exposure, severity, controllability, their rationales
+and the FTTI) are read in a single streaming pass and joined to the hazardous events by HARA ID. The test runs shared
+by several hazardous events (see ScenarioList, dedup) are joined through the mapping sheet of the scenario list.
+The worst case of the test runs of each hazardous event is written to a copy of the HARA sheet. Only the cells which
+change are written, without loading the HARA workbook (see SheetPatch).
+"""
+import argparse
+import csv
+import os
+import re
+import time
+
+from packages.config import Config
+from packages.sheet_xml import SheetPatch, get_sheet_names, iter_rows
+
+# Ratings of the results, as (key, key of the rationale in the scenario list, key of the rationale in the HARA).
+# The highest level of a rating (e.g. S3) is the worst case, the rationale of the test run reaching it is kept.
+RATINGS = (('exposure', None, None),
+           ('exposure_changed', 'exposure_changed_rationale', 'exposure_rationale'),
+           ('severity', 'severity_rationale', 'severity_rationale'),
+           ('severity_changed', 'severity_changed_rationale', 'severity_changed_rationale'),
+           ('controllability', 'controllability_rationale', 'controllability_rationale'))
+# Result columns of the scenario lists, and columns of the HARA written
+RESULT_KEYS = tuple(key for rating in RATINGS for key in rating[:2] if key is not None) + ('ftti',)
+HARA_KEYS = tuple(key for rating in RATINGS for key in rating[::2] if key is not None) + ('ftti',)
+
+
+def _get_level(value, key, test_run_id):
+    """
+    Gets the level of a rating, either a number or a text ending with a number (e.g. S2)
+    """
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = re.fullmatch(r'\s*[A-Za-z]*\s*(\d+)\s*', str(value))
+    if match is None:
+        raise ValueError(f"Test run {test_run_id}: {key} '{value}' is not a valid rating")
+    return int(match.group(1))
+
+
+class WorstCase:
+    """
+    Worst case of the results of the test runs of a hazardous event
+    """
+    __slots__ = ('test_runs', '_ratings', '_ftti')
+
+    def __init__(self):
+        self.test_runs = 0
+        # Level, value and rationale of each rating
+        self._ratings = {}
+        self._ftti = None
+
+    def add(self, test_run_id, results):
+        """
+        Adds the results of a test run
+        :param test_run_id: Test run ID, for the error messages
+        :param results: Result values of the test run by key (see RESULT_KEYS), without the empty ones
+        """
+        self.test_runs += 1
+        for key, rationale_key, _ in RATINGS:
+            value = results.get(key)
+            if value is None:
+                continue
+            level = _get_level(value, key, test_run_id)
+            if key not in self._ratings or level > self._ratings[key][0]:
+                self._ratings[key] = (level, value, results.get(rationale_key) if rationale_key is not None else None)
+        ftti = results.get('ftti')
+        if ftti is not None:
+            try:
+                ftti = float(ftti)
+            except ValueError as exc:
+                raise ValueError(f"Test run {test_run_id}: FTTI '{ftti}' is not a number") from exc
+            # The shortest fault tolerant time interval is the worst case
+            if self._ftti is None or ftti < self._ftti:
+                self._ftti = int(ftti) if ftti.is_integer() else ftti
+
+    def cells(self):
+        """
+        Gets the values of the HARA cells
+        :return: Returns the values by key of the Hara_Sheet indexes (without the idx_ prefix)
+        """
+        cells = {}
+        for key, _, hara_rationale_key in RATINGS:
+            if key in self._ratings:
+                _, value, rationale = self._ratings[key]
+                cells[key] = value
+                if hara_rationale_key is not None and rationale is not None:
+                    cells[hara_rationale_key] = rationale
+        if self._ftti is not None:
+            cells['ftti'] = self._ftti
+        return cells
+
+
+class Results:
+    """
+    Results of the test runs of the scenario lists, aggregated by hazardous event
+    """
+
+    def __init__(self, config):
+        """
+        :param config: Config containing the Scenario_Template and Scenario_List sections
+        """
+        self._config = config
+        template_section = config.section('Scenario_Template')
+        self._sheet_name = template_section['sheet_name']
+        self._header_size = template_section['header_size']
+        self._mapping_sheet_name = config.get_entry('Scenario_List', 'mapping_sheet_name')
+        self._columns = {key: template_section[f'idx_{key}'] for key in ('hara_id', 'test_run_id') + RESULT_KEYS}
+        # Worst case of each hazardous event by HARA ID
+        self.worst_cases = {}
+        self.row_count = 0
+
+    def read(self, path):
+        """
+        Reads the results of a scenario list, written either as a workbook or as a CSV file (see ScenarioList)
+        :param path: Path of the scenario list
+        """
+        print(f"Status: Reading the results of {path}...")
+        if os.path.splitext(path)[1].lower() == '.csv':
+            self._add_rows(self._read_csv(path), None)
+            return
+        sheet_names = get_sheet_names(path)
+        if self._sheet_name not in sheet_names:
+            raise KeyError(f"Sheet {self._sheet_name} was not found in {path}")
+        mapping = self._read_mapping(path) if self._mapping_sheet_name in sheet_names else None
+        self._add_rows(self._read_sheet(path), mapping)
+
+    def _add_rows(self, rows, mapping):
+        """
+        Adds the results of the rows to the worst cases of their hazardous events
+        :param rows: (HARA ID, test run ID, results) of each row
+        :param mapping: HARA IDs by test run ID when the test runs are shared, None otherwise
+        """
+        worst_cases = self.worst_cases
+        for hara_id, test_run_id, results in rows:
+            self.row_count += 1
+            if not results:
+                continue
+            hara_ids = mapping.get(test_run_id, (hara_id,)) if mapping is not None else (hara_id,)
+            for _ in hara_ids:
+                worst_case = worst_cases.get(_)
+                if worst_case is None:
+                    worst_case = worst_cases[_] = WorstCase()
+                worst_case.add(test_run_id, results)
+
+    def _read_mapping(self, path):
+        """
+        Reads the mapping sheet of a deduplicated scenario list
+        :return: Returns the HARA IDs by test run ID
+        """
+        mapping = {}
+        for _, (hara_id, test_run_id) in iter_rows(path, self._mapping_sheet_name, (1, 2), min_row=2):
+            if test_run_id is not None:
+                mapping.setdefault(str(test_run_id), []).append(hara_id)
+        return mapping
+
+    def _read_sheet(self, path):
+        keys = tuple(self._columns)
+        for _, values in iter_rows(path, self._sheet_name, tuple(self._columns.values()),
+                                   min_row=self._header_size + 1):
+            row = dict(zip(keys, values))
+            if row['test_run_id'] is None:
+                continue
+            yield (row['hara_id'], str(row['test_run_id']),
+                   {key: row[key] for key in RESULT_KEYS if row[key] not in (None, '')})
+
+    @staticmethod
+    def _read_csv(path):
+        with open(path, encoding='utf-8', newline='') as file:
+            for record in csv.DictReader(file):
+                if not record.get('test_run_id'):
+                    continue
+                yield (record['hara_id'], record['test_run_id'],
+                       {key: record[key] for key in RESULT_KEYS if record.get(key) not in (None, '')})
+
+
+def back_annotate(config, results_paths, output_path=None):  # pylint: disable=too-many-locals
+    """
+    Writes the worst case of the simulation results of each hazardous event to the HARA sheet
+    :param config: Config containing the Hara_Sheet, Scenario_Template and Scenario_List sections
+    :param results_paths: Paths of the scenario lists with the results (workbooks or CSV files)
+    :param output_path: Path of the annotated HARA, the results_path of the Hara_Sheet config section by default
+    :return: Returns the summary of the back-annotation
+    """
+    start = time.perf_counter()
+    results = Results(config)
+    for path in results_paths:
+        results.read(path)
+
+    hara_section = config.section('Hara_Sheet')
+    hara_path = hara_section['path']
+    output_path = output_path if output_path is not None else hara_section['results_path']
+    if not os.path.exists(hara_path):
+        raise FileNotFoundError(f"Hara sheet was not found: {hara_path}")
+    print(f"Status: Reading {hara_path}...")
+    columns = {key: hara_section[f'idx_{key}'] for key in HARA_KEYS}
+    # Row and current values of each hazardous event by HARA ID, the HARA ends at the first empty ID as read by Hara
+    rows = {}
+    i_expected = hara_section['header_size'] + 1
+    for i_row, (hara_id, *values) in iter_rows(hara_path, hara_section['sheet_name'],
+                                                (hara_section['idx_id'],) + tuple(columns.values()),
+                                                min_row=i_expected):
+        # A row missing in the sheet is empty
+        if hara_id is None or i_row != i_expected:
+            break
+        rows[hara_id] = (i_row, dict(zip(columns, values)))
+        i_expected += 1
+
+    patch = SheetPatch(hara_path, hara_section['sheet_name'])
+    unmatched = []
+    for hara_id, worst_case in results.worst_cases.items():
+        if hara_id not in rows:
+            unmatched.append(hara_id)
+            continue
+        i_row, values = rows[hara_id]
+        for key, value in worst_case.cells().items():
+            if values[key] != value:
+                patch.set(i_row, columns[key], value)
+    if unmatched:
+        print(f"Status: Warning: {len(unmatched)} hazardous events of the results were not found in the HARA: "
+              f"{', '.join(str(_) for _ in unmatched[:10])}{'...' if len(unmatched) > 10 else ''}")
+    print(f"Status: Saving to {output_path}...")
+    patch.save(output_path)
+    changed_cells = len(patch)
+    summary = {'rows_read': results.row_count, 'hazardous_events': len(results.worst_cases) - len(unmatched),
+               'changed_cells': changed_cells, 'unmatched': unmatched, 'output': output_path,
+               'seconds': time.perf_counter() - start}
+    print(f"Status: {changed_cells} cells of {summary['hazardous_events']} hazardous events changed")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results', nargs='+',
+                        help='Scenario lists with the simulation results, as workbooks or CSV files')
+    parser.add_argument('--config', default='config.ini', help='Path of the config file')
+    parser.add_argument('--output', help='Path of the annotated HARA, the results_path of the config by default')
+    args = parser.parse_args()
+    back_annotate(Config(args.config), args.results, args.output)
@@ -0,0 +1,231 @@
+"""
+Long-running preprocessing service.
+The config, the scenario template, the hazardous events of the HARA and the lines derived from them are kept in memory.
+The config, HARA and template files are watched and the scenario lists are regenerated when they change, only the
+hazardous events which changed are derived again. The paths of the fresh scenario lists can be requested on a local
+socket, e.g. with: python service.py --request
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from packages.config import Config
+from packages.manifest import Manifest
+from preprocessing import SCENARIO_SECTIONS, Hara, write_scenario_lists
+
+DEFAULT_PORT = 8765
+
+
+class PreprocessingService:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps the state of the last run in memory and regenerates the scenario lists when the input files change
+    """
+
+    def __init__(self, config_path='config.ini', modes=('Scenario_List',), jobs=1, columnar=None):
+        """
+        :param config_path: Path of the config file
+        :param modes: Modes of the scenario lists (see preprocessing())
+        :param jobs: Number of processes deriving the scenarios
+        :param columnar: Either None, 'csv' or 'parquet'
+        """
+        self._config_path = config_path
+        self._modes = list(modes)
+        self._jobs = jobs
+        self._columnar = columnar
+        self._lock = threading.Lock()
+        self._config = None
+        self._hazardous_events = None
+        self._manifest = None
+        # State (modification time and size) of each input file when it was loaded
+        self._loaded = {}
+        self._generated = None
+        self.outputs = []
+        self.error = None
+
+    def _file_state(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def input_state(self):
+        """
+        Gets the state of the input files
+        :return: Returns the modification time and size of the config, HARA and template files
+        """
+        paths = {'config': self._config_path}
+        if self._config is not None:
+            paths['hara'] = self._config.get_entry('Hara_Sheet', 'path')
+            paths['template'] = self._config.get_entry('Scenario_Template', 'path')
+        return {name: (path, self._file_state(path)) for name, path in paths.items()}
+
+    def _load(self):
+        """
+        Reloads the input files which changed since they were loaded
+        :return: Returns the state of the input files read before they were loaded
+        """
+        state = self.input_state()
+        if self._loaded.get('config') != state['config']:
+            print(f"Status: Loading {self._config_path}...")
+            self._config = Config(self._config_path)
+            self._loaded['config'] = state['config']
+            # The paths of the HARA and the template are only known with the config
+            state = dict(self.input_state(), config=state['config'])
+        # The HARA is also read again when its layout in the config changed (sheet name, header size, columns)
+        hara_state = (state['hara'], self._config.digest(('Hara_Sheet',)))
+        if self._loaded.get('hara') != hara_state:
+            print(f"Status: Loading {state['hara'][0]}...")
+            self._hazardous_events = list(Hara(self._config).hazardous_events())
+            self._loaded['hara'] = hara_state
+        return state
+
+    def refresh(self):
+        """
+        Regenerates the scenario lists if an input file changed since the last generation
+        :return: Returns the paths of the scenario lists
+        """
+        with self._lock:
+            if self._generated is not None and self._generated == self.input_state():
+                return self.outputs
+            try:
+                # The state is read before the files, a file saved during the regeneration is regenerated again
+                state = self._load()
+                manifest = Manifest(None, self._config.digest(SCENARIO_SECTIONS))
+                if self._manifest is not None:
+                    manifest.reuse(self._manifest)
+                # The scenario template is cached by TemplateDescriptor as long as the file does not change
+                self.outputs = write_scenario_lists(self._config, self._hazardous_events, self._modes, streaming=True,
+                                                    jobs=self._jobs, manifest=manifest, columnar=self._columnar)
+                self._manifest = manifest
+                self._generated = state
+                self.error = None
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                # The files are often saved while being edited, the service keeps running until the next change
+                self.error = str(exc)
+                print(f"Status: Error: {exc}")
+            return self.outputs
+
+    def refresh_when_quiet(self, debounce=1.0, interval=0.1):
+        """
+        Regenerates the scenario lists as refresh(), once the input files have not been modified for the debounce
+        time, so a file which is being saved is not read half written
+        :param debounce: Quiet time of the input files in seconds
+        :param interval: Minimum time in seconds between two checks of the input files
+        :return: Returns the paths of the scenario lists
+        """
+        while True:
+            modified = [file_state[0] / 1e9 for _, file_state in self.input_state().values() if file_state is not None]
+            quiet = time.time() - max(modified) if modified else debounce
+            if quiet >= debounce:
+                return self.refresh()
+            time.sleep(min(max(debounce - quiet, interval), debounce))
+
+    def watch(self, interval=0.5, debounce=1.0, stop=None):
+        """
+        Polls the input files and regenerates the scenario lists when they change
+        :param interval: Polling interval in seconds
+        :param debounce: The scenario lists are regenerated when the files have not changed for this time in seconds
+        :param stop: threading.Event stopping the watch when set
+        """
+        stop = stop if stop is not None else threading.Event()
+        self.refresh()
+        last_state = self.input_state()
+        last_change = None
+        while not stop.wait(interval):
+            state = self.input_state()
+            if state != last_state:
+                last_state = state
+                last_change = time.monotonic()
+            elif last_change is not None and time.monotonic() - last_change >= debounce:
+                last_change = None
+                self.refresh()
+
+    def serve(self, port=DEFAULT_PORT, interval=0.5, debounce=1.0):
+        """
+        Watches the input files and answers the requests on a local socket until a 'stop' request
+        :param port: Port on the local host
+        :param interval: Polling interval of the input files in seconds
+        :param debounce: Quiet time of the input files before the scenario lists are regenerated, in seconds
+        """
+        stop = threading.Event()
+        watcher = threading.Thread(target=self.watch, args=(interval, debounce, stop), daemon=True)
+        watcher.start()
+        with _Server(('127.0.0.1', port), _RequestHandler) as server:
+            server.service = self
+            server.stop = stop
+            server.debounce = debounce
+            print(f"Status: Listening on 127.0.0.1:{port}")
+            threading.Thread(target=lambda: (stop.wait(), server.shutdown()), daemon=True).start()
+            server.serve_forever()
+        watcher.join()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    service = None
+    stop = None
+    debounce = None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers a request line: 'outputs' (default) regenerates the scenario lists if needed and returns their paths,
+    'stop' stops the service. The answer is a JSON line. While the input files are being changed, the answer waits for
+    the debounce time of the service as the watcher does.
+    """
+
+    def handle(self):
+        command = self.rfile.readline().decode('utf-8').strip() or 'outputs'
+        start = time.perf_counter()
+        if command == 'stop':
+            self.server.stop.set()
+            answer = {'stopped': True}
+        elif command == 'outputs':
+            outputs = self.server.service.refresh_when_quiet(self.server.debounce)
+            answer = {'outputs': [os.path.abspath(_) for _ in outputs], 'error': self.server.service.error,
+                      'seconds': time.perf_counter() - start}
+        else:
+            answer = {'error': f"Unknown request '{command}', either use 'outputs' or 'stop'"}
+        self.wfile.write((json.dumps(answer) + '\n').encode('utf-8'))
+
+
+def request(command='outputs', port=DEFAULT_PORT, timeout=600):
+    """
+    Sends a request to a running service
+    :param command: Either 'outputs' or 'stop'
+    :param port: Port of the service on the local host
+    :param timeout: Timeout in seconds, the scenario lists may be regenerated before the answer
+    :return: Returns the answer of the service
+    """
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as connection:
+        connection.sendall((command + '\n').encode('utf-8'))
+        with connection.makefile('r', encoding='utf-8') as answer:
+            return json.loads(answer.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['Scenario_List'],
+                        choices=['Scenario_List', 'FTTI_List', 'Acceptance_List'],
+                        help='Scenario lists kept up to date by the service')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes deriving the scenarios from the hazardous events')
+    parser.add_argument('--columnar', choices=['csv', 'parquet'],
+                        help='Also write the scenario lists in a columnar format, next to the workbooks')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the service on the local host')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Quiet time in seconds after a change of the input files before regenerating')
+    parser.add_argument('--request', choices=['outputs', 'stop'], nargs='?', const='outputs',
+                        help='Send a request to the running service instead of starting it')
+    args = parser.parse_args()
+    if args.request:
+        print(json.dumps(request(args.request, args.port), indent=2))
+    else:
+        PreprocessingService(modes=args.modes, jobs=args.jobs, columnar=args.columnar).serve(args.port,
+                                                                                            debounce=args.debounce)
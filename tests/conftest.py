@@ -0,0 +1,136 @@
+"""
+Fixtures of the tests: a small HARA sheet covering the hazards, speeds, routes and road conditions, and a copy of
+config.ini reading it and writing the scenario lists to a temporary folder
+"""
+import configparser
+import json
+import os
+import sys
+
+import openpyxl
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from packages.config import Config  # noqa: E402
+from preprocessing import LIST_PATH_KEYS, Hara  # noqa: E402
+
+GOLDEN_PATH = os.path.join(ROOT, 'tests', 'data', 'golden_scenario_lists.json')
+
+# (ID, location, slope, route, road condition, engaged gear, vehicle speed, brake pedal, maneuver, hazard, relevant,
+# comment), the comments are test run IDs of the Scenario_List, owned by the hazardous event except for HE_04
+HAZARDOUS_EVENTS = [
+    ('HE_01', 'City', 'Flat', 'Straight', 'Dry', 'D', 'Low', 'Released', 'Cruising',
+     '[TQ1] Unintended acceleration during driving', True, 2),
+    ('HE_02', 'Highway', 'Downhill', 'Straight', 'Wet / Snow', 'D', 'High', 'Released', 'Overtaking',
+     '[TQ1] Unintended acceleration during driving', True, 6),
+    ('HE_03', 'Country road', 'Slight slope', 'Curve', 'Icy', 'D', 'Medium', 'Pressed', 'Cruising',
+     '[TQ2] Unintended acceleration with potential loss of stability', True, 20),
+    ('HE_04', 'Highway', 'Flat', 'Straight', 'Snow', 'D', 'High', 'Released', 'Cruising',
+     '[TQ6] Unintended regenerative braking with potential loss of stability', True, 1),
+    ('HE_05', 'City', 'Uphill', 'Curve', 'mu-split', 'D', 'Low', 'Released', 'Cruising',
+     '[TQ5] Unintended regenerative braking', True, 49),
+    ('HE_06', 'Parking lot', 'Uphill', 'Straight', 'Gravel', 'N', 'Standstill', 'Pressed', 'Parking',
+     '[TQ3] Unintended acceleration during standstill in intended direction', True, 55),
+    ('HE_07', 'Parking lot', '-', '-', '-', 'R', '-', 'Released', 'Parking',
+     '[TQ4] Unintended acceleration during standstill in wrong direction', True, 57),
+    ('HE_08', 'City', 'Flat', 'Straight', 'Dry', 'D', 'Low', 'Released', 'Cruising',
+     '[TQ1] Unintended acceleration during driving', False, None),
+    ('HE_09', 'City', 'Flat', 'Straight', 'Dry', 'D', 'Very low', 'Released', 'Cruising',
+     '[TQ7] Unintended loss of regenerative braking', True, None),
+    ('HE_10', 'Country road', 'Downhill', 'Curve', 'Wet', 'D', 'Medium', 'Released', 'Overtaking',
+     '[TQ6] Unintended regenerative braking with potential loss of stability', True, 70),
+    ('HE_11', 'Highway', 'Flat', 'Curve', 'Wet / Snow', 'D', 'High', 'Pressed', 'Cruising',
+     '[TQ2] Unintended acceleration with potential loss of stability', True, 99),
+]
+
+
+def write_hara(config, path, hazardous_events=None):
+    """
+    Writes a HARA sheet with the column layout of the config
+    :param config: Config, the sheet name, header size and column indexes of the Hara_Sheet section are used
+    :param path: Path of the HARA workbook to write
+    :param hazardous_events: Rows of the HARA (see HAZARDOUS_EVENTS)
+    """
+    indexes = Hara.Indexes(config)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = config.get_entry('Hara_Sheet', 'sheet_name')
+    i_row = config.get_int('Hara_Sheet', 'header_size')
+    for (identifier, location, slope, route, road_condition, engaged_gear, vehicle_speed, brake_pedal, maneuver,
+         hazard, relevant, comment) in (hazardous_events if hazardous_events is not None else HAZARDOUS_EVENTS):
+        i_row += 1
+        values = {indexes.id: identifier, indexes.location: location, indexes.slope: slope, indexes.route: route,
+                  indexes.road_condition: road_condition, indexes.engaged_gear: engaged_gear,
+                  indexes.vehicle_speed: vehicle_speed, indexes.brake_pedal: brake_pedal,
+                  indexes.maneuver: maneuver, indexes.hazard: hazard, indexes.relevance: 'x' if relevant else None,
+                  indexes.comment: comment}
+        for idx_column, value in values.items():
+            sheet.cell(row=i_row, column=idx_column, value=value)
+    workbook.save(path)
+
+
+def write_config(path, output_dir, overrides=None):
+    """
+    Writes a copy of config.ini reading the HARA and writing all the outputs in the output folder
+    :param path: Path of the config copy
+    :param output_dir: Folder of the HARA and of the outputs
+    :param overrides: Values replaced in the copy by (section, key)
+    """
+    config_parser = configparser.ConfigParser()
+    config_parser.read(os.path.join(ROOT, 'config.ini'), encoding='utf-8')
+    config_parser['Hara_Sheet']['path'] = os.path.join(output_dir, 'HARA.xlsx')
+    config_parser['Hara_Sheet']['results_path'] = os.path.join(output_dir, 'HARA_Results.xlsx')
+    config_parser['Scenario_Template']['path'] = os.path.join(ROOT, config_parser['Scenario_Template']['path'])
+    for key in ('path', 'ftti_path', 'acceptance_path', 'manifest_path', 'report_path'):
+        config_parser['Scenario_List'][key] = os.path.join(output_dir, config_parser['Scenario_List'][key])
+    config_parser['VSM_Testrun']['path'] = os.path.join(output_dir, config_parser['VSM_Testrun']['path'])
+    config_parser['VSM_Testrun']['template_path'] = os.path.join(ROOT, config_parser['VSM_Testrun']['template_path'])
+    for (section, key), value in (overrides or {}).items():
+        config_parser[section][key] = str(value)
+    with open(path, 'w', encoding='utf-8') as file:
+        config_parser.write(file)
+
+
+def load_golden():
+    """
+    Loads the rows of the scenario lists written by the original script
+    :return: Returns the rows of each list by mode, with the values of the columns of the template
+    """
+    with open(GOLDEN_PATH, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def read_rows(config, mode, path=None):
+    """
+    Reads the rows of a scenario list written by a run
+    :param config: Config of the run
+    :param mode: Mode of the scenario list
+    :param path: Path of the workbook, e.g. a shard, the path of the scenario list of the mode by default
+    :return: Returns the values of the rows after the header, in the columns of the template
+    """
+    workbook = openpyxl.load_workbook(path or config.get_entry('Scenario_List', LIST_PATH_KEYS[mode.lower()]))
+    sheet = workbook[config.get_entry('Scenario_Template', 'sheet_name')]
+    max_col = max(config.get_int('Scenario_Template', _) for _ in config.section('Scenario_Template')
+                  if _.startswith('idx_'))
+    rows = []
+    for row in sheet.iter_rows(min_row=config.get_int('Scenario_Template', 'header_size') + 1, max_col=max_col,
+                               values_only=True):
+        if row[0] is None:
+            break
+        rows.append(list(row))
+    return rows
+
+
+@pytest.fixture
+def config(tmp_path):
+    """
+    Config of a run on the HARA of HAZARDOUS_EVENTS, with all the outputs in a temporary folder
+    """
+    config_path = str(tmp_path / 'config.ini')
+    write_config(config_path, str(tmp_path))
+    run_config = Config(config_path)
+    write_hara(run_config, run_config.get_entry('Hara_Sheet', 'path'))
+    return run_config
@@ -0,0 +1,42 @@
+"""
+Tests of the batch mode: each project writes the same scenario lists as a single run, and a project which fails is
+reported in the summary without stopping the batch
+"""
+import json
+import os
+
+import pytest
+
+from batch import Project, batch
+from conftest import load_golden, read_rows, write_config
+from preprocessing import load_config
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_invalid_config_reported_in_summary(config, tmp_path, jobs):
+    invalid_path = str(tmp_path / 'invalid.ini')
+    write_config(invalid_path, str(tmp_path), {('Speed', 'low'): 'slow'})
+    output_dir = str(tmp_path / 'Project_A')
+    projects = [Project(invalid_path, output_dir=str(tmp_path / 'Invalid')),
+                Project(config.path, output_dir=output_dir),
+                Project(str(tmp_path / 'missing.ini'))]
+    summary_path = str(tmp_path / 'Batch_Summary.json')
+    summary = batch(projects, ['Scenario_List'], jobs, summary_path)
+
+    assert summary['failed'] == 2
+    assert [_['project'] for _ in summary['projects']] == [_.name for _ in projects]
+    invalid, valid, missing = summary['projects']
+    assert "key 'low'" in invalid['error'] and not invalid['outputs']
+    assert 'was not found' in missing['error'] and not missing['outputs']
+    assert valid['error'] is None
+    assert valid['rows_written'] == {'Scenario_List': len(load_golden()['Scenario_List'])}
+    assert read_rows(load_config(config.path, output_dir=output_dir), 'Scenario_List') == \
+        load_golden()['Scenario_List']
+    with open(summary_path, encoding='utf-8') as file:
+        assert json.load(file) == summary
+    assert not os.path.exists(tmp_path / 'Invalid')
+
+
+def test_projects_writing_the_same_files(config):
+    with pytest.raises(ValueError, match='both write'):
+        batch([Project(config.path), Project(config.path)], ['Scenario_List'])
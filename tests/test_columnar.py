@@ -0,0 +1,63 @@
+"""
+Tests of the columnar outputs: the rows written next to the workbooks are the golden rows, with the formulas of the
+sheet evaluated
+"""
+import csv
+import os
+
+import pytest
+
+from conftest import load_golden
+from preprocessing import LIST_PATH_KEYS, preprocessing
+
+MODES = ['Scenario_List', 'FTTI_List', 'Acceptance_List']
+
+
+def _value(text):
+    """
+    Reads a value of a CSV cell, the numbers are compared as floats
+    """
+    if text == '':
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def evaluated(row):
+    """
+    Evaluates the formulas of a golden row (the lateral acceleration and the friction coefficient exploitation)
+    :return: Returns the values of the row as read from a CSV file
+    """
+    values = [None if _ is None else _value(str(_)) for _ in row]
+    radius, friction, speed = values[2], values[3], values[7]
+    if isinstance(radius, float):
+        values[5] = (speed / 3.6) ** 2 / radius
+        values[6] = values[5] / friction * 100 / 9.81 if isinstance(friction, float) else None
+    else:
+        values[5] = values[6] = None
+    return values
+
+
+def test_csv_rows_match_golden(config):
+    preprocessing(MODES, columnar='csv', config=config)
+    golden = load_golden()
+    for mode in MODES:
+        csv_path = os.path.splitext(config.get_entry('Scenario_List', LIST_PATH_KEYS[mode.lower()]))[0] + '.csv'
+        with open(csv_path, newline='', encoding='utf-8') as file:
+            header, *rows = list(csv.reader(file))
+        assert header[:3] == ['hara_id', 'test_run_id', 'constant_road_radius']
+        assert len(rows) == len(golden[mode]), mode
+        for row, golden_row in zip(rows, golden[mode]):
+            assert [_value(_) for _ in row[:len(golden_row)]] == pytest.approx(evaluated(golden_row)), row[1]
+
+
+def test_parquet_rows_match_csv(config):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    preprocessing('Scenario_List', columnar='parquet', config=config)
+    table = pyarrow_parquet.read_table(os.path.splitext(config.get_entry('Scenario_List', 'path'))[0] + '.parquet')
+    golden = load_golden()['Scenario_List']
+    assert table.num_rows == len(golden)
+    assert table.column('test_run_id').to_pylist() == [_[1] for _ in golden]
+    assert table.column('desired_vehicle_speed').to_pylist() == [float(_[7]) for _ in golden]
@@ -0,0 +1,55 @@
+"""
+Tests of the simulation cost model: the track length of VSM_Testrun_Export.m and the factors of the Simulation_Cost
+config section
+"""
+import pytest
+
+from packages.cost_model import CostModel
+
+
+def line(**values):
+    """
+    Builds a test run on a straight, dry road at 60 km/h with the values replaced
+    """
+    return dict({'hara_id': 'HE_01', 'constant_road_radius': 'straight', 'road_friction_coefficient': 0.9,
+                 'desired_vehicle_speed': 60, 'acceleration': 0}, **values)
+
+
+@pytest.mark.parametrize('vehicle_speed, acceleration, track_length', [
+    # The standstill_length of a time based test run
+    (0, None, 100),
+    # endDistance of VSM_Testrun_Export.m, the driver model needs at least the track of 30 km/h
+    (10, 0, 150),
+    (10, 2, 150),
+    (20, 0, 200),
+    (60, 0, 400),
+    (120, -2, 700),
+])
+def test_track_length(config, vehicle_speed, acceleration, track_length):
+    assert CostModel(config).track_length(vehicle_speed, acceleration) == track_length
+
+
+def test_curve_factor_grows_with_the_curvature(config):
+    cost_model = CostModel(config)
+    straight = cost_model.cost(line())
+    costs = [cost_model.cost(line(constant_road_radius=_)) for _ in (1e9, 300, cost_model.curve_radius, 60, 20)]
+    assert costs[0] == pytest.approx(straight)
+    assert costs[2] == pytest.approx(straight * cost_model.curve)
+    assert costs == sorted(costs)
+    assert costs[-1] < straight * (2 * cost_model.curve - 1)
+
+
+def test_friction_factors(config):
+    cost_model = CostModel(config)
+    straight = cost_model.cost(line())
+    assert cost_model.cost(line(road_friction_coefficient=0.3)) == pytest.approx(straight * cost_model.low_friction)
+    assert cost_model.cost(line(road_friction_coefficient='0.9/0.3')) == pytest.approx(straight * cost_model.mu_split)
+
+
+def test_order_by_decreasing_cost(config):
+    lines = [line(hara_id='HE_01'), line(hara_id='HE_02', desired_vehicle_speed=120),
+             line(hara_id='HE_03'), line(hara_id='HE_04', constant_road_radius=60)]
+    derived = [('event_1', lines[:2]), ('event_2', lines[2:])]
+    ordered = list(CostModel(config).order(derived))
+    assert [(event, event_lines[0]['hara_id']) for event, event_lines in ordered] == [
+        ('event_1', 'HE_02'), ('event_2', 'HE_04'), ('event_1', 'HE_01'), ('event_2', 'HE_03')]
@@ -0,0 +1,62 @@
+"""
+Tests of the instrumentation: the nested stages are timed separately, the progress is throttled and the run report of
+a run counts what was read and written
+"""
+import json
+import os
+
+from conftest import HAZARDOUS_EVENTS, load_golden
+from packages import instrumentation as instrumentation_module
+from packages.instrumentation import Instrumentation
+from preprocessing import preprocessing
+
+
+class Clock:
+    """
+    Clock advanced by the test instead of time.perf_counter()
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_nested_stage_not_counted_in_enclosing_stage(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(instrumentation_module.time, 'perf_counter', clock)
+    instrumentation = Instrumentation()
+    with instrumentation.stage('write'):
+        clock.now += 1.0
+        for _ in instrumentation.timed(iter([1, 2]), 'derive'):
+            clock.now += 2.0
+        clock.now += 0.5
+    assert instrumentation.stages['write'] == {'seconds': 5.5, 'calls': 1}
+    assert instrumentation.stages['derive'] == {'seconds': 0.0, 'calls': 3}
+
+
+def test_progress_is_throttled(monkeypatch, capsys):
+    clock = Clock()
+    monkeypatch.setattr(instrumentation_module.time, 'perf_counter', clock)
+    instrumentation = Instrumentation(progress_interval=1.0)
+    for i in range(5):
+        instrumentation.progress(lambda i=i: f"Item #{i}")
+        clock.now += 0.4
+    assert capsys.readouterr().out.splitlines() == ['Status: Item #0', 'Status: Item #3']
+
+
+def test_run_report(config):
+    report = preprocessing('Scenario_List', trace_memory=True, config=config)
+    rows = len(load_golden()['Scenario_List'])
+    assert report['counters']['rows_read'] == len(HAZARDOUS_EVENTS)
+    assert report['counters']['events_not_relevant'] == sum(not _[10] for _ in HAZARDOUS_EVENTS)
+    assert report['counters']['rows_written'] == {'Scenario_List': rows}
+    assert sum(report['counters']['scenarios_per_hazard'].values()) == rows
+    assert {'read', 'derive', 'write', 'save'} <= set(report['stages'])
+    list_path = config.get_entry('Scenario_List', 'path')
+    assert report['outputs'] == {list_path: os.path.getsize(list_path)}
+    assert report['bytes_saved'] == os.path.getsize(list_path)
+    assert report['peak_memory'] > 0
+    with open(config.get_entry('Scenario_List', 'report_path'), encoding='utf-8') as file:
+        assert json.load(file) == report
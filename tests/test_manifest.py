@@ -0,0 +1,48 @@
+"""
+Tests of the incremental runs: the lines of the hazardous events unchanged since the previous run are reused from the
+manifest, and the scenario lists are the same as the ones of a full run
+"""
+import json
+
+from conftest import HAZARDOUS_EVENTS, load_golden, read_rows, write_hara
+from preprocessing import load_config, preprocessing
+
+MODES = ['Scenario_List', 'FTTI_List', 'Acceptance_List']
+RELEVANT_EVENTS = sum(_[10] for _ in HAZARDOUS_EVENTS)
+
+
+def load_changes(config):
+    """
+    Loads the test runs changed by the last run, by mode
+    """
+    with open(config.get_entry('Scenario_List', 'manifest_path'), encoding='utf-8') as file:
+        return json.load(file)['changes']
+
+
+def test_incremental_run_twice_matches_golden(config, capsys):
+    preprocessing(MODES, incremental=True, config=config)
+    assert f"Status: {RELEVANT_EVENTS} hazardous events derived, 0 reused" in capsys.readouterr().out
+    preprocessing(MODES, incremental=True, config=config)
+    assert f"Status: 0 hazardous events derived, {RELEVANT_EVENTS} reused" in capsys.readouterr().out
+    golden = load_golden()
+    for mode in MODES:
+        assert read_rows(config, mode) == golden[mode], mode
+    assert load_changes(config) == {mode: {'new': [], 'removed': [], 'changed': []} for mode in MODES}
+
+
+def test_changed_hazardous_event_is_derived_again(config, tmp_path, capsys):
+    preprocessing(MODES, incremental=True, config=config)
+    # HE_09 is now at low speed: 2 speeds instead of 1, the test runs after it are shifted
+    hazardous_events = [(*_[:6], 'Low', *_[7:]) if _[0] == 'HE_09' else _ for _ in HAZARDOUS_EVENTS]
+    write_hara(config, config.get_entry('Hara_Sheet', 'path'), hazardous_events)
+    capsys.readouterr()
+    preprocessing(MODES, incremental=True, config=config)
+    assert f"Status: 1 hazardous events derived, {RELEVANT_EVENTS - 1} reused" in capsys.readouterr().out
+    changes = load_changes(config)['Scenario_List']
+    assert changes['new'] and changes['changed'] and not changes['removed']
+
+    full_config = load_config(config.path, output_dir=str(tmp_path / 'Full'))
+    (tmp_path / 'Full').mkdir()
+    preprocessing(MODES, config=full_config)
+    for mode in MODES:
+        assert read_rows(config, mode) == read_rows(full_config, mode), mode
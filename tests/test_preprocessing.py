@@ -0,0 +1,144 @@
+"""
+Golden-output tests of the scenario lists: the lists generated from the HARA of conftest.HAZARDOUS_EVENTS are compared
+to the ones written by the original preprocessing script (tests/data/golden_scenario_lists.json), for each mode of
+generation
+"""
+import json
+import os
+
+import openpyxl
+import pytest
+
+from conftest import HAZARDOUS_EVENTS, load_golden, read_rows, write_hara
+from preprocessing import LIST_PATH_KEYS, Hara, HazardousEvent, Scenario, load_config, plan, preprocessing
+
+MODES = ('Scenario_List', 'FTTI_List', 'Acceptance_List')
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'streaming': True},
+    {'jobs': 2},
+    {'pipeline': 'thread'},
+], ids=['default', 'streaming', 'jobs', 'pipeline'])
+def test_scenario_lists_match_golden(config, options):
+    preprocessing(list(MODES), config=config, **options)
+    golden = load_golden()
+    for mode in MODES:
+        assert read_rows(config, mode) == golden[mode], mode
+
+
+@pytest.mark.parametrize('mode', ['FTTI_List', 'Acceptance_List'])
+def test_test_runs_addressed_by_id_match_golden(config, mode):
+    # A single FTTI or Acceptance list addresses the targeted test runs directly (see TestRunIndex)
+    preprocessing(mode, config=config)
+    assert read_rows(config, mode) == load_golden()[mode]
+
+
+def hazardous_event(road_condition, vehicle_speed):
+    """
+    Builds a relevant hazardous event on a straight and flat road
+    """
+    return HazardousEvent(identifier='HE', location='Highway', slope='Flat', route='Straight',
+                          road_condition=road_condition, engaged_gear='D', vehicle_speed=vehicle_speed,
+                          brake_pedal='Released', maneuver='Cruising',
+                          hazard='[TQ1] Unintended acceleration during driving', relevant=True, comment=None)
+
+
+@pytest.mark.parametrize('road_condition, road_friction, vehicle_speed', [
+    ('Dry', 0.9, [120.0]),
+    ('Wet', 0.6, [120.0]),
+    # The first matching friction rule wins, the speed is only limited by the icy/snow rule
+    ('Wet / Snow', 0.6, [120.0]),
+    ('Icy', 0.3, [80.0]),
+    ('Snow', 0.3, [80.0]),
+    ('mu-split', '0.9/0.3', [120.0]),
+])
+def test_speed_limit_of_matching_friction_rule(config, road_condition, road_friction, vehicle_speed):
+    scenario = Scenario(config, hazardous_event(road_condition, 'High'))
+    assert scenario.road_friction == road_friction
+    assert scenario.vehicle_speed == vehicle_speed
+
+
+def test_streamed_hara_is_only_open_while_scanned(config, monkeypatch):
+    workbooks = []
+    load_workbook = openpyxl.load_workbook
+    monkeypatch.setattr(openpyxl, 'load_workbook', lambda *args, **kwargs: workbooks.append(
+        load_workbook(*args, **kwargs)) or workbooks[-1])
+    hazardous_events = Hara(config).hazardous_events()
+    assert not workbooks
+    assert next(hazardous_events).identifier == HAZARDOUS_EVENTS[0][0]
+    assert workbooks[0]._archive.fp is not None  # pylint: disable=protected-access
+    hazardous_events.close()
+    assert workbooks[0]._archive.fp is None  # pylint: disable=protected-access
+    assert [_.identifier for _ in Hara(config).hazardous_events()] == [_[0] for _ in HAZARDOUS_EVENTS]
+    assert workbooks[1]._archive.fp is None  # pylint: disable=protected-access
+
+
+def test_plan_counts_the_rows_without_writing(config, capsys):
+    result = plan(list(MODES), config=config)
+    golden = load_golden()
+    assert {mode: _['rows'] for mode, _ in result['lists'].items()} == {mode: len(golden[mode]) for mode in MODES}
+    assert 'Writing item' not in capsys.readouterr().out
+    assert not any(os.path.exists(config.get_entry('Scenario_List', LIST_PATH_KEYS[mode.lower()])) for mode in MODES)
+
+
+def test_output_path_of_a_mode(config, tmp_path):
+    output_path = str(tmp_path / 'output' / 'List.xlsx')
+    run_config = load_config(config.path, output_paths={'FTTI_List': output_path})
+    assert run_config.get_entry('Scenario_List', 'ftti_path') == output_path
+    assert run_config.get_entry('Scenario_List', 'path') == config.get_entry('Scenario_List', 'path')
+
+
+
+def physical(row):
+    """
+    Gets the values of a row which do not depend on its HARA ID, test run ID or position in the sheet
+    """
+    return tuple(row[2:5] + row[7:])
+
+
+def test_dedup_writes_each_physical_scenario_once(config):
+    # HE_12 is the same physical scenario as HE_01, its test runs are shared
+    duplicate = ('HE_12', *HAZARDOUS_EVENTS[0][1:11], None)
+    write_hara(config, config.get_entry('Hara_Sheet', 'path'), [*HAZARDOUS_EVENTS, duplicate])
+    report = preprocessing('Scenario_List', dedup=True, config=config)
+    golden = load_golden()['Scenario_List']
+    shared = [_ for _ in golden if _[0] == 'HE_01']
+    assert report['counters']['duplicate_scenarios'] == {'Scenario_List': len(shared)}
+    assert [[*_[:2], *physical(_)] for _ in read_rows(config, 'Scenario_List')] == \
+        [[*_[:2], *physical(_)] for _ in golden]
+    workbook = openpyxl.load_workbook(config.get_entry('Scenario_List', 'path'))
+    mapping_sheet = workbook[config.get_entry('Scenario_List', 'mapping_sheet_name')]
+    assert [list(_) for _ in mapping_sheet.iter_rows(values_only=True)] == \
+        [['HARA ID', 'Test Run ID'], *([_[0], _[1]] for _ in golden), *(['HE_12', _[1]] for _ in shared)]
+
+
+@pytest.mark.parametrize('shard_by, shards', [('count', 3), ('hazard', None), ('cost', 2)])
+def test_shards_hold_the_golden_rows(config, shard_by, shards):
+    preprocessing('Scenario_List', shard_by=shard_by, shards=shards, config=config)
+    shards_path = os.path.splitext(config.get_entry('Scenario_List', 'path'))[0] + '_Shards.json'
+    with open(shards_path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    rows = []
+    for shard in manifest['shards']:
+        shard_rows = read_rows(config, 'Scenario_List', shard['paths'][0])
+        assert [_[1] for _ in shard_rows] == shard['test_run_ids']
+        rows.extend(shard_rows)
+    golden = load_golden()['Scenario_List']
+    assert manifest['rows'] == len(golden)
+    # The test run IDs are the ones of the list without sharding
+    assert sorted(([*_[:2], *physical(_)] for _ in rows), key=lambda _: _[1]) == \
+        [[*_[:2], *physical(_)] for _ in golden]
+    sizes = [_['rows'] for _ in manifest['shards']]
+    if shard_by == 'hazard':
+        hazard_codes = {_[0]: _[9][1:4] for _ in HAZARDOUS_EVENTS}
+        assert sorted(_['name'] for _ in manifest['shards']) == sorted({hazard_codes[_[0]] for _ in golden})
+        for shard in manifest['shards']:
+            shard_rows = read_rows(config, 'Scenario_List', shard['paths'][0])
+            assert {hazard_codes[_[0]] for _ in shard_rows} == {shard['name']}
+    elif shard_by == 'count':
+        assert len(sizes) == shards and max(sizes) - min(sizes) <= 1
+    else:
+        costs = [_['estimated_cost'] for _ in manifest['shards']]
+        assert len(costs) == shards and max(costs) - min(costs) <= max(costs) / 10
@@ -0,0 +1,57 @@
+"""
+Tests of the preprocessing service: the inputs which changed are reloaded, and the requests wait for the files being
+saved
+"""
+import os
+import time
+
+from conftest import HAZARDOUS_EVENTS, write_config
+import service as service_module
+from service import PreprocessingService
+
+
+def test_hara_is_read_again_when_its_layout_changes(config, tmp_path):
+    config_path = str(tmp_path / 'config.ini')
+    service = PreprocessingService(config_path)
+    service.refresh()
+    assert len(service._hazardous_events) == len(HAZARDOUS_EVENTS)  # pylint: disable=protected-access
+    # The first hazardous event is now in the header, the HARA file itself is unchanged
+    header_size = config.get_int('Hara_Sheet', 'header_size') + 1
+    write_config(config_path, str(tmp_path), {('Hara_Sheet', 'header_size'): header_size})
+    # The modification time changes even on file systems with a coarse resolution
+    os.utime(config_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    service.refresh()
+    hazardous_events = service._hazardous_events  # pylint: disable=protected-access
+    assert [_.identifier for _ in hazardous_events] == [_[0] for _ in HAZARDOUS_EVENTS[1:]]
+
+
+def test_request_waits_for_the_inputs_to_be_quiet(config, tmp_path):
+    service = PreprocessingService(str(tmp_path / 'config.ini'))
+    outputs = service.refresh()
+    hara_path = config.get_entry('Hara_Sheet', 'path')
+    os.utime(hara_path)
+    start = time.perf_counter()
+    assert service.refresh_when_quiet(debounce=0.5) == outputs
+    assert time.perf_counter() - start >= 0.4
+
+
+def test_hara_saved_during_a_regeneration_is_regenerated(config, tmp_path, monkeypatch):
+    service = PreprocessingService(str(tmp_path / 'config.ini'))
+    hara_path = config.get_entry('Hara_Sheet', 'path')
+    load = service._load  # pylint: disable=protected-access
+
+    def load_and_save_hara():
+        state = load()
+        # The HARA is saved after it was read, while the scenario lists are being written
+        os.utime(hara_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        return state
+
+    monkeypatch.setattr(service, '_load', load_and_save_hara)
+    service.refresh()
+    monkeypatch.setattr(service, '_load', load)
+    runs = []
+    monkeypatch.setattr(service_module, 'write_scenario_lists', lambda *args, **kwargs: runs.append(args) or [])
+    service.refresh()
+    assert len(runs) == 1
+    service.refresh()
+    assert len(runs) == 1
@@ -0,0 +1,114 @@
+"""
+Round-trip tests of the direct access to the XML of a sheet: the cells updated by SheetPatch are read back with
+openpyxl and with iter_rows(), the other cells, the styles and the other sheets are kept
+"""
+import zipfile
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+import pytest
+
+from packages.sheet_xml import SheetPatch, get_sheet_names, iter_rows
+
+CALC_CHAIN = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              '<c r="C2" i="1"/></calcChain>')
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    """
+    Workbook with a styled header, shared strings, numbers, a formula, a gap in the rows and a second sheet
+    """
+    path = str(tmp_path / 'workbook.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Results'
+    sheet.append(['ID', 'Speed', 'Total', 'Comment'])
+    for cell in sheet[1]:
+        cell.font = Font(bold=True)
+    sheet.append(['HE_01', 60, '=B2*2', 'kept'])
+    sheet.append(['HE_02', 90.5, None, None])
+    sheet['A6'] = 'HE_05'
+    sheet['B6'] = 20
+    sheet['B6'].fill = PatternFill('solid', fgColor='FFFF00')
+    workbook.create_sheet('Other')['A1'] = 'untouched'
+    workbook.save(path)
+    return path
+
+
+def test_cells_round_trip(workbook_path, tmp_path):
+    output_path = str(tmp_path / 'patched.xlsx')
+    patch = SheetPatch(workbook_path, 'Results')
+    patch.set(2, 4, 'S&P <fast> "worst"')
+    patch.set(3, 2, 120)
+    patch.set(3, 5, True)
+    # New rows between the existing ones and after the last one
+    patch.set(4, 1, 'HE_03')
+    patch.set(4, 2, 0.25)
+    patch.set(8, 3, 'last')
+    # A styled cell keeps its style, a cleared cell is empty
+    patch.set(6, 2, 30)
+    patch.set(2, 1, None)
+    assert len(patch) == 8
+    patch.save(output_path)
+
+    workbook = openpyxl.load_workbook(output_path)
+    sheet = workbook['Results']
+    assert [[_.value for _ in row] for row in sheet.iter_rows(min_row=1, max_row=8, max_col=5)] == [
+        ['ID', 'Speed', 'Total', 'Comment', None],
+        [None, 60, '=B2*2', 'S&P <fast> "worst"', None],
+        ['HE_02', 120, None, None, True],
+        ['HE_03', 0.25, None, None, None],
+        [None, None, None, None, None],
+        ['HE_05', 30, None, None, None],
+        [None, None, None, None, None],
+        [None, None, 'last', None, None]]
+    assert all(_.font.bold for _ in sheet[1][:4])
+    assert sheet['B6'].fill.fgColor.rgb == '00FFFF00'
+    assert sheet.dimensions == 'A1:E8'
+    assert workbook['Other']['A1'].value == 'untouched'
+    assert get_sheet_names(output_path) == ['Results', 'Other']
+
+    rows = dict(iter_rows(output_path, 'Results', [1, 2, 4, 5], min_row=2))
+    assert rows[3] == ['HE_02', 120, None, True]
+    assert rows[4] == ['HE_03', 0.25, None, None]
+    assert rows[2] == [None, 60, 'S&P <fast> "worst"', None]
+
+
+def test_saved_in_place(workbook_path):
+    patch = SheetPatch(workbook_path, 'Results')
+    patch.set(3, 3, 181)
+    patch.save()
+    assert openpyxl.load_workbook(workbook_path)['Results']['C3'].value == 181
+
+
+def test_calculation_chain_removed_with_a_replaced_formula(workbook_path, tmp_path):
+    # openpyxl does not write a calculation chain, it is added as Excel does
+    with_chain_path = str(tmp_path / 'with_chain.xlsx')
+    with zipfile.ZipFile(workbook_path) as source, zipfile.ZipFile(with_chain_path, 'w') as target:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename == '[Content_Types].xml':
+                data = data.replace(b'</Types>', b'<Override PartName="/xl/calcChain.xml" ContentType="application/'
+                                    b'vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/></Types>')
+            target.writestr(info, data)
+        target.writestr('xl/calcChain.xml', CALC_CHAIN)
+
+    patch = SheetPatch(with_chain_path, 'Results')
+    patch.set(2, 2, 61)
+    patch.save(str(tmp_path / 'kept.xlsx'))
+    with zipfile.ZipFile(tmp_path / 'kept.xlsx') as patched:
+        assert 'xl/calcChain.xml' in patched.namelist()
+
+    patch.set(2, 3, 122)
+    patch.save(str(tmp_path / 'removed.xlsx'))
+    with zipfile.ZipFile(tmp_path / 'removed.xlsx') as patched:
+        assert 'xl/calcChain.xml' not in patched.namelist()
+        assert b'calcChain' not in patched.read('[Content_Types].xml')
+    assert openpyxl.load_workbook(tmp_path / 'removed.xlsx')['Results']['C2'].value == 122
+
+
+def test_unknown_sheet(workbook_path):
+    with pytest.raises(KeyError, match='Missing'):
+        SheetPatch(workbook_path, 'Missing')
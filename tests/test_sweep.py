@@ -0,0 +1,101 @@
+"""
+Tests of the parameter sweep: the rows are counted before they are written, and a Scenario_List which does not fit in
+a sheet is split into shards
+"""
+import collections
+import json
+import os
+
+import openpyxl
+import pytest
+
+from conftest import read_rows, write_config, write_hara
+from packages.config import Config
+from packages.sweep import Sweep
+from preprocessing import Hara, ScenarioList, ScenarioRules, count_sweep, preprocessing
+
+
+@pytest.fixture
+def config(tmp_path):
+    """
+    Config of a run on the HARA of conftest.HAZARDOUS_EVENTS, with a small sweep
+    """
+    config_path = str(tmp_path / 'config.ini')
+    write_config(config_path, str(tmp_path), {('Sweep', 'speed'): '[0, 120, 4]',
+                                              ('Sweep', 'road_friction'): '[0.3, 0.9, 2]',
+                                              ('Sweep', 'road_gradient'): '[0, 0, 1]',
+                                              ('Sweep', 'slew_rate'): '[1000, 5000, 2]',
+                                              ('Sweep', 'braking'): '[20, 60, 2]'})
+    run_config = Config(config_path)
+    write_hara(run_config, run_config.get_entry('Hara_Sheet', 'path'))
+    return run_config
+
+
+@pytest.fixture
+def latin_hypercube_config(config):
+    """
+    Config of the small sweep with the latin_hypercube strategy
+    """
+    write_config(config.path, os.path.dirname(config.path), {('Sweep', 'strategy'): 'latin_hypercube',
+                                                             ('Sweep', 'samples'): 8,
+                                                             ('Sweep', 'road_friction'): '[0.3, 0.9, 2]'})
+    return Config(config.path)
+
+
+@pytest.mark.parametrize('strategy', ['full_factorial', 'latin_hypercube'])
+def test_count_sweep_matches_rows_written(request, strategy):
+    config = request.getfixturevalue('config' if strategy == 'full_factorial' else 'latin_hypercube_config')
+    report = preprocessing('Scenario_List', sweep=True, config=config)
+    expected = count_sweep(config, Hara(config).hazardous_events(), Sweep(config))
+    assert report['counters']['rows_written']['Scenario_List'] == expected
+    workbook = openpyxl.load_workbook(config.get_entry('Scenario_List', 'path'), read_only=True)
+    sheet = workbook[config.get_entry('Scenario_Template', 'sheet_name')]
+    sheet.reset_dimensions()
+    rows = sheet.iter_rows(min_row=config.get_int('Scenario_Template', 'header_size') + 1, max_col=1,
+                           values_only=True)
+    assert sum(1 for _ in rows) == expected
+
+
+def test_sweep_is_sharded_to_the_sheet_size(config, monkeypatch):
+    row_count = count_sweep(config, Hara(config).hazardous_events(), Sweep(config))
+    header_size = config.get_int('Scenario_Template', 'header_size')
+    monkeypatch.setattr(ScenarioList, 'MAX_ROWS', header_size + row_count // 3 + 1)
+    preprocessing('Scenario_List', sweep=True, config=config)
+    shards_path = os.path.splitext(config.get_entry('Scenario_List', 'path'))[0] + '_Shards.json'
+    with open(shards_path, encoding='utf-8') as file:
+        shards = json.load(file)
+    assert shards['shard_by'] == 'count'
+    assert len(shards['shards']) == 3
+    assert sum(_['rows'] for _ in shards['shards']) == row_count
+
+
+def test_sweep_with_too_few_shards_fails(config, monkeypatch):
+    monkeypatch.setattr(ScenarioList, 'MAX_ROWS', 10)
+    with pytest.raises(ValueError, match='do not fit'):
+        preprocessing('Scenario_List', sweep=True, shard_by='count', shards=2, config=config)
+
+
+def test_sweep_does_not_grow_the_shared_reactions(config):
+    rules = ScenarioRules.load(config)
+    preprocessing('Scenario_List', config=config)
+    reactions = dict(rules._reactions)  # pylint: disable=protected-access
+    preprocessing('Scenario_List', sweep=True, config=config)
+    assert rules._reactions == reactions  # pylint: disable=protected-access
+
+
+def test_swept_scenarios_follow_the_rules_of_the_hara(config):
+    preprocessing('Scenario_List', sweep=True, config=config)
+    rows = read_rows(config, 'Scenario_List')
+    speeds = {}
+    for row in rows:
+        speeds.setdefault(row[0], set()).add(row[7])
+    # The swept speeds are limited on icy and snowy roads, each limited speed is only swept once
+    assert speeds['HE_03'] == speeds['HE_04'] == {0, 40, 80}
+    assert speeds['HE_02'] == speeds['HE_06'] == {0, 40, 80, 120}
+    rows_per_speed = collections.Counter(_[7] for _ in rows if _[0] == 'HE_03')
+    assert rows_per_speed[80] == rows_per_speed[40]
+    # The acceleration of a standstill hazardous event is derived again for the swept speeds, as by Scenario
+    brake_pressed = config.get_float('Driver', 'brake_pressed')
+    assert {(_[7] == 0, _[8]) for _ in rows if _[0] == 'HE_06'} == {(True, None), (False, brake_pressed)}
+    # The friction of a mu-split road is not swept
+    assert {_[3] for _ in rows if _[0] == 'HE_05'} == {config.get_entry('Road_friction', 'mu-split')}
@@ -0,0 +1,124 @@
+"""
+Round-trip tests of the VSM testruns: the .vsd file encoded by VsmTestrunWriter is read back with scipy and compared
+to the same testruns saved by scipy itself
+"""
+import io
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+# pylint: disable=wrong-import-position
+import scipy.io  # noqa: E402
+
+from conftest import HAZARDOUS_EVENTS, write_hara  # noqa: E402
+from packages.vsm_testrun import VsmTestrunWriter, generate_testrun, load_template  # noqa: E402
+from preprocessing import preprocessing  # noqa: E402
+
+ROWS = [
+    # Straight road at constant speed
+    {'hara_id': 'HE_01', 'constant_road_radius': 'straight', 'road_friction_coefficient': 0.9, 'road_gradient': 0,
+     'desired_vehicle_speed': 60, 'acceleration': 0, 'torque_front_axle': 100, 'torque_rear_axle': 100,
+     'torque_slew_rate': 5000, 'very_slow_steering': 0, 'slow_steering': 0, 'braking': 0},
+    # Curve on a slope, braking before the fault
+    {'hara_id': 'HE_02', 'constant_road_radius': 150, 'road_friction_coefficient': 0.3, 'road_gradient': 5,
+     'desired_vehicle_speed': 60, 'acceleration': -2, 'torque_front_axle': 100, 'torque_rear_axle': None,
+     'torque_slew_rate': 5000, 'very_slow_steering': 40, 'slow_steering': None, 'braking': 15},
+    # Mu-split road, accelerating before the fault
+    {'hara_id': 'HE_03', 'constant_road_radius': 20, 'road_friction_coefficient': '0.9/0.3', 'road_gradient': 10,
+     'desired_vehicle_speed': 20, 'acceleration': 2, 'torque_front_axle': -100, 'torque_rear_axle': -100,
+     'torque_slew_rate': 5000, 'very_slow_steering': None, 'slow_steering': 75, 'braking': 5, 'ftti': 300},
+    # Standstill, time based
+    {'hara_id': 'HE_04', 'constant_road_radius': 'straight', 'road_friction_coefficient': 0.5, 'road_gradient': 10,
+     'desired_vehicle_speed': 0, 'acceleration': None, 'torque_front_axle': 100, 'torque_rear_axle': 100,
+     'torque_slew_rate': 5000, 'very_slow_steering': 0, 'slow_steering': 0, 'braking': 60},
+]
+# Too low speed for the braking before the fault, rejected by VSM_Testrun_Export.m
+INVALID_ROW = dict(ROWS[0], desired_vehicle_speed=10, acceleration=-2)
+
+
+def assert_same(actual, expected, path='Data'):
+    """
+    Compares the values loaded from two MAT-files, field by field
+    """
+    if isinstance(expected, np.void):
+        assert actual.dtype.names == expected.dtype.names, path
+        for name in expected.dtype.names:
+            assert_same(actual[name], expected[name], f"{path}.{name}")
+    elif isinstance(expected, np.ndarray) and expected.dtype.names:
+        assert actual.dtype.names == expected.dtype.names, path
+        assert actual.shape == expected.shape, path
+        for index in np.ndindex(expected.shape):
+            for name in expected.dtype.names:
+                assert_same(actual[index][name], expected[index][name], f"{path}{list(index)}.{name}")
+    elif isinstance(expected, np.ndarray) and expected.dtype == object:
+        assert actual.shape == expected.shape, path
+        for index in np.ndindex(expected.shape):
+            assert_same(actual[index], expected[index], f"{path}{list(index)}")
+    elif isinstance(expected, np.ndarray) and expected.dtype.kind in 'fc':
+        np.testing.assert_array_equal(actual, expected, err_msg=path)
+    else:
+        assert np.array_equal(actual, expected), path
+
+
+def save_reference(template, rows):
+    """
+    Saves the testruns of the rows with scipy
+    :return: Returns the Data struct read back
+    """
+    template_track = template['Track'][0, 0]
+    names = template_track.dtype.names
+    tracks = np.empty((1, len(rows)), dtype=[(name, object) for name in names])
+    for i_row, (test_run_id, row) in enumerate(rows):
+        track, _ = generate_testrun(template_track, test_run_id, row)
+        tracks[0, i_row] = tuple(track[name] for name in names)
+    buffer = io.BytesIO()
+    scipy.io.savemat(buffer, {'vsmTestRuns': {'Track': tracks, 'Cust': template['Cust'],
+                                              'Version': template['Version']}}, oned_as='column')
+    buffer.seek(0)
+    return scipy.io.loadmat(buffer, mat_dtype=True)['vsmTestRuns'][0, 0]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_testruns_round_trip(config, jobs, monkeypatch):
+    # Several chunks are encoded and assembled
+    monkeypatch.setattr(VsmTestrunWriter, 'CHUNK_SIZE', 3)
+    rows = [(f"{i_row:05d}", row) for i_row, row in enumerate(ROWS * 2, 1)]
+    writer = VsmTestrunWriter(config, 'Scenario_List', jobs=jobs)
+    for test_run_id, row in rows:
+        writer.add(test_run_id, row)
+    writer.save()
+    data = scipy.io.loadmat(writer.path, mat_dtype=True)['vsmTestRuns'][0, 0]
+    template = load_template(config.get_entry('VSM_Testrun', 'template_path'))
+    assert_same(data, save_reference(template, rows))
+    assert [str(_[0]) for _ in data['Track']['DisplayName'][0]] == [f"Scenario_{_}" for _, _row in rows]
+    assert not writer.skipped
+
+
+def test_invalid_testrun_fails_by_default(config):
+    writer = VsmTestrunWriter(config, 'Scenario_List')
+    with pytest.raises(ValueError, match='00002'):
+        writer.add('00001', ROWS[0])
+        writer.add('00002', INVALID_ROW)
+        writer.save()
+
+
+def test_invalid_testrun_skipped_when_requested(config):
+    writer = VsmTestrunWriter(config, 'FTTI_List', skip_invalid=True)
+    for test_run_id, row in (('00001', ROWS[0]), ('00002', INVALID_ROW), ('00003', ROWS[1])):
+        writer.add(test_run_id, row)
+    writer.save()
+    assert writer.skipped == ['00002']
+    data = scipy.io.loadmat(writer.path, mat_dtype=True)['vsmTestRuns'][0, 0]
+    assert [str(_[0]) for _ in data['Track']['DisplayName'][0]] == ['FTTI_Scenario_00001', 'FTTI_Scenario_00003']
+
+
+def test_skipped_testruns_in_run_report(config):
+    # Braking at a very low speed before the fault, the 2 testruns after the 4 of HE_01 are rejected
+    braking = ('HE_12', 'City', 'Flat', 'Straight', 'Dry', 'D', 'Very low', 'Pressed', 'Cruising',
+               '[TQ1] Unintended acceleration during driving', True, None)
+    write_hara(config, config.get_entry('Hara_Sheet', 'path'), [HAZARDOUS_EVENTS[0], braking])
+    with pytest.raises(ValueError, match='00005'):
+        preprocessing('Scenario_List', vsm=True, config=config)
+    report = preprocessing('Scenario_List', vsm=True, vsm_skip_invalid=True, config=config)
+    assert report['skipped'] == {'vsm_testruns': {'Scenario_List': ['00005', '00006']}}